@@ -9,6 +9,7 @@
 import asyncio
 import os
 
+from anyio import to_thread
 from fastapi import FastAPI
 from . import urls
 from .api_server import (
@@ -23,6 +24,7 @@ from .cm import (
     router as cm_router,
     tag_metadata as cm_tag_metadata
 )
+from configs import optimization_config
 from services.scheduler_service import start_scheduler, stop_scheduler
 
 __TITLE = "ARC Rest API"
@@ -57,6 +59,8 @@ app.include_router(cm_router, prefix=urls.CM)
 
 @app.on_event("startup")
 async def startup_event():
+    # Bounds the threads running the blocking service calls of the handlers (run_in_threadpool)
+    to_thread.current_default_thread_limiter().total_tokens = int(optimization_config.api_worker_threads)
     app.state.scheduler_tasks = await asyncio.gather(start_scheduler())
 
 
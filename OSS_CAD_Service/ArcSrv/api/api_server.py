@@ -2,7 +2,6 @@
 # coding: utf-8
 #
 # Copyright Ericsson (c) 2022
-import json
 import logging
 from entities.configuration_status_get_parameters import ConfigurationStatusGetResponse
 from entities.kpi_retrieve_post_parameters import (
@@ -21,12 +20,18 @@ from entities.partner_configuration_create_instance_post_parameters import (
     PartnerConfigurationCreateInstancePostResponse,
 )
 from fastapi import APIRouter, Response
-from services import kpi_service, optimization_service
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from clients import auth
+from optimization import stage_metrics
+from services import cm_service, kpi_service, optimization_service, topology_service
 
 from . import urls
 
 logger = logging.getLogger(__package__)
 
+# The services query MongoDB synchronously, the handlers call them with run_in_threadpool so that they run
+# on the bounded thread pool of the API (api_worker_threads) and the event loop stays free for other requests
 router = APIRouter()
 tags_metadata = [
     {
@@ -35,6 +40,11 @@ tags_metadata = [
                        "maximize network performance. This service handles optimization and configuration related"
                        " requests.",
     },
+    {
+        "name": "Metrics",
+        "description": "Time, CPU time, memory and row counts of the optimization stages in the Prometheus text "
+                       "format, summed since the service started.",
+    },
     {
         "name": "KPIs Service",
         "description": "ARC KPIs is responsible of managing the recent BB Links configuration's Key Performance "
@@ -62,7 +72,9 @@ async def get_optimize(optimization_id: str, response: Response):
     (
         optimization_status_outcome,
         response_code,
-    ) = optimization_service.get_optimization_status(optimization_id)
+    ) = await run_in_threadpool(
+        optimization_service.get_optimization_status, optimization_id
+    )
     response.status_code = response_code
     return optimization_status_outcome
 
@@ -78,14 +90,14 @@ async def post_create_optimization_instance(
     request_body: OptimizationCreateInstancePostRequestBody, response: Response
 ):
     logger.info("Before Create Optimization Instance")
-    request_body_as_json = json.loads(
-        json.dumps(request_body, default=lambda o: o.to_json())
-    )
-    logger.info("Create Optimization Instance : %s", json.dumps(request_body_as_json))
+    request_body_as_json = request_body.dict()
+    logger.info("Create Optimization Instance : %s", request_body.json())
     (
         optimization_create_outcome,
         response_code,
-    ) = optimization_service.create_optimization_instance(request_body_as_json)
+    ) = await run_in_threadpool(
+        optimization_service.create_optimization_instance, request_body_as_json
+    )
     response.status_code = response_code
     return optimization_create_outcome
 
@@ -95,14 +107,19 @@ async def post_create_optimization_instance(
     tags=["Optimization Service"],
     response_model=OptimizationStartPostResponse,
     name="Launches an BB pair optimization for a relevant optimization instance using an ID for target gNBs provided "
-    "in the request body.",
+    "in the request body. The optimization waits in queue while the maximum of concurrent optimizations run, "
+    "optimizations of higher priority first.",
 )
-async def post_start_optimization(optimization_id: str, response: Response):
+async def post_start_optimization(
+    optimization_id: str, response: Response, reference_id: str = None, priority: int = 0
+):
     logger.info("Start Optimization %s", optimization_id)
     (
         optimization_start_outcome,
         response_code,
-    ) = optimization_service.start_optimization(optimization_id)
+    ) = await run_in_threadpool(
+        optimization_service.start_optimization, optimization_id, reference_id, priority
+    )
     response.status_code = response_code
     return optimization_start_outcome
 
@@ -111,12 +128,13 @@ async def post_start_optimization(optimization_id: str, response: Response):
     urls.OPTIMIZATION_STOP_WITH_ID,
     tags=["Optimization Service"],
     response_model=OptimizationStopPostResponse,
-    name="Cancels (stop) an optimization given its ID.",
+    name="Cancels (stop) an optimization given its ID. A running optimization is signalled and the request returns at "
+    "once with the stopping status, the status is finished when the optimization has stopped.",
 )
 async def post_stop_optimization(optimization_id: str, response: Response):
     logger.info("Stop Optimization Instance : %s", optimization_id)
-    (optimization_stop_outcome, response_code) = optimization_service.stop_optimization(
-        optimization_id
+    (optimization_stop_outcome, response_code) = await run_in_threadpool(
+        optimization_service.stop_optimization, optimization_id
     )
     response.status_code = response_code
     return optimization_stop_outcome
@@ -136,14 +154,14 @@ async def post_stop_optimization(optimization_id: str, response: Response):
 async def post_create_configuration_instance(
     request_body: PartnerConfigurationCreateInstancePostRequestBody, response: Response
 ):
-    request_body_as_json = json.loads(
-        json.dumps(request_body, default=lambda o: o.to_json())
-    )
-    logger.info("Create Configuration Instance : %s", json.dumps(request_body_as_json))
+    request_body_as_json = request_body.dict()
+    logger.info("Create Configuration Instance : %s", request_body.json())
     (
         create_configuration_instance_outcome,
         response_code,
-    ) = optimization_service.create_configuration_instance(request_body_as_json)
+    ) = await run_in_threadpool(
+        optimization_service.create_configuration_instance, request_body_as_json
+    )
     response.status_code = response_code
     return create_configuration_instance_outcome
 
@@ -160,11 +178,34 @@ async def get_configuration_status(configuration_id: int, response: Response):
     (
         configuration_status,
         response_code,
-    ) = optimization_service.get_configuration_status(configuration_id)
+    ) = await run_in_threadpool(
+        optimization_service.get_configuration_status, configuration_id
+    )
     response.status_code = response_code
     return configuration_status
 
 
+#####################################
+# METRICS
+#####################################
+
+
+@router.get(
+    urls.METRICS,
+    tags=["Metrics"],
+    response_class=PlainTextResponse,
+    name="Optimization stage and client login metrics for Prometheus scraping.",
+)
+async def get_metrics():
+    return PlainTextResponse(
+        stage_metrics.render_prometheus()
+        + auth.render_prometheus(
+            {"cm": cm_service.auth_manager(), "topology": topology_service.auth_manager()}
+        ),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
 #####################################
 # KPI SERVICE
 #####################################
@@ -179,14 +220,12 @@ async def get_configuration_status(configuration_id: int, response: Response):
 async def post_retrieving_kpi(
     request_body: KpiRetrievePostRequestBody, response: Response
 ):
-    request_body_as_json = json.loads(
-        json.dumps(request_body, default=lambda o: o.to_json())
-    )
-    logger.info("Retrieve the KPIs : %s", json.dumps(request_body_as_json))
+    request_body_as_json = request_body.dict()
+    logger.info("Retrieve the KPIs : %s", request_body.json())
     (
         retrieve_kpi,
         response_code,
-    ) = kpi_service.retrieve_kpi(request_body_as_json)
+    ) = await run_in_threadpool(kpi_service.retrieve_kpi, request_body_as_json)
     response.status_code = response_code
     return retrieve_kpi
 
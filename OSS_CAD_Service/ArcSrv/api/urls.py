@@ -16,6 +16,8 @@ CONFIGURATION_STATUS_WITH_ID = "/configurations/{configuration_id}/status"
 
 KPIS = "/kpis/"
 
+METRICS = "/metrics"
+
 TOPOLOGY = "/topology"
 TOPOLOGY_LIST_GNBS = "/gnbs"
 TOPOLOGY_GET_GNB_BY_ID = "/gnbs/{gnb_id}"
@@ -22,7 +22,8 @@ async def streaming_json_async_generator(generator, **kwargs):
     yield "]"
 
 
-async def streaming_json_generator(generator, **kwargs):
+# A plain generator, so StreamingResponse runs the blocking iteration of the generator in the thread pool
+def streaming_json_generator(generator, **kwargs):
     yield "["
     for idx, item in enumerate(generator):
         if idx > 0:
@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+# coding: utf-8
+#
+# Copyright Ericsson (c) 2023
+#
+# ARC Benchmark - API load
+# Measures the latency of concurrent optimization status polls and create calls against the ARC Rest API
+# Usage (from OSS_CAD_Service, as the service reads its resources from ./ArcSrv/resources):
+#   PYTHONPATH=ArcSrv python -m benchmark.bench_api_load [--concurrency 1 8 32 64] [--output results.json]
+#   - The API runs with uvicorn in a spawned server process, the clients run on threads of this process
+#   - MongoDB is replaced by an in-memory stand-in that blocks for --db-latency milliseconds per query,
+#     like a synchronous mongoengine round trip
+#   - With --inline the handlers call the services on the event loop instead of the thread pool,
+#     to compare with the blocking request layer
+#   - The latency percentiles per concurrency level are written as JSON, they stay flat as concurrency rises
+#     until the API worker threads or the CPUs of the host are saturated
+import argparse
+import concurrent.futures
+import datetime
+import json
+import multiprocessing
+import platform
+import socket
+import sys
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+import requests
+from bson import ObjectId
+from configs import optimization_config
+
+CONCURRENCY_LEVELS = (1, 8, 32, 64)
+SERVER_START_SECONDS = 30
+
+CREATE_BODY = {
+    "selectedNodes": {
+        "gnbIdList": [
+            {"gnbId": 208727, "cmHandle": "3F0EA5DD12A97B6F72ED2ED1ADD1D449"},
+            {"gnbId": 208731, "cmHandle": "07148148A84D38E0404CFAEB5CA09309"},
+        ]
+    },
+    "unwantedNodePairs": {"gnbPairsList": [{"pGnbduId": 208727, "sGnbduId": 208731}]},
+    "mandatoryNodePairs": {"gnbPairsList": []},
+}
+
+
+class InMemoryOptimizations:
+    """Stand-in for the database service calls of the optimization service, every call blocks for the latency"""
+
+    def __init__(self, latency_seconds):
+        self.latency_seconds = latency_seconds
+        self.documents = {}
+        self.lock = threading.Lock()
+
+    def persist_gnbdus(self, selected_nodes):
+        time.sleep(self.latency_seconds)
+
+    def persist_newly_created_optimization_instance(
+        self, creation_date, status, *node_lists
+    ):
+        time.sleep(self.latency_seconds)
+        optimization_id = str(ObjectId())
+        with self.lock:
+            self.documents[optimization_id] = SimpleNamespace(
+                status=status, result_links=[], stage_metrics=[]
+            )
+        return optimization_id
+
+    def get_optimization_by_id(self, _id, collection_name):
+        time.sleep(self.latency_seconds)
+        with self.lock:
+            return self.documents.get(_id)
+
+
+async def _run_inline(function, *args):
+    return function(*args)
+
+
+async def _no_scheduler_tasks():
+    return []
+
+
+async def _stop_no_scheduler_tasks(tasks):
+    pass
+
+
+# Entry point of the server process
+def serve(port, latency_seconds, inline):
+    import api
+    import uvicorn
+    from api import api_server
+    from services import database_service
+
+    optimizations = InMemoryOptimizations(latency_seconds)
+    patches = [
+        patch.object(database_service, name, getattr(optimizations, name))
+        for name in (
+            "persist_gnbdus",
+            "persist_newly_created_optimization_instance",
+            "get_optimization_by_id",
+        )
+    ]
+    # The NodeRelation discovery of the startup needs the topology and CM services
+    patches.append(patch.object(api, "start_scheduler", _no_scheduler_tasks))
+    patches.append(patch.object(api, "stop_scheduler", _stop_no_scheduler_tasks))
+    if inline:
+        patches.append(patch.object(api_server, "run_in_threadpool", _run_inline))
+    for service_patch in patches:
+        service_patch.start()
+    uvicorn.run(api.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def _free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def _wait_for_server(base_url, server):
+    deadline = time.monotonic() + SERVER_START_SECONDS
+    while server.is_alive() and time.monotonic() < deadline:
+        try:
+            requests.get(base_url + "/metrics", timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    raise RuntimeError("ARC Rest API did not start on {}".format(base_url))
+
+
+def _percentiles(latencies):
+    if not latencies:
+        return None
+    milliseconds = np.array(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "p50_ms": float(np.percentile(milliseconds, 50)),
+        "p95_ms": float(np.percentile(milliseconds, 95)),
+        "p99_ms": float(np.percentile(milliseconds, 99)),
+        "max_ms": float(milliseconds.max()),
+    }
+
+
+"""
+Summary: Run the clients of one concurrency level
+Description:
+        - Every client thread keeps its own HTTP session and sends requests_per_client requests one after
+          the other, every create_every-th request is a create call, the others poll the status of an
+          optimization created before
+params:
+    base_url(str) : URL of the API
+    optimization_id(str) : optimization ID of the status polls
+    concurrency(int) : number of client threads
+    requests_per_client(int) : requests sent by every client
+    create_every(int) : one create call per create_every requests
+"""
+
+
+def run_level(
+    base_url, optimization_id, concurrency, requests_per_client, create_every
+):
+    status_url = "{}/optimizations/{}/status".format(base_url, optimization_id)
+    create_url = base_url + "/optimizations/"
+
+    def client(number):
+        latencies = {"status": [], "create": []}
+        with requests.Session() as session:
+            for request in range(requests_per_client):
+                create = (number + request) % create_every == 0
+                start = time.perf_counter()
+                if create:
+                    response = session.post(create_url, json=CREATE_BODY)
+                else:
+                    response = session.get(status_url)
+                elapsed = time.perf_counter() - start
+                response.raise_for_status()
+                latencies["create" if create else "status"].append(elapsed)
+        return latencies
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(client, range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "requests_per_second": concurrency * requests_per_client / elapsed,
+        "status": _percentiles(
+            [latency for result in results for latency in result["status"]]
+        ),
+        "create": _percentiles(
+            [latency for result in results for latency in result["create"]]
+        ),
+    }
+
+
+def benchmark(
+    concurrency_levels, requests_per_client, create_every, latency_seconds, inline
+):
+    port = _free_port()
+    base_url = "http://127.0.0.1:{}".format(port)
+    server = multiprocessing.get_context("spawn").Process(
+        target=serve, args=(port, latency_seconds, inline)
+    )
+    server.start()
+    try:
+        _wait_for_server(base_url, server)
+        response = requests.post(base_url + "/optimizations/", json=CREATE_BODY)
+        response.raise_for_status()
+        optimization_id = response.json()["optimizationId"]
+        return [
+            run_level(
+                base_url,
+                optimization_id,
+                concurrency,
+                requests_per_client,
+                create_every,
+            )
+            for concurrency in concurrency_levels
+        ]
+    finally:
+        server.terminate()
+        server.join()
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=list(CONCURRENCY_LEVELS)
+    )
+    parser.add_argument("--requests-per-client", type=int, default=20)
+    parser.add_argument(
+        "--create-every", type=int, default=5, help="one create call per N requests"
+    )
+    parser.add_argument(
+        "--db-latency", type=float, default=10.0, help="milliseconds per query"
+    )
+    parser.add_argument(
+        "--inline",
+        action="store_true",
+        help="call the services on the event loop, without the thread pool",
+    )
+    parser.add_argument("--output", help="JSON file, standard output if not given")
+    arguments = parser.parse_args(arguments)
+    results = {
+        "date": datetime.datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "api_worker_threads": int(optimization_config.api_worker_threads),
+        "db_latency_ms": arguments.db_latency,
+        "inline": arguments.inline,
+        "levels": benchmark(
+            arguments.concurrency,
+            arguments.requests_per_client,
+            arguments.create_every,
+            arguments.db_latency / 1000,
+            arguments.inline,
+        ),
+    }
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
+
+# EOF
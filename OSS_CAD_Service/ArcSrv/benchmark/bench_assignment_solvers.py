@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# coding: utf-8
+#
+# Copyright Ericsson (c) 2023
+#
+# ARC Benchmark - Link assignment solvers
+# Compares the greedy and b_matching solvers of bb_configuration.assign_bb_links on random networks
+# Usage (from ArcSrv): python -m benchmark.bench_assignment_solvers [gNB counts]
+#   - Prints time and total ARC value per solver, and the ARC value gain of b_matching over greedy
+import sys
+import time
+
+from benchmark.bench_link_assignment import LINKS_PER_GNB, random_bb_link_value_list
+from optimization import bb_configuration, definitions, evaluate
+
+GNB_COUNTS = (1_000, 10_000, 50_000)
+
+
+def main(gnb_counts=GNB_COUNTS):
+    print(
+        "{:>8} {:>10} {:>12} {:>10} {:>12} {:>10} {:>8}".format(
+            "gNBs", "links", "solver", "seconds", "ARC value", "gain", "gain %"
+        )
+    )
+    for gnb_count in gnb_counts:
+        bb_link_value_list = random_bb_link_value_list(gnb_count * LINKS_PER_GNB)
+        gnb_universe = bb_configuration.get_gnb_universe(bb_link_value_list)
+        greedy_value = None
+        for solver in bb_configuration.ASSIGNMENT_SOLVERS:
+            start = time.perf_counter()
+            bb_link_resulted_df = bb_configuration.assign_bb_links(
+                bb_link_value_list.copy(),
+                definitions.MAX_BB_PARTNERS,
+                gnb_universe,
+                solver,
+            )
+            elapsed = time.perf_counter() - start
+            arc_value = evaluate.calculate_arc_value(bb_link_resulted_df)
+            if greedy_value is None:
+                greedy_value = arc_value
+            print(
+                "{:>8} {:>10} {:>12} {:>10.3f} {:>12.1f} {:>10.1f} {:>8.2f}".format(
+                    len(gnb_universe),
+                    len(bb_link_value_list),
+                    solver,
+                    elapsed,
+                    arc_value,
+                    arc_value - greedy_value,
+                    (arc_value / greedy_value - 1) * 100,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main(tuple(map(int, sys.argv[1:])) or GNB_COUNTS)
+
+# EOF
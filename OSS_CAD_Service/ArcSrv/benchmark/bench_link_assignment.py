@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# coding: utf-8
+#
+# Copyright Ericsson (c) 2023
+#
+# ARC Benchmark - Link assignment
+# Times bb_configuration.assign_bb_links on random link lists of growing size
+# Usage (from ArcSrv): python -m benchmark.bench_link_assignment
+#   - The time per link should stay flat while the link count grows
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from optimization import bb_configuration, definitions
+
+LINK_COUNTS = (25_000, 50_000, 100_000, 200_000, 400_000)
+LINKS_PER_GNB = 10
+
+
+def random_bb_link_value_list(link_count, seed=0):
+    rng = np.random.default_rng(seed)
+    gnb_count = max(link_count // LINKS_PER_GNB, 2)
+    return pd.DataFrame(
+        data={
+            "usability": np.sort(rng.random(link_count))[::-1],
+            "gNb0": rng.integers(0, gnb_count, link_count),
+            "gNb1": rng.integers(0, gnb_count, link_count),
+            "linkUsed": False,
+        }
+    )
+
+
+def main(link_counts=LINK_COUNTS):
+    print("{:>10} {:>10} {:>12}".format("links", "seconds", "ns/link"))
+    for link_count in link_counts:
+        bb_link_value_list = random_bb_link_value_list(link_count)
+        start = time.perf_counter()
+        bb_configuration.assign_bb_links(
+            bb_link_value_list, definitions.MAX_BB_PARTNERS
+        )
+        elapsed = time.perf_counter() - start
+        print(
+            "{:>10} {:>10.3f} {:>12.1f}".format(
+                link_count, elapsed, elapsed / link_count * 1e9
+            )
+        )
+
+
+if __name__ == "__main__":
+    main(tuple(map(int, sys.argv[1:])) or LINK_COUNTS)
+
+# EOF
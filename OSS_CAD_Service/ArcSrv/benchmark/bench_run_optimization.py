@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+# coding: utf-8
+#
+# Copyright Ericsson (c) 2023
+#
+# ARC Benchmark - Optimization stages
+# Times every stage of build_solution.run_optimization on synthetic networks and records the peak memory
+# Usage (from OSS_CAD_Service, as the service reads its resources from ./ArcSrv/resources):
+#   PYTHONPATH=ArcSrv python -m benchmark.bench_run_optimization [--gnbs 1000 10000] [--output results.json]
+#   - The network is generated by synthetic_network.py, NCMP, the PM data file, MongoDB and the object storage
+#     are replaced by in-memory stand-ins, so the benchmark runs locally
+#   - Every stage function is wrapped with a timer, stage times include the stages called inside them,
+#     the run_optimization stage is the whole optimization
+#   - A second run with tracemalloc records the peak traced memory per stage, the process peak RSS is recorded too
+#   - The results are written as JSON, to compare optimizer changes across commits
+import argparse
+import functools
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from contextlib import ExitStack
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+from benchmark import synthetic_network
+from optimization import (
+    bb_configuration,
+    build_solution,
+    capability_matrix,
+    definitions,
+    evaluate,
+    get_data,
+    incremental,
+    local_search,
+    partitioning,
+    report,
+    usability_matrix,
+)
+from services import database_service
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+GNB_COUNTS = (1_000, 10_000)
+
+# Stage functions of run_optimization as (module, function name), in call order
+STAGES = (
+    (get_data, "get_coverage_data"),
+    (bb_configuration, "check_coverage_data_and_mandatory_links"),
+    (get_data, "get_predicted_capacity"),
+    (partitioning, "build_partitioned_bb_links"),
+    (bb_configuration, "create_bb_link_value_list_from_coverage"),
+    (capability_matrix, "build_capability_matrix"),
+    (usability_matrix, "build_usability_matrix"),
+    (bb_configuration, "create_bb_link_value_list"),
+    (bb_configuration, "check_unwanted_bb_link"),
+    (bb_configuration, "add_mandatory_bb_links"),
+    (bb_configuration, "assign_bb_links"),
+    (local_search, "improve_bb_links"),
+    (bb_configuration, "get_bb_link_list"),
+    (bb_configuration, "save_bb_links_result"),
+    (incremental, "save_link_values"),
+    (evaluate, "calculate_arc_value"),
+    (report, "save_in_bucket"),
+)
+
+# Settings of definitions.py recorded with the results
+SETTINGS = (
+    "FUSED_PIPELINE",
+    "CAPABILITY_LIMIT",
+    "MAX_BB_PARTNERS",
+    "MAX_EXTERNAL_CELLS_SECONDARY_GNB",
+    "ASSIGNMENT_SOLVER",
+    "PARTITION_WORKERS",
+    "LOCAL_SEARCH_WORKERS",
+    "LOCAL_SEARCH_TIME_BUDGET",
+)
+
+
+class InMemoryDocument:
+    """Stand-in for the Optimization collection model document, keeps the updated fields and the statuses"""
+
+    def __init__(self):
+        self.restricted_links = []
+        self.mandatory_links = []
+        self.statuses = []
+
+    def update(self, **kwargs):
+        if "status" in kwargs:
+            self.statuses.append(kwargs["status"])
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+
+class InMemoryObjectStorage:
+    """Stand-in for the Minio client of report.py, keeps the size of the uploaded objects"""
+
+    def __init__(self):
+        self.objects = {}
+
+    def bucket_exists(self, bucket_name):
+        return True
+
+    def put_object(self, bucket_name, object_name, data, length, **kwargs):
+        self.objects[object_name] = length
+
+
+class StageRecorder:
+    """Wraps stage functions with a timer and, while tracemalloc is tracing, a peak memory counter"""
+
+    def __init__(self):
+        self.stages = {}
+        # Traced memory at the start of the running stages and their peak before a nested stage reset it
+        self._running = []
+
+    def wrap(self, name, function):
+        @functools.wraps(function)
+        def recorded(*args, **kwargs):
+            tracing = tracemalloc.is_tracing()
+            if tracing:
+                current, peak = tracemalloc.get_traced_memory()
+                if self._running:
+                    self._running[-1][1] = max(self._running[-1][1], peak)
+                self._running.append([current, current])
+                tracemalloc.reset_peak()
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                record = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0})
+                record["calls"] += 1
+                record["seconds"] += elapsed
+                if tracing:
+                    start_memory, peak = self._running.pop()
+                    peak = max(peak, tracemalloc.get_traced_memory()[1])
+                    record["peak_bytes"] = max(
+                        record.get("peak_bytes", 0), peak - start_memory
+                    )
+                    if self._running:
+                        self._running[-1][1] = max(self._running[-1][1], peak)
+
+        return recorded
+
+
+"""
+Summary: Run the optimization of a synthetic network once
+Description:
+        - Every stage of STAGES that exists in the tree is wrapped by the recorder
+        - The NCMP request returns the raw coverage data of the network
+        - The predicted capacity is calculated from the raw PM counters of the network as for the PM data file,
+          without the capacity snapshot
+        - The link values and the report are kept in memory
+params:
+    network(SyntheticNetwork) : the network, see synthetic_network.generate_network
+    recorder(StageRecorder) : recorder of the stage times
+returns:
+    the in-memory document with the result links
+"""
+
+
+def run_once(network, recorder):
+    document = InMemoryDocument()
+
+    def get_predicted_capacity(bb_dict, document):
+        document.update(status=get_data.ResponseStatus.OPTIMIZATION_COLLECTING_PM_DATA)
+        return get_data.predict_capacity(
+            get_data.get_clean_capacity_data(
+                network.raw_capacity_data, definitions.DIGITS_FOR_CELL_ID
+            ),
+            document,
+        )
+
+    with ExitStack() as stack:
+        stack.enter_context(
+            patch.object(
+                get_data,
+                "get_raw_coverage_data_ncmp",
+                lambda bb_dict, document: network.raw_coverage_data,
+            )
+        )
+        stack.enter_context(
+            patch.object(get_data, "get_predicted_capacity", get_predicted_capacity)
+        )
+        stack.enter_context(
+            patch.object(database_service, "persist_link_values", lambda *args: None)
+        )
+        stack.enter_context(
+            patch.object(database_service, "prune_link_values", lambda keep: None)
+        )
+        stack.enter_context(
+            patch.object(
+                report, "establish_object_storage_connection", InMemoryObjectStorage
+            )
+        )
+        for module, name in STAGES:
+            if hasattr(module, name):
+                stack.enter_context(
+                    patch.object(
+                        module, name, recorder.wrap(name, getattr(module, name))
+                    )
+                )
+        recorder.wrap("run_optimization", build_solution.run_optimization)(
+            network.bb_dict,
+            network.unwanted_bb_links,
+            network.mandatory_bb_links,
+            document,
+        )
+    return document
+
+
+"""
+Summary: Benchmark one network scale
+Description:
+        - Runs the optimization `repeat` times and keeps the stage times of the fastest run
+        - Runs it once more with tracemalloc for the peak memory per stage
+params:
+    gnb_count(int) : number of gNBs
+    cells_per_gnb(int) : number of cells per gNB
+    neighbours_per_cell(int) : number of coverage relations per cell
+    repeat(int) : number of timed runs
+    trace_memory(bool) : run with tracemalloc for the peak memory per stage
+    seed(int) : seed of the network generator
+"""
+
+
+def benchmark_scale(
+    gnb_count, cells_per_gnb, neighbours_per_cell, repeat, trace_memory, seed
+):
+    start = time.perf_counter()
+    network = synthetic_network.generate_network(
+        gnb_count, cells_per_gnb, neighbours_per_cell, seed=seed
+    )
+    generation_seconds = time.perf_counter() - start
+    best = None
+    for _ in range(repeat):
+        recorder = StageRecorder()
+        start = time.perf_counter()
+        document = run_once(network, recorder)
+        total_seconds = time.perf_counter() - start
+        if best is None or total_seconds < best[0]:
+            best = (total_seconds, recorder.stages)
+    total_seconds, stages = best
+    result = {
+        "gnb_count": gnb_count,
+        "cells_per_gnb": cells_per_gnb,
+        "neighbours_per_cell": neighbours_per_cell,
+        "coverage_rows": len(network.raw_coverage_data),
+        "unwanted_links": len(network.unwanted_bb_links),
+        "mandatory_links": len(network.mandatory_bb_links),
+        "result_links": len(getattr(document, "result_links", [])),
+        "status": document.statuses[-1] if document.statuses else None,
+        "generation_seconds": generation_seconds,
+        "total_seconds": total_seconds,
+        "stages": stages,
+    }
+    if trace_memory:
+        recorder = StageRecorder()
+        tracemalloc.start()
+        try:
+            run_once(network, recorder)
+        finally:
+            tracemalloc.stop()
+        for name, record in recorder.stages.items():
+            stages.setdefault(name, {"calls": record["calls"], "seconds": None})
+            stages[name]["peak_bytes"] = record["peak_bytes"]
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux
+        result["max_rss_bytes"] = (
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        )
+    return result
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--gnbs", type=int, nargs="+", default=list(GNB_COUNTS))
+    parser.add_argument("--cells-per-gnb", type=int, default=3)
+    parser.add_argument("--neighbours-per-cell", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--staged", action="store_true", help="use the stage by stage pipeline"
+    )
+    parser.add_argument(
+        "--no-memory", action="store_true", help="skip the tracemalloc run"
+    )
+    parser.add_argument("--output", help="JSON file, standard output if not given")
+    arguments = parser.parse_args(arguments)
+    with ExitStack() as stack:
+        if arguments.staged:
+            stack.enter_context(patch.object(definitions, "FUSED_PIPELINE", False))
+        results = {
+            "commit": _commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "settings": {name: getattr(definitions, name) for name in SETTINGS},
+            "scales": [
+                benchmark_scale(
+                    gnb_count,
+                    arguments.cells_per_gnb,
+                    arguments.neighbours_per_cell,
+                    arguments.repeat,
+                    not arguments.no_memory,
+                    arguments.seed,
+                )
+                for gnb_count in arguments.gnbs
+            ],
+        }
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
+
+# EOF
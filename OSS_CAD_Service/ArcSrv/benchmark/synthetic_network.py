@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# coding: utf-8
+#
+# Copyright Ericsson (c) 2023
+#
+# ARC Benchmark - Synthetic network generator
+# Generates the optimization input of a random network at a configurable scale, used by bench_run_optimization.py
+# Functionality and script layout:
+#   - gNBs on a ring, every gNB with cells_per_gnb cells
+#   - Coverage relations from every cell to neighbours_per_cell cells of the gNB itself and of nearby gNBs,
+#     with coded usefulness values as returned by NCMP (low values, high hit rate, are rare)
+#   - Raw PM capacity counters per cell as read from the PM data file
+#   - Unwanted and mandatory gNB pairs among the neighbouring gNBs
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from optimization import definitions
+
+FIRST_GNB_ID = 200000
+RB_SYMBOLS_AVAILABLE = 20442253104
+
+"""
+Summary: Optimization input of a synthetic network
+params:
+    bb_dict({gnb_id: "cm_handle"}) : dictionary containing gNbIds and corresponding cmHandles
+    raw_coverage_data(DataFrame) : pNCI, sNCI, coded_usefulness as returned by get_data.get_raw_coverage_data_ncmp
+    raw_capacity_data(DataFrame) : pmMacRBSymAvailDl, pmMacRBSymUsedPdschTypeA, sNCI as read from the PM data file
+    unwanted_bb_links([(p_gnbdu_id, s_gnbdu_id)]) : list containing unwanted primary and secondary gNbId tuples
+    mandatory_bb_links([(p_gnbdu_id, s_gnbdu_id)]) : list containing mandatory primary and secondary gNbId tuples
+"""
+
+
+@dataclass
+class SyntheticNetwork:
+    bb_dict: dict
+    raw_coverage_data: pd.DataFrame
+    raw_capacity_data: pd.DataFrame
+    unwanted_bb_links: list
+    mandatory_bb_links: list
+
+
+"""
+Summary: Generate a synthetic network
+Description:
+        - The neighbour cells of a cell are drawn from the gNBs at most neighbour_gnb_distance gNBs away on the ring,
+          so the network has the local structure of a real network
+        - Repeated relations are removed, so a cell may have a few less than neighbours_per_cell relations
+        - unwanted_share and mandatory_share are the number of unwanted and mandatory gNB pairs per gNB
+params:
+    gnb_count(int) : number of gNBs
+    cells_per_gnb(int) : number of cells per gNB, at most 16**DIGITS_FOR_CELL_ID
+    neighbours_per_cell(int) : number of coverage relations per cell
+    neighbour_gnb_distance(int) : distance on the ring of the farthest neighbour gNB
+    unwanted_share(float) : unwanted gNB pairs per gNB
+    mandatory_share(float) : mandatory gNB pairs per gNB
+    seed(int) : seed of the random generator
+"""
+
+
+def generate_network(
+    gnb_count,
+    cells_per_gnb=3,
+    neighbours_per_cell=30,
+    neighbour_gnb_distance=5,
+    unwanted_share=0.01,
+    mandatory_share=0.01,
+    seed=0,
+):
+    rng = np.random.default_rng(seed)
+    cell_bits = 4 * definitions.DIGITS_FOR_CELL_ID
+    gnb_ids = FIRST_GNB_ID + np.arange(gnb_count, dtype=np.int64)
+    cells = (np.repeat(gnb_ids, cells_per_gnb) << cell_bits) | np.tile(
+        np.arange(cells_per_gnb, dtype=np.int64), gnb_count
+    )
+    p_cells = np.repeat(cells, neighbours_per_cell)
+    s_gnbs = _neighbour_gnbs(
+        p_cells >> cell_bits, gnb_count, neighbour_gnb_distance, rng
+    )
+    s_cells = (s_gnbs << cell_bits) | rng.integers(0, cells_per_gnb, len(p_cells))
+    relations = p_cells != s_cells
+    raw_coverage_data = pd.DataFrame(
+        data={
+            "pNCI": p_cells[relations],
+            "sNCI": s_cells[relations],
+            "coded_usefulness": rng.geometric(0.1, np.count_nonzero(relations)),
+        }
+    ).drop_duplicates(["pNCI", "sNCI"], ignore_index=True)
+    raw_capacity_data = pd.DataFrame(
+        data={
+            "pmMacRBSymAvailDl": np.full(len(cells), RB_SYMBOLS_AVAILABLE),
+            "pmMacRBSymUsedPdschTypeA": (
+                RB_SYMBOLS_AVAILABLE * rng.beta(2, 3, len(cells))
+            ).astype(np.int64),
+            "sNCI": cells,
+        }
+    )
+    return SyntheticNetwork(
+        bb_dict={int(gnb_id): "cm_handle_{}".format(gnb_id) for gnb_id in gnb_ids},
+        raw_coverage_data=raw_coverage_data,
+        raw_capacity_data=raw_capacity_data,
+        unwanted_bb_links=_neighbour_pairs(
+            gnb_ids, int(gnb_count * unwanted_share), neighbour_gnb_distance, rng
+        ),
+        mandatory_bb_links=_neighbour_pairs(
+            gnb_ids, int(gnb_count * mandatory_share), neighbour_gnb_distance, rng
+        ),
+    )
+
+
+def _neighbour_gnbs(gnbs, gnb_count, neighbour_gnb_distance, rng):
+    offsets = rng.integers(
+        -neighbour_gnb_distance, neighbour_gnb_distance + 1, len(gnbs)
+    )
+    return FIRST_GNB_ID + (gnbs - FIRST_GNB_ID + offsets) % gnb_count
+
+
+"""
+Summary: Distinct pairs of different gNBs at most neighbour_gnb_distance gNBs apart
+"""
+
+
+def _neighbour_pairs(gnb_ids, pair_count, neighbour_gnb_distance, rng):
+    p_gnbs = rng.choice(gnb_ids, pair_count)
+    s_gnbs = _neighbour_gnbs(p_gnbs, len(gnb_ids), neighbour_gnb_distance, rng)
+    return sorted(
+        {
+            (int(p_gnb), int(s_gnb))
+            for p_gnb, s_gnb in zip(p_gnbs, s_gnbs)
+            if p_gnb != s_gnb
+        }
+    )
+
+
+# EOF
@@ -0,0 +1,175 @@
+# COPYRIGHT Ericsson 2023
+#
+# The copyright to the computer program(s) herein is the property of
+# Ericsson Inc. The programs may be used and/or copied only with written
+# permission from Ericsson Inc. or in accordance with the terms and
+# conditions stipulated in the agreement/contract under which the
+# program(s) have been supplied.
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, Mapping, Optional
+
+# Prometheus metrics as (name, type, help, field of the metrics snapshot)
+PROMETHEUS_METRICS = (
+    (
+        "arc_client_auth_logins_total",
+        "counter",
+        "Login round trips of the client.",
+        "logins",
+    ),
+    (
+        "arc_client_auth_login_failures_total",
+        "counter",
+        "Failed login round trips of the client.",
+        "failures",
+    ),
+    (
+        "arc_client_auth_proactive_refreshes_total",
+        "counter",
+        "Logins of the client done before the session expired.",
+        "proactive_refreshes",
+    ),
+    (
+        "arc_client_auth_coalesced_total",
+        "counter",
+        "Re-logins of the client skipped because another caller logged in meanwhile.",
+        "coalesced",
+    ),
+    (
+        "arc_client_auth_login_seconds_total",
+        "counter",
+        "Time spent in login round trips of the client.",
+        "login_seconds",
+    ),
+)
+
+
+# Single-flight login of a connection: of the callers that find the session expired at the same time, only the
+# first logs in, the others wait for it and reuse its session. With a session_ttl the session is refreshed
+# proactively once it is older than session_ttl - refresh_margin seconds
+class AuthManager(object):
+    def __init__(
+        self,
+        login: Callable[[], None],
+        session_ttl: Optional[float] = None,
+        refresh_margin: float = 60,
+    ):
+        self._login = login
+        self.__session_ttl = session_ttl
+        self.__refresh_margin = refresh_margin
+        # Held for the whole login, the state lock only for the bookkeeping
+        self.__login_lock = threading.Lock()
+        self.__state_lock = threading.Lock()
+        # Login attempts so far, a caller passes the value read before its request to refresh
+        self._attempts = 0
+        self.__expires_at = None
+        self.__metrics = dict(
+            logins=0, failures=0, proactive_refreshes=0, coalesced=0, login_seconds=0.0
+        )
+
+    # Called before a request, logs in when the session is about to expire. Returns the login attempts to
+    # pass to refresh if the request is rejected
+    def ensure_fresh(self) -> int:
+        attempts = self._attempts
+        if self._expiring():
+            try:
+                self.refresh(attempts, proactive=True)
+            except Exception as e:
+                # The current session may still be valid, a rejected request logs in again
+                logging.warning(f"Proactive login failed: {e}")
+        return self._attempts
+
+    # Logs in unless another caller tried to log in since the given attempts were read
+    def refresh(self, attempts: int, proactive: bool = False):
+        with self.__login_lock:
+            if self._coalesced(attempts):
+                return
+            start = time.perf_counter()
+            try:
+                self._login()
+            except Exception:
+                self._login_done(start, proactive, failed=True)
+                raise
+            self._login_done(start, proactive)
+
+    def metrics(self) -> dict:
+        with self.__state_lock:
+            return dict(self.__metrics)
+
+    def _expiring(self) -> bool:
+        expires_at = self.__expires_at
+        return (
+            expires_at is not None
+            and time.monotonic() >= expires_at - self.__refresh_margin
+        )
+
+    def _coalesced(self, attempts: int) -> bool:
+        if attempts == self._attempts:
+            return False
+        with self.__state_lock:
+            self.__metrics["coalesced"] += 1
+        return True
+
+    def _login_done(self, start: float, proactive: bool, failed: bool = False):
+        with self.__state_lock:
+            # Counted when the login is done, requests sent during the login still carry the old session
+            self._attempts += 1
+            self.__metrics["logins"] += 1
+            self.__metrics["login_seconds"] += time.perf_counter() - start
+            if failed:
+                self.__metrics["failures"] += 1
+                # No proactive logins until a login succeeds again
+                self.__expires_at = None
+                return
+            if proactive:
+                self.__metrics["proactive_refreshes"] += 1
+            if self.__session_ttl is not None:
+                self.__expires_at = time.monotonic() + self.__session_ttl
+        logging.debug("Logged in, attempt %d", self._attempts)
+
+
+# AuthManager of an async connection, login is a coroutine function and the callers wait on an asyncio lock
+class AsyncAuthManager(AuthManager):
+    def __init__(
+        self,
+        login: Callable[[], Awaitable[None]],
+        session_ttl: Optional[float] = None,
+        refresh_margin: float = 60,
+    ):
+        super().__init__(login, session_ttl, refresh_margin)
+        self.__login_lock = asyncio.Lock()
+
+    async def ensure_fresh(self) -> int:
+        attempts = self._attempts
+        if self._expiring():
+            try:
+                await self.refresh(attempts, proactive=True)
+            except Exception as e:
+                logging.warning(f"Proactive login failed: {e}")
+        return self._attempts
+
+    async def refresh(self, attempts: int, proactive: bool = False):
+        async with self.__login_lock:
+            if self._coalesced(attempts):
+                return
+            start = time.perf_counter()
+            try:
+                await self._login()
+            except Exception:
+                self._login_done(start, proactive, failed=True)
+                raise
+            self._login_done(start, proactive)
+
+
+def render_prometheus(managers: Mapping[str, AuthManager]) -> str:
+    snapshots = {client: manager.metrics() for client, manager in managers.items()}
+    lines = []
+    for metric, metric_type, description, field in PROMETHEUS_METRICS:
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} {metric_type}")
+        for client, snapshot in sorted(snapshots.items()):
+            lines.append(f'{metric}{{client="{client}"}} {snapshot[field]}')
+    return "\n".join(lines) + "\n"
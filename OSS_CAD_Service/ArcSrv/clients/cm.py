@@ -8,7 +8,7 @@
 
 import re
 
-from clients.connections import RestConnection, HttpMethod
+from clients.connections import AsyncRestConnection, RestConnection, HttpMethod
 from entities.references import ExternalId, Dn, MANAGED_ELEMENT
 from entities.managed_objects import ManagedObject
 from functools import lru_cache
@@ -55,6 +55,25 @@ class CmClient(object):
         return self.__connection.request_json(HttpMethod.GET, f"{CmClient.CONTEXT_PATH}{cm_handle}")
 
     def create_resource(self, external_id: ExternalId, manage_object: ManagedObject):
+        self.__connection.request(HttpMethod.POST, **CmClient._create_request(external_id, manage_object))
+
+    def patch_resource(self, external_id: ExternalId, manage_object: ManagedObject, fields: Sequence):
+        self.__connection.request_json(HttpMethod.PATCH, **CmClient._patch_request(external_id, manage_object, fields))
+
+    def delete_resource(self, external_id: ExternalId):
+        self.__connection.request(HttpMethod.DELETE, **CmClient._delete_request(external_id))
+
+    def get_resource(self, external_id: ExternalId) -> ManagedObject:
+        return CmClient._single_resource(self.__connection.request_json(
+            HttpMethod.GET, **CmClient._get_request(external_id)))
+
+    def list_resources(self, external_id: ExternalId, filters: Tuple[ManagedObject] = tuple()) -> Sequence[ManagedObject]:
+        return CmClient._resources(self.__connection.request_json(
+            HttpMethod.GET, **CmClient._list_request(external_id, filters)))
+
+    # Path, params and body of the resource requests, shared with AsyncCmClient
+    @staticmethod
+    def _create_request(external_id: ExternalId, manage_object: ManagedObject):
         parent_ref = external_id.get_parent()
         params = {RESOURCE_IDENTIFIER: parent_ref.resource_identifier}
         body = {
@@ -63,10 +82,10 @@ class CmClient(object):
                 ATTRIBUTES: manage_object.attributes
             }]
         }
-        self.__connection.request(
-            HttpMethod.POST, CmClient.RESOURCE_PATH.format(cm_handle=external_id.cm_handle), params=params, json=body)
+        return dict(path=CmClient.RESOURCE_PATH.format(cm_handle=external_id.cm_handle), params=params, json=body)
 
-    def patch_resource(self, external_id: ExternalId, manage_object: ManagedObject, fields: Sequence):
+    @staticmethod
+    def _patch_request(external_id: ExternalId, manage_object: ManagedObject, fields: Sequence):
         parent_ref = external_id.get_parent()
         params = {RESOURCE_IDENTIFIER: parent_ref.resource_identifier}
         body = {
@@ -75,27 +94,34 @@ class CmClient(object):
                 ATTRIBUTES: dict(filter(lambda x: x[0] in fields, manage_object.attributes.items()))
             }]
         }
-        self.__connection.request_json(
-            HttpMethod.PATCH, CmClient.RESOURCE_PATH.format(cm_handle=external_id.cm_handle), params=params, json=body)
+        return dict(path=CmClient.RESOURCE_PATH.format(cm_handle=external_id.cm_handle), params=params, json=body)
 
-    def delete_resource(self, external_id: ExternalId):
+    @staticmethod
+    def _delete_request(external_id: ExternalId):
         params = {RESOURCE_IDENTIFIER: external_id.resource_identifier}
-        self.__connection.request(
-            HttpMethod.DELETE, CmClient.RESOURCE_PATH.format(cm_handle=external_id.cm_handle), params=params, json={})
+        return dict(path=CmClient.RESOURCE_PATH.format(cm_handle=external_id.cm_handle), params=params, json={})
 
-    def get_resource(self, external_id: ExternalId) -> ManagedObject:
+    @staticmethod
+    def _get_request(external_id: ExternalId):
         params = {RESOURCE_IDENTIFIER: external_id.resource_identifier}
+        return dict(path=CmClient.RESOURCE_PATH.format(cm_handle=external_id.cm_handle), params=params)
+
+    @staticmethod
+    def _list_request(external_id: ExternalId, filters: Tuple[ManagedObject]):
+        params = {RESOURCE_IDENTIFIER: external_id.resource_identifier,
+                  OPTIONS: CmClient._generate_options(filters or (ManagedObject(mo_type=external_id.type),))}
+        return dict(path=CmClient.RESOURCE_PATH.format(cm_handle=external_id.cm_handle), params=params)
+
+    @staticmethod
+    def _single_resource(response_json):
         mo_visitor = _MoVisitor()
-        mo_visitor.visit_object(self.__connection.request_json(
-            HttpMethod.GET, CmClient.RESOURCE_PATH.format(cm_handle=external_id.cm_handle), params=params))
+        mo_visitor.visit_object(response_json)
         return mo_visitor.result[0] if len(mo_visitor.result) == 1 else None
 
-    def list_resources(self, external_id: ExternalId, filters: Tuple[ManagedObject] = tuple()) -> Sequence[ManagedObject]:
-        params = {RESOURCE_IDENTIFIER: external_id.resource_identifier,
-                  OPTIONS: self._generate_options(filters or (ManagedObject(mo_type=external_id.type),))}
+    @staticmethod
+    def _resources(response_json):
         mo_visitor = _MoVisitor()
-        mo_visitor.visit_object(self.__connection.request_json(
-            HttpMethod.GET, CmClient.RESOURCE_PATH.format(cm_handle=external_id.cm_handle), params=params))
+        mo_visitor.visit_object(response_json)
         return mo_visitor.result
 
     @staticmethod
@@ -116,3 +142,34 @@ class CmClient(object):
             attributes.append(f"scope={';'.join(scopes)}")
 
         return ",".join(attributes)
+
+
+# Async variant of CmClient, for many NCMP requests in flight from one event loop
+class AsyncCmClient(object):
+    def __init__(self, connection: AsyncRestConnection):
+        self.__connection = connection
+
+    async def search_handle(self, **kwargs):
+        return await self.__connection.request_json(HttpMethod.POST, f"{CmClient.CONTEXT_PATH}searches", **kwargs)
+
+    async def get_handle_details(self, cm_handle: str):
+        return await self.__connection.request_json(HttpMethod.GET, f"{CmClient.CONTEXT_PATH}{cm_handle}")
+
+    async def create_resource(self, external_id: ExternalId, manage_object: ManagedObject):
+        await self.__connection.request(HttpMethod.POST, **CmClient._create_request(external_id, manage_object))
+
+    async def patch_resource(self, external_id: ExternalId, manage_object: ManagedObject, fields: Sequence):
+        await self.__connection.request_json(
+            HttpMethod.PATCH, **CmClient._patch_request(external_id, manage_object, fields))
+
+    async def delete_resource(self, external_id: ExternalId):
+        await self.__connection.request(HttpMethod.DELETE, **CmClient._delete_request(external_id))
+
+    async def get_resource(self, external_id: ExternalId) -> ManagedObject:
+        return CmClient._single_resource(await self.__connection.request_json(
+            HttpMethod.GET, **CmClient._get_request(external_id)))
+
+    async def list_resources(self, external_id: ExternalId,
+                             filters: Tuple[ManagedObject] = tuple()) -> Sequence[ManagedObject]:
+        return CmClient._resources(await self.__connection.request_json(
+            HttpMethod.GET, **CmClient._list_request(external_id, filters)))
@@ -6,16 +6,24 @@
 # conditions stipulated in the agreement/contract under which the
 # program(s) have been supplied.
 
+import asyncio
+import httpx
 import logging
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3 import Retry, exceptions, disable_warnings
-from .utils import validate_content_type
+from .auth import AsyncAuthManager, AuthManager
+from .utils import validate_content_type, validate_content_type_async
 from .constants import HttpHeader, HttpMethod, ContentType
 
 logging.getLogger("urllib3.connectionpool").setLevel(logging.ERROR)
 disable_warnings(exceptions.InsecureRequestWarning)
 RETRY_AFTER_STATUS_CODES = frozenset({413, 429, 500, 501, 502, 503, 504})
+# Retry policy of urllib3 Retry, repeated by AsyncRestConnection
+RETRY_BACKOFF_FACTOR = 1.1
+RETRY_BACKOFF_MAX = 120
+RETRY_ALLOWED_METHODS = frozenset({"DELETE", "GET", "HEAD", "OPTIONS", "PUT", "TRACE"})
+RETRY_AFTER_HEADER_STATUS_CODES = frozenset({413, 429, 503})
 
 
 class RestConnection(object):
@@ -25,6 +33,8 @@ class RestConnection(object):
         self.__username = username
         self.__password = password
         self.__tenant = kwargs.get('tenant', 'master')
+        # Concurrent requests rejected at the same time share one login
+        self.auth = AuthManager(self.__auth, kwargs.get('session_ttl'), kwargs.get('refresh_margin', 60))
 
     def __del__(self):
         self._session.close()
@@ -35,7 +45,7 @@ class RestConnection(object):
         self._session.mount(f"{kwargs.get('schema', 'https')}://", HTTPAdapter(
             max_retries=Retry(
                 total=kwargs.get('max_retries', 5),
-                backoff_factor=1.1,
+                backoff_factor=RETRY_BACKOFF_FACTOR,
                 status_forcelist=RETRY_AFTER_STATUS_CODES
             )))
 
@@ -46,13 +56,92 @@ class RestConnection(object):
 
     def request(self, method: HttpMethod, path: str, **kwargs) -> requests.Response:
         method, url = str(method.value), f"{self._url}{path}"
+        auth_attempts = self.auth.ensure_fresh()
         response = self._session.request(method, url, **kwargs)
         if (response.headers.get(HttpHeader.CONTENT_TYPE) or "").startswith(ContentType.HTML) or \
                 response.status_code == 401:
-            self.__auth()
+            self.auth.refresh(auth_attempts)
             response = self._session.request(method, url, **kwargs)
         response.raise_for_status()
         return response
 
     def request_json(self, method: HttpMethod, path: str, **kwargs):
         return validate_content_type(ContentType.JSON)(self.request)(method, path, **kwargs).json()
+
+
+# Async variant of RestConnection on an httpx connection pool with keep-alive, for many requests in flight
+# from one event loop
+class AsyncRestConnection(object):
+    def __init__(self, hostname: str, username: str, password: str, **kwargs):
+        pool_size = kwargs.get('pool_size', 100)
+        self._client = httpx.AsyncClient(
+            verify=False, timeout=kwargs.get('timeout'), transport=kwargs.get('transport'),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size,
+                                keepalive_expiry=kwargs.get('keepalive_expiry', 60)))
+        self._url = f"{kwargs.get('schema', 'https')}://{hostname}"
+        self.__username = username
+        self.__password = password
+        self.__tenant = kwargs.get('tenant', 'master')
+        self.__max_retries = kwargs.get('max_retries', 5)
+        # Concurrent requests rejected at the same time share one login
+        self.auth = AsyncAuthManager(self.__auth, kwargs.get('session_ttl'), kwargs.get('refresh_margin', 60))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def __auth(self):
+        auth_headers = {'X-Tenant': self.__tenant, 'X-Login': self.__username, 'X-Password': self.__password}
+        resp = await self.__send(str(HttpMethod.POST.value), f"{self._url}/auth/v1/login", headers=auth_headers)
+        resp.raise_for_status()
+
+    async def __send(self, method: str, url: str, **kwargs):
+        for retry in range(self.__max_retries + 1):
+            try:
+                response = await self._client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                # Like urllib3, connection errors are retried for every method, read errors for idempotent ones
+                if retry == self.__max_retries or not (
+                        isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)) or method in RETRY_ALLOWED_METHODS):
+                    raise
+                delay = None
+            else:
+                if retry == self.__max_retries or response.status_code not in RETRY_AFTER_STATUS_CODES or \
+                        method not in RETRY_ALLOWED_METHODS:
+                    return response
+                delay = AsyncRestConnection._retry_after(response)
+                await response.aclose()
+            await asyncio.sleep(AsyncRestConnection._backoff(retry + 1) if delay is None else delay)
+
+    @staticmethod
+    def _retry_after(response):
+        retry_after = response.headers.get("Retry-After", "")
+        if response.status_code in RETRY_AFTER_HEADER_STATUS_CODES and retry_after.isdigit():
+            return int(retry_after)
+        return None
+
+    # Backoff of urllib3 Retry before the given consecutive retry
+    @staticmethod
+    def _backoff(consecutive_errors: int):
+        if consecutive_errors <= 1:
+            return 0
+        return min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_FACTOR * (2 ** (consecutive_errors - 1)))
+
+    async def request(self, method: HttpMethod, path: str, **kwargs):
+        method, url = str(method.value), f"{self._url}{path}"
+        auth_attempts = await self.auth.ensure_fresh()
+        response = await self.__send(method, url, **kwargs)
+        if (response.headers.get(HttpHeader.CONTENT_TYPE) or "").startswith(ContentType.HTML) or \
+                response.status_code == 401:
+            await self.auth.refresh(auth_attempts)
+            response = await self.__send(method, url, **kwargs)
+        response.raise_for_status()
+        return response
+
+    async def request_json(self, method: HttpMethod, path: str, **kwargs):
+        return (await validate_content_type_async(ContentType.JSON)(self.request)(method, path, **kwargs)).json()
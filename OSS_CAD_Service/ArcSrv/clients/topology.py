@@ -6,8 +6,12 @@
 # conditions stipulated in the agreement/contract under which the
 # program(s) have been supplied.
 
+import asyncio
+import queue
+import threading
 from enum import Enum
 from .connections import (
+    AsyncRestConnection,
     RestConnection,
     HttpMethod)
 
@@ -23,6 +27,10 @@ class TopologyType(Enum):
 class TopologyClient(object):
     TOPOLOGY = "topology"
     CONTEXT_PATH = "/oss-core-ws/rest/"
+    PAGE_SIZE = 500
+    # Pages iter_pages fetches ahead of its consumer
+    PREFETCH_PAGES = 2
+    PUT_POLL_SECONDS = 0.1
 
     def __init__(self, connection: RestConnection):
         self.__connection = connection
@@ -32,20 +40,120 @@ class TopologyClient(object):
             HttpMethod.GET, f"{TopologyClient.CONTEXT_PATH}{topology_type.value}/{identity}")
 
     def count(self, topology_type: TopologyType, **kwargs) -> int:
-        params = dict((k, v) for k, v in kwargs.get('params', dict()).items() if not k.startswith("fs."))
-        return self.__connection.request_json(
-            HttpMethod.GET, f"{TopologyClient.CONTEXT_PATH}{topology_type.value}Task/{'countByCriteria' if params else 'count'}", params=params)
+        params = TopologyClient._count_params(kwargs.get('params', dict()))
+        return self.__connection.request_json(HttpMethod.GET, TopologyClient._count_path(topology_type, params),
+                                              params=params)
 
     def _query(self, topology_type: TopologyType, **kwargs):
         return self.__connection.request_json(
                 HttpMethod.GET, TopologyClient.CONTEXT_PATH + str(topology_type.value), **kwargs)
 
     def list(self, topology_type: TopologyType, **kwargs):
-        count = self.count(topology_type, params=kwargs.get("params", dict()))
-        objects = []
-        while count > 0:
-            params = kwargs.get("params", {"criteria": f"(objectInstId > {objects[-1]['id'] if objects else 0}L)", "sort": "objectInstId"})
-            batch = self._query(topology_type, params=params)
-            count -= len(batch)
-            objects += batch
-        return objects
+        return [obj for page in self.iter_pages(topology_type, **kwargs) for obj in page]
+
+    # Yields the objects page by page in objectInstId order, as soon as each page arrives.
+    # A background thread fetches the pages one after the other, at most prefetch pages ahead of the consumer.
+    # Pages are selected with an objectInstId > last id keyset cursor, so the filter params of kwargs apply to
+    # every page and the "criteria", "sort" and "limit" params are set by the cursor
+    def iter_pages(self, topology_type: TopologyType, page_size: int = PAGE_SIZE,
+                   prefetch: int = PREFETCH_PAGES, **kwargs):
+        pages = queue.Queue(maxsize=prefetch)
+        closed = threading.Event()
+        fetcher = threading.Thread(target=self._fetch_pages, args=(
+            topology_type, kwargs.get("params", dict()), page_size, pages, closed), daemon=True)
+        fetcher.start()
+        try:
+            while (page := pages.get()) is not None:
+                if isinstance(page, Exception):
+                    raise page
+                yield page
+        finally:
+            # A closed iterator waits for the page request in flight, no request is sent after it
+            closed.set()
+            fetcher.join()
+
+    def _fetch_pages(self, topology_type: TopologyType, params, page_size: int, pages: queue.Queue,
+                     closed: threading.Event):
+        try:
+            remaining, last_id = self.count(topology_type, params=params), 0
+            while remaining > 0 and not closed.is_set():
+                page = self._query(topology_type, params=TopologyClient._page_params(params, page_size, last_id))
+                if not page:
+                    break
+                remaining, last_id = remaining - len(page), page[-1]['id']
+                TopologyClient._put(pages, page, closed)
+            TopologyClient._put(pages, None, closed)
+        except Exception as e:
+            TopologyClient._put(pages, e, closed)
+
+    # Waits for room in the page queue until the consumer closed the iterator
+    @staticmethod
+    def _put(pages: queue.Queue, item, closed: threading.Event):
+        while not closed.is_set():
+            try:
+                pages.put(item, timeout=TopologyClient.PUT_POLL_SECONDS)
+                return
+            except queue.Full:
+                pass
+
+    @staticmethod
+    def _count_params(params):
+        return dict((k, v) for k, v in params.items() if not k.startswith("fs."))
+
+    @staticmethod
+    def _count_path(topology_type: TopologyType, count_params):
+        count_task = 'countByCriteria' if count_params else 'count'
+        return f"{TopologyClient.CONTEXT_PATH}{topology_type.value}Task/{count_task}"
+
+    @staticmethod
+    def _page_params(params, page_size: int, last_id: int):
+        return {**params, "criteria": f"(objectInstId > {last_id}L)", "sort": "objectInstId", "limit": page_size}
+
+
+# Async variant of TopologyClient, the pages of iter_pages are fetched by a task of the event loop
+class AsyncTopologyClient(object):
+    def __init__(self, connection: AsyncRestConnection):
+        self.__connection = connection
+
+    async def get(self, topology_type: TopologyType, identity: int):
+        return await self.__connection.request_json(
+            HttpMethod.GET, f"{TopologyClient.CONTEXT_PATH}{topology_type.value}/{identity}")
+
+    async def count(self, topology_type: TopologyType, **kwargs) -> int:
+        params = TopologyClient._count_params(kwargs.get('params', dict()))
+        return await self.__connection.request_json(
+            HttpMethod.GET, TopologyClient._count_path(topology_type, params), params=params)
+
+    async def _query(self, topology_type: TopologyType, **kwargs):
+        return await self.__connection.request_json(
+            HttpMethod.GET, TopologyClient.CONTEXT_PATH + str(topology_type.value), **kwargs)
+
+    async def list(self, topology_type: TopologyType, **kwargs):
+        return [obj async for page in self.iter_pages(topology_type, **kwargs) for obj in page]
+
+    async def iter_pages(self, topology_type: TopologyType, page_size: int = TopologyClient.PAGE_SIZE,
+                         prefetch: int = TopologyClient.PREFETCH_PAGES, **kwargs):
+        pages = asyncio.Queue(maxsize=prefetch)
+        fetcher = asyncio.create_task(
+            self._fetch_pages(topology_type, kwargs.get("params", dict()), page_size, pages))
+        try:
+            while (page := await pages.get()) is not None:
+                if isinstance(page, Exception):
+                    raise page
+                yield page
+        finally:
+            fetcher.cancel()
+            await asyncio.gather(fetcher, return_exceptions=True)
+
+    async def _fetch_pages(self, topology_type: TopologyType, params, page_size: int, pages: asyncio.Queue):
+        try:
+            remaining, last_id = await self.count(topology_type, params=params), 0
+            while remaining > 0:
+                page = await self._query(topology_type, params=TopologyClient._page_params(params, page_size, last_id))
+                if not page:
+                    break
+                remaining, last_id = remaining - len(page), page[-1]['id']
+                await pages.put(page)
+            await pages.put(None)
+        except Exception as e:
+            await pages.put(e)
@@ -7,8 +7,12 @@
 # program(s) have been supplied.
 
 import json
+import math
 import os.path
-from jsonschema import validate, RefResolver
+import threading
+from urllib.parse import urldefrag, urljoin
+from jsonschema import RefResolver
+from jsonschema.validators import validator_for
 
 from .constants import HttpHeader
 
@@ -28,17 +32,86 @@ def validate_content_type(accept: str):
     return decorator
 
 
-def validate_json(schema_path):
+def validate_content_type_async(accept: str):
+    def decorator(rest_call):
+        async def wrapper(*args, **kwargs):
+            response = await rest_call(*args, **kwargs)
+            content_type = response.headers[HttpHeader.CONTENT_TYPE]
+            if content_type != accept:
+                raise ValueError(f'Unexpected content type: {content_type},'
+                                 f' for call {response.request.method} {response.request.url.raw_path.decode()}')
+            return response
+        return wrapper
+    return decorator
+
+
+# Modes of validate_json for list responses: a sample spread over the whole list, or the first elements only
+SAMPLE_SPREAD = "spread"
+SAMPLE_HEAD = "head"
+
+# Loaded schemas by file URI, shared by the validators so that every referenced schema is read once
+__schema_store = dict()
+__schema_lock = threading.Lock()
+# Validators of the calling thread by schema path, the ref resolver of a validator is not thread safe
+__validators = threading.local()
+
+
+def validate_json(schema_path, sample_size: int = 0, sample: str = SAMPLE_SPREAD):
     def decorator(rest_call):
         def wrapper(*args, **kwargs):
             response = rest_call(*args, **kwargs)
-            schema_file = os.path.join(path, 'resources', 'schemas', schema_path)
-
-            with open(schema_file, 'r') as file:
-                schema_dir = os.path.dirname(schema_file)
-                schema = json.load(file)
-                resolver = RefResolver(base_uri=f'file://{schema_dir}/', referrer=schema)
-                validate(instance=response, schema=schema, resolver=resolver)
+            instance = response
+            # A list response is validated on sample_size of its elements, all of them if sample_size is 0
+            if isinstance(response, list) and 0 < sample_size < len(response):
+                if sample == SAMPLE_HEAD:
+                    instance = response[:sample_size]
+                else:
+                    instance = response[::math.ceil(len(response) / sample_size)]
+            schema_validator(schema_path).validate(instance)
             return response
         return wrapper
     return decorator
+
+
+def schema_validator(schema_path):
+    if not hasattr(__validators, 'by_path'):
+        __validators.by_path = dict()
+    validators = __validators.by_path
+    if schema_path not in validators:
+        uri = __schema_uri(os.path.join(path, 'resources', 'schemas', schema_path))
+        with __schema_lock:
+            __load_schema(uri)
+        schema = __schema_store[uri]
+        validator_class = validator_for(schema)
+        validator_class.check_schema(schema)
+        validators[schema_path] = validator_class(schema, resolver=RefResolver(
+            base_uri=uri, referrer=schema, store=__schema_store))
+    return validators[schema_path]
+
+
+def __schema_uri(schema_file):
+    return f'file://{os.path.abspath(schema_file)}'
+
+
+# Loads the schema and the schemas it references into the store, if not loaded yet
+def __load_schema(uri):
+    if uri in __schema_store:
+        return
+    with open(uri[len('file://'):], 'r') as file:
+        schema = json.load(file)
+    __schema_store[uri] = schema
+    for ref in __schema_refs(schema):
+        ref_uri = urldefrag(urljoin(uri, ref)).url
+        if ref_uri.startswith('file://'):
+            __load_schema(ref_uri)
+
+
+def __schema_refs(schema):
+    if isinstance(schema, dict):
+        if isinstance(schema.get('$ref'), str):
+            yield schema['$ref']
+        for value in schema.values():
+            yield from __schema_refs(value)
+    elif isinstance(schema, list):
+        for value in schema:
+            yield from __schema_refs(value)
@@ -25,6 +25,7 @@ optimization_config = None
 environ_config = None
 topology_config = None
 cm_config = None
+ncmp_config = None
 
 
 class Configs(ModuleType):
@@ -63,6 +64,10 @@ class Configs(ModuleType):
     def cm_config(self):
         return self.__read_yaml_config(self.CLIENT_CONFIG, "cm")
 
+    @cached_property
+    def ncmp_config(self):
+        return self.__read_yaml_config(self.CLIENT_CONFIG, "ncmp")
+
     @staticmethod
     def __read_yaml_config(config_file, sub_category=None):
         with open(os.path.join(os.path.dirname(__file__), config_file), "r") as stream:
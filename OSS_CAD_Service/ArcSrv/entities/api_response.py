@@ -18,6 +18,7 @@ class ResponseStatus(str, Enum):
     FAILED = "Failed"
     OPTIMIZATION_IN_QUEUE = "Optimization in queue"
     OPTIMIZATION_IN_PROGRESS = "Optimization in progress"
+    OPTIMIZATION_STOPPING = "Optimization stopping"
     OPTIMIZATION_FINISHED = "Optimization finished"
     OPTIMIZATION_COLLECTING_PM_DATA = "Collecting PM data"
     OPTIMIZATION_COLLECTING_CM_DATA = "Collecting CM data"
@@ -11,6 +11,7 @@ from entities.api_response import ResponseStatus
 from mongoengine import (
     BooleanField,
     DateTimeField,
+    DictField,
     Document,
     EmbeddedDocument,
     EmbeddedDocumentField,
@@ -57,6 +58,25 @@ class ResultLinks(EmbeddedDocument):
         }
 
 
+class StageMetrics(EmbeddedDocument):
+    name = StringField(required=True)
+    wall_time = FloatField()
+    cpu_time = FloatField()
+    peak_rss_delta = IntField()
+    rows = IntField()
+    arc_value_gain = FloatField()
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "wallTime": self.wall_time,
+            "cpuTime": self.cpu_time,
+            "peakRssDelta": self.peak_rss_delta,
+            "rows": self.rows,
+            "arcValueGain": self.arc_value_gain,
+        }
+
+
 class Optimization(Document):
     creation_date = DateTimeField(required=True)
     status = StringField(choices=ResponseStatus, required=True)
@@ -68,4 +88,56 @@ class Optimization(Document):
     configuration_end_date = DateTimeField()
     result_links = ListField(EmbeddedDocumentField(ResultLinks))
     mandatory_links = ListField(EmbeddedDocumentField(GnbduPairs))
+    stage_metrics = ListField(EmbeddedDocumentField(StageMetrics))
     meta = {"db_alias": "arc_db", "collection": "optimization"}
+
+    def delete(self, *args, **kwargs):
+        # The link value list only serves re-optimizations that reference this optimization
+        LinkValues.objects(optimization_id=str(self.id)).delete()
+        super().delete(*args, **kwargs)
+
+
+class LinkValues(Document):
+    optimization_id = StringField(required=True)
+    chunk = IntField(required=True)
+    gnb0 = ListField(IntField())
+    gnb1 = ListField(IntField())
+    usability = ListField(FloatField())
+    link_used = ListField(BooleanField())
+    meta = {
+        "db_alias": "arc_db",
+        "collection": "link_values",
+        "indexes": [("optimization_id", "chunk")],
+    }
+
+
+class TopologyNodes(Document):
+    mcc = IntField(required=True)
+    mnc = IntField(required=True)
+    gnb_id = IntField(required=True)
+    gnb_id_length = IntField(required=True)
+    name = StringField(required=True)
+    cm_handle = StringField(required=True)
+    # FDN of the gNB functions by reference name, e.g. gNBCUCPFunctionRef
+    function_refs = DictField(StringField())
+    # Digest of the fields above, compared to find the nodes changed by a topology refresh
+    digest = StringField(required=True)
+    meta = {
+        "db_alias": "arc_db",
+        "collection": "topology_nodes",
+        "indexes": [
+            {"fields": ("mcc", "mnc", "gnb_id", "gnb_id_length"), "unique": True},
+            "gnb_id",
+        ],
+    }
+
+
+class TopologyCatalog(Document):
+    name = StringField(required=True, unique=True)
+    # Incremented by every refresh that changed the topology nodes
+    version = IntField(default=0)
+    refreshed_at = DateTimeField()
+    node_count = IntField()
+    # Set while a process refreshes the catalog, other processes do not start a refresh until then
+    refresh_lease_until = DateTimeField()
+    meta = {"db_alias": "arc_db", "collection": "topology_catalog"}
@@ -23,6 +23,12 @@ class OptimizationStartPostResponseResult(str, Enum):
     OPTIMIZATION_START_POST_INVALID_ID_404 = (
         "The provided Optimization instance ID is not valid."
     )
+    OPTIMIZATION_START_POST_REFERENCE_NOT_EXIST_404 = (
+        "Reference Optimization instance ID does not exist."
+    )
+    OPTIMIZATION_START_POST_REFERENCE_NOT_FINISHED_409 = (
+        "Reference Optimization instance is not finished."
+    )
 
 
 class OptimizationStartPostResponseCls:
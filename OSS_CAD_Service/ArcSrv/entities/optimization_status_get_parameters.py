@@ -6,24 +6,41 @@
 # conditions stipulated in the agreement/contract under which the
 # program(s) have been supplied.
 
-from typing import List
+from typing import List, Optional
+
+from pydantic import Field
 
 from .api_response import BaseResponse, ResponseStatus
 from .bb_links import BBLink
+from .stage_metric import StageMetric
 
 
 class OptimizationStatusGetResponseCls:
-    def __init__(self, *, status: ResponseStatus, result: List[BBLink]):
+    def __init__(
+        self,
+        *,
+        status: ResponseStatus,
+        result: List[BBLink],
+        stage_metrics: List[StageMetric] = None,
+        queue_position: int = None,
+    ):
         self.status = status
         self.result = result
+        self.stage_metrics = stage_metrics or []
+        self.queue_position = queue_position
 
 
 class OptimizationStatusGetResponse(BaseResponse):
 
     status: ResponseStatus
     result: List[BBLink]
+    stage_metrics: List[StageMetric] = Field(
+        default=[], alias="stageMetrics", alias_priority=1
+    )
+    queue_position: Optional[int] = Field(alias="queuePosition", alias_priority=1)
 
     class Config:
+        allow_population_by_field_name = True
         schema_extra = {
             "example": {
                 "status": ResponseStatus.SUCCESS,
@@ -39,5 +56,15 @@ class OptimizationStatusGetResponse(BaseResponse):
                         "usability": 0.143,
                     },
                 ],
+                "queuePosition": None,
+                "stageMetrics": [
+                    {
+                        "name": "cm_collection",
+                        "wallTime": 1.52,
+                        "cpuTime": 0.41,
+                        "peakRssDelta": 10485760,
+                        "rows": 8760,
+                    },
+                ],
             }
         }
@@ -13,6 +13,7 @@ from .api_response import BaseResponse, ResponseStatus
 
 class OptimizationStopPostResponseResult(str, Enum):
     OPTIMIZATION_STOP_POST_STOPPED_SUCCESS = "Optimization stopped successfully."
+    OPTIMIZATION_STOP_POST_STOPPING = "Optimization stopping, the status is finished when the optimization has stopped."
     OPTIMIZATION_STOP_POST_WRONG_ID = (
         "No optimization instance is associated with the provided ID."
     )
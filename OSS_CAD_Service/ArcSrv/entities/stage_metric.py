@@ -0,0 +1,23 @@
+# COPYRIGHT Ericsson 2023
+#
+# The copyright to the computer program(s) herein is the property of
+# Ericsson Inc. The programs may be used and/or copied only with written
+# permission from Ericsson Inc. or in accordance with the terms and
+# conditions stipulated in the agreement/contract under which the
+# program(s) have been supplied.
+
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class StageMetric(BaseModel):
+    name: str = Field(alias="name", alias_priority=1)
+    wall_time: float = Field(alias="wallTime", alias_priority=1)
+    cpu_time: float = Field(alias="cpuTime", alias_priority=1)
+    peak_rss_delta: int = Field(alias="peakRssDelta", alias_priority=1)
+    rows: Optional[int] = Field(alias="rows", alias_priority=1)
+    arc_value_gain: Optional[float] = Field(alias="arcValueGain", alias_priority=1)
+
+    class Config:
+        allow_population_by_field_name = True
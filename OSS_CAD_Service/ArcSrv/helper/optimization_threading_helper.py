@@ -3,17 +3,213 @@
 #
 # Copyright Ericsson (c) 2022
 import datetime
-from threading import Event, Thread
+import heapq
+import itertools
+import logging
+import threading
 
 from entities.api_response import ResponseStatus
 
-task_thread = Thread()
-task_stop_event = Event()
-task_opt_id = "None"
+logger = logging.getLogger(__name__)
+
+# States of an active job returned by OptimizationScheduler.stop
+QUEUED = "queued"
+RUNNING = "running"
+
+# Job of the calling worker thread, set while the worker runs it
+_current = threading.local()
+
+
+class OptimizationStopped(Exception):
+    """Raised by check_stop inside long loops when the stop event of the current job is set"""
+
+
+class OptimizationJob:
+    """Optimization waiting or running on the scheduler, with its own stop event"""
+
+    def __init__(
+        self,
+        optimization_id,
+        document,
+        bb_dict,
+        unwanted_bb_links,
+        mandatory_bb_links,
+        reference_id=None,
+        priority=0,
+        stop_event=None,
+    ):
+        self.optimization_id = optimization_id
+        self.document = document
+        self.bb_dict = bb_dict
+        self.unwanted_bb_links = unwanted_bb_links
+        self.mandatory_bb_links = mandatory_bb_links
+        self.reference_id = reference_id
+        self.priority = priority
+        self.queue_key = None
+        # A multiprocessing event when the job runs in a worker process
+        self.stop_event = threading.Event() if stop_event is None else stop_event
+        # Set under the scheduler lock when a stop of the running job is requested, before its stop event
+        self.stopping = False
+        self.done_event = threading.Event()
+
+
+class OptimizationScheduler:
+    """
+    Runs optimization jobs on at most max_workers worker threads
+    Jobs wait in a queue ordered by decreasing priority, jobs of the same priority in submission order
+    """
+
+    def __init__(self, run_job, max_workers, on_stopped=None):
+        self._run_job = run_job
+        # Called with a running job that was stopped, after the job ended
+        self._on_stopped = on_stopped
+        self._max_workers = max_workers
+        self._condition = threading.Condition()
+        # Heap of (-priority, sequence number, job), stopped jobs stay in it until they are popped
+        self._queue = []
+        self._sequence = itertools.count()
+        self._queued = {}
+        self._running = {}
+        self._workers = []
+        self._idle_workers = 0
+
+    def submit(self, job):
+        with self._condition:
+            if self.is_active(job.optimization_id):
+                return False
+            job.queue_key = (-job.priority, next(self._sequence))
+            heapq.heappush(self._queue, job.queue_key + (job,))
+            self._queued[job.optimization_id] = job
+            if (
+                len(self._queued) > self._idle_workers
+                and len(self._workers) < self._max_workers
+            ):
+                worker = threading.Thread(
+                    target=self._work,
+                    name="optimization-worker-{}".format(len(self._workers)),
+                    daemon=True,
+                )
+                self._workers.append(worker)
+                worker.start()
+            self._condition.notify()
+            return True
+
+    def is_active(self, optimization_id):
+        with self._condition:
+            return optimization_id in self._queued or optimization_id in self._running
+
+    # 1-based position of a waiting job, None if the job is not waiting
+    def queue_position(self, optimization_id):
+        with self._condition:
+            job = self._queued.get(optimization_id)
+            if job is None:
+                return None
+            return 1 + sum(
+                1
+                for priority, sequence, other in self._queue
+                if (priority, sequence) < job.queue_key
+                and self._queued.get(other.optimization_id) is other
+            )
+
+    # Removes a waiting job or signals a running job to stop without waiting for it to end
+    # on_stopping is called with a running job before its stop event is set, so it runs before on_stopped,
+    # it is called without holding the scheduler lock
+    # Returns QUEUED or RUNNING, None if the job is not active
+    def stop(self, optimization_id, on_stopping=None):
+        with self._condition:
+            job = self._queued.pop(optimization_id, None)
+            if job is not None:
+                job.stop_event.set()
+                job.done_event.set()
+                return QUEUED
+            job = self._running.get(optimization_id)
+            if job is None:
+                return None
+            if job.stopping:
+                return RUNNING
+            job.stopping = True
+        try:
+            if on_stopping is not None:
+                on_stopping(job)
+        finally:
+            job.stop_event.set()
+        return RUNNING
+
+    def _work(self):
+        while True:
+            with self._condition:
+                job = self._next_job()
+                while job is None:
+                    self._idle_workers += 1
+                    self._condition.wait()
+                    self._idle_workers -= 1
+                    job = self._next_job()
+                self._running[job.optimization_id] = job
+            try:
+                run_as_current_job(job, self._run_job)
+            except Exception:
+                logger.exception(
+                    "Exception caught while running optimization ID: {}".format(
+                        job.optimization_id
+                    )
+                )
+            finally:
+                with self._condition:
+                    del self._running[job.optimization_id]
+                    stopped = job.stopping
+                if stopped:
+                    # The stop event is set once on_stopping returned
+                    job.stop_event.wait()
+                if stopped and self._on_stopped is not None:
+                    try:
+                        self._on_stopped(job)
+                    except Exception:
+                        logger.exception(
+                            "Exception caught while confirming the stop of optimization ID: {}".format(
+                                job.optimization_id
+                            )
+                        )
+                job.done_event.set()
+
+    def _next_job(self):
+        while self._queue:
+            _, _, job = heapq.heappop(self._queue)
+            if self._queued.get(job.optimization_id) is job:
+                del self._queued[job.optimization_id]
+                return job
+        return None
+
+
+def run_as_current_job(job, run_job):
+    _current.job = job
+    try:
+        return run_job(job)
+    finally:
+        _current.job = None
+
+
+def current_job():
+    return getattr(_current, "job", None)
+
+
+def current_optimization_id():
+    job = current_job()
+    return "None" if job is None else job.optimization_id
+
+
+def stop_requested():
+    job = current_job()
+    return job is not None and job.stop_event.is_set()
+
+
+# Stop checkpoint for long loops, raises OptimizationStopped when the stop event of the current job is set
+def check_stop():
+    if stop_requested():
+        raise OptimizationStopped()
 
 
 def stop_event_is_set(document):
-    if task_stop_event.is_set():
+    if stop_requested():
         document.update(
             status=ResponseStatus.OPTIMIZATION_FINISHED,
             optimization_end_date=datetime.datetime.now(),
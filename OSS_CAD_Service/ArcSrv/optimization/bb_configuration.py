@@ -6,7 +6,7 @@
 # ARC Configuration - Build the BB configuration
 # File with routines for building the best BB configuration from the usability matrix, called from build_solution.py
 # Functionality and script layout:
-#   - Read the usability matrix
+#   - Read the usability matrix, or calculate the usability from the coverage arrays in the fused pipeline
 #   - Create a BB configuration data structure
 #   - Aggregate the usability per link for all BB-BB uni-directional links
 #   - Sort the links in decreasing usability order
@@ -20,57 +20,110 @@ import logging
 import numpy as np
 import pandas as pd
 from entities.api_response import ResponseStatus
+from optimization import link_assignment
 
 """
 Summary: Builds PS cell pair value list:
 Description:
         - Prepare the PS cells pair list from the dfusability:
         - Remove all rows with no usability
-        - Add column with tuple of (primary_gnb, secondary_gnb) to be used for aggregating to BB-BB links
         - Remove rows with PeNB = SeNB, but keep external PS pairs
         - Sort the table according to primary_gnb to prepare for BB-BB link aggregation
+        - Both filters are applied on one boolean mask, so only the remaining rows are copied
 params:
     df() :
 """
 
 logger = logging.getLogger(__name__)
 
+BB_LINK_VALUE_LIST_COLUMNS = ["usability", "gNb0", "gNb1", "linkUsed"]
+
 
 def improve_ps_cell_value_list(df):
     logger.debug("Total PS cell pairs: {}".format(len(df)))
     # Remove zero usability rows:
-    ps_cell_value_list = df[df["usability"] != 0].copy()
+    valid_rows = df["usability"].values != 0
     logger.debug(
-        "Total PS cell pairs with valid usability: {}".format(len(ps_cell_value_list))
-    )
-    # Add tuple with (primary_gnb, secondary_gnb):
-    ps_cell_value_list["gNbs"] = list(
-        zip(ps_cell_value_list["primary_gnb"], ps_cell_value_list["secondary_gnb"])
+        "Total PS cell pairs with valid usability: {}".format(
+            np.count_nonzero(valid_rows)
+        )
     )
     # Remove rows with cells in the same gNB - will also remove rows where pCell == sCell:
-    ps_cell_value_list_new = (
-        ps_cell_value_list[
-            ps_cell_value_list["primary_gnb"] != ps_cell_value_list["secondary_gnb"]
-        ]
-    ).copy()
+    valid_rows &= df["primary_gnb"].values != df["secondary_gnb"].values
+    positions = np.flatnonzero(valid_rows)
     logger.debug(
         "Total PS cell pairs with valid usability and on different gNBs: {}".format(
-            len(ps_cell_value_list_new)
+            len(positions)
         )
     )
     # Sort according to primary_gnb:
-    ps_cell_value_list_new.sort_values("primary_gnb", inplace=True)
-    return ps_cell_value_list_new
+    order = np.argsort(df["primary_gnb"].values[positions], kind="stable")
+    return df.take(positions[order])
+
+
+"""
+Summary: Aggregates P/S cell pairs to BB-BB links on integer gNB arrays
+Description:
+        - Number the primary_gnb-secondary_gnb pairs through a hash table (pd.factorize)
+        - Sort the P/S cell pairs on pair number and decreasing usability with one sort of integer keys,
+          (pair number, position in decreasing usability order)
+        - Number the P/S cell pairs within each pair run (cumcount on the sorted arrays)
+        - Keep at most max_external_cells_secondary_gnb P/S cell pairs per run, the ones with the highest usability
+        - Sum the usability per run in decreasing usability order, returning the links in ascending (gNb0, gNb1) order
+params:
+    primary_gnb(array) : primary gNB ID per P/S cell pair
+    secondary_gnb(array) : secondary gNB ID per P/S cell pair
+    usability(array) : usability per P/S cell pair
+    max_external_cells_secondary_gnb(int) : limit of external cells on secondary_gnb from primary_gnb
+returns:
+    (gnb0, gnb1, usability) : one entry per BB-BB link
+"""
+
+
+def aggregate_bb_link_values(
+    primary_gnb, secondary_gnb, usability, max_external_cells_secondary_gnb
+):
+    if len(usability) == 0:
+        return primary_gnb[:0], secondary_gnb[:0], usability[:0]
+    by_usability = np.argsort(-usability)
+    pair_numbers = pd.factorize(
+        (primary_gnb.astype(np.int64) << 32) | secondary_gnb.astype(np.int64)
+    )[0]
+    position_bits = len(usability).bit_length()
+    keys = (pair_numbers[by_usability].astype(np.int64) << position_bits) | np.arange(
+        len(usability)
+    )
+    keys.sort()
+    order = by_usability[keys & ((1 << position_bits) - 1)]
+    pair_numbers = keys >> position_bits
+    # Cumulative number of cells per primary_gnb and secondary_gnb pair
+    run_start = np.ones(len(order), dtype=bool)
+    run_start[1:] = pair_numbers[1:] != pair_numbers[:-1]
+    positions = np.arange(len(order))
+    external_cells = positions - np.maximum.accumulate(
+        np.where(run_start, positions, 0)
+    )
+    # Only include pairs that do not violate the max # of external cells on secondary_gnb from primary_gnb
+    kept = external_cells < max_external_cells_secondary_gnb
+    order = order[kept]
+    run_start = np.flatnonzero(run_start[kept])
+    gnb0 = primary_gnb[order[run_start]]
+    gnb1 = secondary_gnb[order[run_start]]
+    link_order = np.lexsort((gnb1, gnb0))
+    return (
+        gnb0[link_order],
+        gnb1[link_order],
+        np.add.reduceat(usability[order], run_start)[link_order],
+    )
 
 
 """
 Summary: Creates a BB-BB link list with aggregated usability
 Description:
         - From the P/S cell pair list, aggregate to BB-BB connections:
-        - Sort the gNBs in the pairs, maintaining the direction
-        - Sort the entire table on the primary_gnb-secondary_gnb pairs and usability
-        - Add a column for indicating if maximum number of partners is reached, meaning PS pair is not available
-        - Group per gNB pair and aggregate the link value
+        - Group on the integer primary_gnb-secondary_gnb columns, maintaining the direction
+        - Keep the highest usability P/S pairs per gNB pair, up to the maximum number of external cells
+        - Aggregate the link value per gNB pair and sort the list in descending usability order
 params:
     ps_cell_value_list() :
     max_external_cells_secondary_gnb() :
@@ -78,42 +131,99 @@ params:
 
 
 def create_bb_link_value_list(df_usability, max_external_cells_secondary_gnb):
-    # Create a new data frame from ps_cell_value_list
     ps_cell_value_list = improve_ps_cell_value_list(df_usability)
-    bb_link_value_list = ps_cell_value_list.copy()
-    # Sort the entire data frame based on the columns of gNBs and the usability
-    bb_link_value_list.sort_values(
-        ["primary_gnb", "secondary_gnb", "usability"], inplace=True, ascending=False
+    gnb0, gnb1, usability = aggregate_bb_link_values(
+        ps_cell_value_list["primary_gnb"].values,
+        ps_cell_value_list["secondary_gnb"].values,
+        ps_cell_value_list["usability"].values,
+        max_external_cells_secondary_gnb,
     )
-    # Add column with cumulative number of primary_gnb and secondary_gnb pairs
-    bb_link_value_list["externalCellsOnsecondary_gnb"] = bb_link_value_list.groupby(
-        ["primary_gnb", "secondary_gnb"]
-    ).cumcount()
-    # Only include rows that not violates the max # of external cells on secondary_gnb from primary_gnb
-    bb_link_value_list = bb_link_value_list.query(
-        "externalCellsOnsecondary_gnb < @max_external_cells_secondary_gnb"
-    ).copy()
-    # Aggregate usability value per eNB pair and sort the list in descending usability order
-    bb_link_value_list = (
-        bb_link_value_list[["gNbs", "usability"]]
-        .groupby("gNbs")
-        .agg({"usability": "sum"})
-        .sort_values("usability", ascending=False)
+    return _sorted_bb_link_value_list(gnb0, gnb1, usability)
+
+
+"""
+Summary: Creates a BB-BB link list with aggregated usability directly from the coverage data
+Description:
+        - Fused pipeline of the capability matrix, usability matrix, improve_ps_cell_value_list and
+          create_bb_link_value_list stages, with the same result
+        - Works on the coverage arrays without intermediate data frames:
+            - Keep the P/S cell pairs on different gNBs that can get above the capability limit
+            - Look up the predicted capacity of the sCells and multiply it with the hit rate
+            - Keep the pairs with capability above the capability limit
+            - Aggregate to BB-BB links with the external cell limit, see aggregate_bb_link_values
+params:
+    coverage_data() : A data frame that holds sNCI, hitrate, primary_gnb, secondary_gnb data
+    capacity_index(CapacityIndex) : predicted capacity per sCell, see capability_matrix.get_capacity_index
+    capability_limit(double) : A usability limit value
+    max_external_cells_secondary_gnb(int) : limit of external cells on secondary_gnb from primary_gnb
+"""
+
+
+def create_bb_link_value_list_from_coverage(
+    coverage_data, capacity_index, capability_limit, max_external_cells_secondary_gnb
+):
+    primary_gnb = coverage_data["primary_gnb"].values
+    secondary_gnb = coverage_data["secondary_gnb"].values
+    hitrate = coverage_data["hitrate"].values
+    # Pairs that cannot get above the capability limit with the highest capacity are skipped before the lookup
+    positions = np.flatnonzero(
+        ((hitrate < 0) | (hitrate * capacity_index.max_capacity > capability_limit))
+        & (primary_gnb != secondary_gnb)
+    )
+    usability = capacity_index.capacity_of(coverage_data["sNCI"].values[positions])
+    usability *= hitrate[positions]
+    kept = (usability > capability_limit) & (usability != 0)
+    positions = positions[kept]
+    logger.debug(
+        "Total PS cell pairs with valid usability and on different gNBs: {}".format(
+            len(positions)
+        )
+    )
+    gnb0, gnb1, usability = aggregate_bb_link_values(
+        primary_gnb[positions],
+        secondary_gnb[positions],
+        usability[kept],
+        max_external_cells_secondary_gnb,
+    )
+    return _sorted_bb_link_value_list(gnb0, gnb1, usability)
+
+
+def _sorted_bb_link_value_list(gnb0, gnb1, usability):
+    # Descending usability, ties kept in (gNb0, gNb1) order
+    order = np.argsort(-usability, kind="stable")
+    return pd.DataFrame(
+        data={
+            "usability": usability[order],
+            "gNb0": gnb0[order],
+            "gNb1": gnb1[order],
+            # Column indicating if link is used in configuration
+            "linkUsed": np.zeros(len(order), dtype=bool),
+        },
+        columns=BB_LINK_VALUE_LIST_COLUMNS,
+    )
+
+
+"""
+Summary:  Get the gNB universe of bb_link_value_list
+Description:
+        - Union of the gNb0 and gNb1 integer columns as a sorted numpy array
+        - The position of a gNB in the array is its code, see link_assignment.gnb_codes
+        - Built once per optimization and shared by the link assignment, the saved result and the report export
+params:
+    bb_link_value_list([]) : BB-BB link list with aggregated usability
+"""
+
+
+def get_gnb_universe(bb_link_value_list):
+    return link_assignment.gnb_universe(
+        bb_link_value_list["gNb0"].values, bb_link_value_list["gNb1"].values
     )
-    # Set numerical index
-    bb_link_value_list.reset_index(inplace=True)
-    # Add columns with the first and second eNb per link
-    bb_link_value_list["gNb0"] = bb_link_value_list["gNbs"].map(lambda x: x[0])
-    bb_link_value_list["gNb1"] = bb_link_value_list["gNbs"].map(lambda x: x[1])
-    # Add column indicating if link is used in configuration
-    bb_link_value_list["linkUsed"] = False
-    return bb_link_value_list
 
 
 """
 Summary:  Get unique gNb list from bb_link_value_list
 Description:
-        - Creates a list with all gNBs
+        - Creates a sorted list with all gNBs
 params:
     bb_link_value_list([]) : BB-BB link list with aggregated usability
 """
@@ -123,54 +233,57 @@ def get_unique_gnb_list(bb_link_value_list):
     if bb_link_value_list.empty:
         unique_gnbs = []
     else:
-        unique_gnbs = sorted(
-            list(set(bb_link_value_list["gNbs"].apply(lambda x: [x[0], x[1]]).sum()))
-        )
+        unique_gnbs = get_gnb_universe(bb_link_value_list).tolist()
     return unique_gnbs
 
 
 """
 Summary:  Assigns links to the BB units
 Description:
+        - Maps the gNBs of the link list to dense integer codes through the gNB universe
         - Runs through the greedy algorithm, one BB link at a time in the bb_link_value_list
         - Only updates the 'linkUsed' column in bb_link_value_list
         - For each link:
             - Checks limit for both BBs in a BB unit pair, if ok set 'linkUsed' to True in bb_link_value_list
+        - With the "b_matching" solver the greedy result is improved as a maximum-weight b-matching,
+          links that are already marked as used (mandatory links) and picked by the greedy pass are kept
 params:
-    unique_gnbs([]) : list of unique gNbs in the bb_link_value_list
     bb_link_value_list(DataFrame)) : BB-BB link list with aggregated usability
     max_bb_partners() : limit of how many in/out links a gNb can have
+    gnb_universe(array) : gNB universe of bb_link_value_list, built from the link list if not given
+    solver(str) : one of ASSIGNMENT_SOLVERS, "greedy" if not given
 """
 
+ASSIGNMENT_SOLVERS = ("greedy", "b_matching")
 
-def assign_bb_links(bb_link_value_list, max_bb_partners):
-    def assign_bb_links_inner(gnbs, gnb0, gnb1, max_bb_partners):
-        # Create arrays initialized with zero links per gNB
-        links_per_gnb_to_sec_col = np.zeros(len(gnbs))
-        links_per_gnb_to_prim_col = np.zeros(len(gnbs))
-        # Create array initialized to False for every link usage
-        link_used_col = np.full(len(gnb0), False)
-        # Go through the gNB pairs (= link) and see if it is assignable
-        for link in range(len(link_used_col)):
-            # Check if gNb0 and gNb1 both has fewer links than allowed limit
-            index_0 = np.where(gnbs == gnb0[link])[0]
-            index_1 = np.where(gnbs == gnb1[link])[0]
-            if (links_per_gnb_to_sec_col[index_0][0] < max_bb_partners) and (
-                links_per_gnb_to_prim_col[index_1][0] < max_bb_partners
-            ):
-                # Both gNBs have available links, set link to be used and increment number of links
-                link_used_col[link] = True
-                links_per_gnb_to_sec_col[index_0] += 1
-                links_per_gnb_to_prim_col[index_1] += 1
-        return link_used_col
-
-    unique_gnbs = get_unique_gnb_list(bb_link_value_list)
-    bb_link_value_list.loc[:, "linkUsed"] = assign_bb_links_inner(
-        np.array(unique_gnbs),
-        bb_link_value_list["gNb0"].values,
-        bb_link_value_list["gNb1"].values,
-        max_bb_partners,
-    ).tolist()
+
+def assign_bb_links(
+    bb_link_value_list, max_bb_partners, gnb_universe=None, solver="greedy"
+):
+    if solver not in ASSIGNMENT_SOLVERS:
+        raise ValueError("Unknown BB link assignment solver: {}".format(solver))
+    if gnb_universe is None:
+        gnb_universe = get_gnb_universe(bb_link_value_list)
+    gnb0_codes = link_assignment.gnb_codes(
+        gnb_universe, bb_link_value_list["gNb0"].values
+    )
+    gnb1_codes = link_assignment.gnb_codes(
+        gnb_universe, bb_link_value_list["gNb1"].values
+    )
+    link_used = link_assignment.assign_links_greedy(
+        gnb0_codes, gnb1_codes, len(gnb_universe), max_bb_partners
+    )
+    if solver == "b_matching":
+        link_used = link_assignment.improve_links_b_matching(
+            gnb0_codes,
+            gnb1_codes,
+            bb_link_value_list["usability"].values,
+            len(gnb_universe),
+            max_bb_partners,
+            link_used,
+            fixed=bb_link_value_list["linkUsed"].values.astype(bool),
+        )
+    bb_link_value_list.loc[:, "linkUsed"] = link_used
 
     return bb_link_value_list
 
@@ -182,8 +295,7 @@ Description:
     - The list will contain pairs (gNb0 and gNb1) of baseband units that should be connected with an E5 link,
       their corresponding cmHandles and usability score
 Params:
-    bb_link_value_list(DataFrame(columns=["gNbs",
-                                          "usability",
+    bb_link_value_list(DataFrame(columns=["usability",
                                           "gNb0",
                                           "gNb1",
                                           "linkUsed"])) : DataFrame containing BB links
@@ -200,13 +312,49 @@ def get_bb_link_list(bb_link_value_list, bb_dict):
     return bb_link_list
 
 
+"""
+Summary:  Flag the links matching a list of BB-BB pairs
+Description:
+    - Encodes the (gNb0, gNb1) pairs of the link list and the given pairs as integer keys over the gNB universe
+    - Pairs with a gNB outside the universe can not match any link and are dropped
+    - This is the only place where links are handled as tuples, as the pairs come in that form from the API
+Params:
+    bb_link_value_list(DataFrame(columns=["usability",
+                                          "gNb0",
+                                          "gNb1",
+                                          "linkUsed"])) : DataFrame containing BB links
+    bb_links([(p_gnbdu_id, s_gnbdu_id)]) : BB-BB pair list
+    gnb_universe(array) : gNB universe of bb_link_value_list, built from the link list if not given
+"""
+
+
+def is_link_in(bb_link_value_list, bb_links, gnb_universe=None):
+    if gnb_universe is None:
+        gnb_universe = get_gnb_universe(bb_link_value_list)
+    bb_links = np.array(list(bb_links), dtype=np.int64).reshape(-1, 2)
+    bb_links = bb_links[np.isin(bb_links, gnb_universe).all(axis=1)]
+    return np.isin(
+        _link_keys(
+            gnb_universe,
+            bb_link_value_list["gNb0"].values,
+            bb_link_value_list["gNb1"].values,
+        ),
+        _link_keys(gnb_universe, bb_links[:, 0], bb_links[:, 1]),
+    )
+
+
+def _link_keys(gnb_universe, gnb0, gnb1):
+    return link_assignment.gnb_codes(gnb_universe, gnb0) * len(
+        gnb_universe
+    ) + link_assignment.gnb_codes(gnb_universe, gnb1)
+
+
 """
 Summary:  Remove the unwanted BB-links from the BB-links list
 Description:
     - Filter the unwanted node pairs from the BB-links list
 Params:
-    bb_link_value_list(DataFrame(columns=["gNbs",
-                                          "usability",
+    bb_link_value_list(DataFrame(columns=["usability",
                                           "gNb0",
                                           "gNb1",
                                           "linkUsed"])) : DataFrame containing BB links
@@ -216,10 +364,9 @@ Params:
 
 def check_unwanted_bb_link(bb_link_value_list, unwanted_bb_links):
     filtered_bb_link_list = bb_link_value_list[
-        ~bb_link_value_list.gNbs.isin(unwanted_bb_links)
-    ].copy()
-    filtered_bb_link_list.reset_index(drop=True, inplace=True)
-    return filtered_bb_link_list
+        ~is_link_in(bb_link_value_list, unwanted_bb_links)
+    ]
+    return filtered_bb_link_list.reset_index(drop=True)
 
 
 """
@@ -235,17 +382,32 @@ Params:
 
 
 def add_mandatory_bb_links(bb_link_value_list, mandatory_bb_links):
-    for bb in mandatory_bb_links:
-        if bb in set(bb_link_value_list["gNbs"]):
-            bb_link_value_list.loc[bb_link_value_list["gNbs"] == bb, "linkUsed"] = True
-        else:
-            bb_link_value_list.loc[len(bb_link_value_list.index)] = [
-                bb,
-                0,
-                bb[0],
-                bb[1],
-                True,
-            ]
+    mandatory_bb_links = list(dict.fromkeys(mandatory_bb_links))
+    is_mandatory = is_link_in(bb_link_value_list, mandatory_bb_links)
+    bb_link_value_list.loc[is_mandatory, "linkUsed"] = True
+    existing_bb_links = set(
+        zip(
+            bb_link_value_list["gNb0"].values[is_mandatory],
+            bb_link_value_list["gNb1"].values[is_mandatory],
+        )
+    )
+    missing_bb_links = [bb for bb in mandatory_bb_links if bb not in existing_bb_links]
+    if missing_bb_links:
+        bb_link_value_list = pd.concat(
+            [
+                bb_link_value_list,
+                pd.DataFrame(
+                    data={
+                        "usability": np.zeros(len(missing_bb_links)),
+                        "gNb0": [bb[0] for bb in missing_bb_links],
+                        "gNb1": [bb[1] for bb in missing_bb_links],
+                        "linkUsed": True,
+                    },
+                    columns=BB_LINK_VALUE_LIST_COLUMNS,
+                ),
+            ],
+            ignore_index=True,
+        )
     sorted_bb_link = bb_link_value_list.sort_values(
         ["linkUsed", "usability"], ascending=False
     )
@@ -256,26 +418,32 @@ def add_mandatory_bb_links(bb_link_value_list, mandatory_bb_links):
 """
 Summary: Save resulted BB links after optimization to the database
 Description:
-    - Build the final response list
+    - Build the final response list, gNB IDs are taken from the gNB universe as plain integers
     - Save the bb links list to the database
 Params:
     bb_link_list(DataFrame)) : BB-BB link list with aggregated usability
                                               after removing unwanted links
     document : collection model document
+    gnb_universe(array) : gNB universe of the optimization, built from bb_link_list if not given
 """
 
 
-def save_bb_links_result(bb_link_list, document):
+def save_bb_links_result(bb_link_list, document, gnb_universe=None):
     logger.debug("Resulted BB link list : %s ", bb_link_list.to_string())
-    response = []
-    for i in range(len(bb_link_list["gNb0"])):
-        response.append(
-            {
-                "p_gnbdu_id": int(bb_link_list["gNb0"][i]),
-                "s_gnbdu_id": int(bb_link_list["gNb1"][i]),
-                "usability": bb_link_list["usability"][i],
-            }
+    if gnb_universe is None:
+        gnb_universe = get_gnb_universe(bb_link_list)
+    p_gnbdu_ids = gnb_universe[
+        link_assignment.gnb_codes(gnb_universe, bb_link_list["gNb0"].values)
+    ].tolist()
+    s_gnbdu_ids = gnb_universe[
+        link_assignment.gnb_codes(gnb_universe, bb_link_list["gNb1"].values)
+    ].tolist()
+    response = [
+        {"p_gnbdu_id": p_gnbdu_id, "s_gnbdu_id": s_gnbdu_id, "usability": usability}
+        for p_gnbdu_id, s_gnbdu_id, usability in zip(
+            p_gnbdu_ids, s_gnbdu_ids, bb_link_list["usability"].tolist()
         )
+    ]
     document.update(
         status=ResponseStatus.OPTIMIZATION_FINISHED,
         result_links=response,
@@ -308,7 +476,12 @@ def check_coverage_data_and_mandatory_links(
         logger.info("No data returned from NCMP - optimization finished prematurely")
     if raw_coverage_data.empty and len(mandatory_bb_links) != 0:
         df = pd.DataFrame(
-            columns=["gNbs", "usability", "gNb0", "gNb1", "linkUsed"], dtype=np.int64
+            data={
+                "usability": np.zeros(0),
+                "gNb0": np.zeros(0, dtype=np.int64),
+                "gNb1": np.zeros(0, dtype=np.int64),
+                "linkUsed": np.zeros(0, dtype=bool),
+            }
         )
         mandatory_link_value_df = add_mandatory_bb_links(df, mandatory_bb_links)
     return mandatory_link_value_df
@@ -9,10 +9,14 @@
 #   - Set up environment
 #   - Read data
 #   - Create data frames
-#   - Aggregate and filter to get usability matrix
+#   - Aggregate and filter to get the BB link value list in one pass (definitions.FUSED_PIPELINE)
+#     or through the capability and usability matrices, optionally per network partition (partitioning.py)
 #   - Build complete BB configuration - greedy algorithm
-#   - Loop over random alterations
+#   - Optionally improve it as a maximum-weight b-matching (definitions.ASSIGNMENT_SOLVER)
+#   - Or re-assign only the neighbourhood of changed gNBs of a reference optimization (incremental.py)
+#   - Loop over random alterations on worker processes (local_search.py)
 #   - Evaluate and pick best solution
+#   - Measure the stages and keep the measurements on the optimization document (stage_metrics.py)
 #
 # Scrap area with ideas and things to do:
 #  - Build REST handling
@@ -33,7 +37,11 @@ from optimization import (
     definitions,
     evaluate,
     get_data,
+    incremental,
+    local_search,
+    partitioning,
     report,
+    stage_metrics,
     usability_matrix,
 )
 
@@ -41,21 +49,34 @@ from optimization import (
 Summary: Exception wrapper for run_optimization
 Description:
         - Calls run_optimization and checks if any unhandled exception is raised
+        - A stop raised from a checkpoint inside a long loop finishes the optimization without a result
 params:
     bb_dict({gnb_id: "cm_handle")}) : dictionary containing gNbIds and corresponding cmHandles
     unwanted_bb_links([(p_gnbdu_id, s_gnbdu_id)]) : list containing primary and secondary gNbId tuples
     mandatory_bb_links([(p_gnbdu_id, s_gnbdu_id)]) : list containing mandatory primary and secondary gNbId tuples
+    reference_id(str) : ID of a finished optimization to re-optimize from, None for a full optimization
 """
 logger = logging.getLogger(__name__)
 
 
-def run_optimization_service(bb_dict, unwanted_bb_links, mandatory_bb_links, document):
+def run_optimization_service(
+    bb_dict, unwanted_bb_links, mandatory_bb_links, document, reference_id=None
+):
     try:
-        run_optimization(bb_dict, unwanted_bb_links, mandatory_bb_links, document)
+        run_optimization(
+            bb_dict, unwanted_bb_links, mandatory_bb_links, document, reference_id
+        )
+    except optimization_threading_helper.OptimizationStopped:
+        logger.info(
+            "Optimization ID: {} stopped".format(
+                optimization_threading_helper.current_optimization_id()
+            )
+        )
+        stop_event_is_set(document)
     except Exception:
         logger.exception(
             "Exception caught while executing optimization ID: {}".format(
-                optimization_threading_helper.task_opt_id
+                optimization_threading_helper.current_optimization_id()
             )
         )
         document.update(status=ResponseStatus.OPTIMIZATION_UNEXPECTED_ERROR)
@@ -65,60 +86,173 @@ def run_optimization_service(bb_dict, unwanted_bb_links, mandatory_bb_links, doc
 Summary: Builds a BB Optimization
 Description:
         - Builds and evaluates a solution
+        - With a reference optimization the links between gNBs without changes keep the reference result,
+          the links in the neighbourhood of changed gNBs are assigned again
+        - Saves the BB-BB link value list as reference for later optimizations
 params:
     bb_dict({gnb_id: "cm_handle")}) : dictionary containing gNbIds and corresponding cmHandles
     unwanted_bb_links([(p_gnbdu_id, s_gnbdu_id)]) : list containing unwanted primary and secondary gNbId tuples
     mandatory_bb_links([(p_gnbdu_id, s_gnbdu_id)]) : list containing mandatory primary and secondary gNbId tuples
+    reference_id(str) : ID of a finished optimization to re-optimize from, None for a full optimization
 """
 
 
-def run_optimization(bb_dict, unwanted_bb_links, mandatory_bb_links, document):
-    df_coverage_data = get_data.get_coverage_data(bb_dict, document)
+def run_optimization(
+    bb_dict, unwanted_bb_links, mandatory_bb_links, document, reference_id=None
+):
+    with stage_metrics.measure_stage(document, stage_metrics.CM_COLLECTION) as stage:
+        df_coverage_data = get_data.get_coverage_data(bb_dict, document)
+        stage.rows = len(df_coverage_data)
     bb_link_df = bb_configuration.check_coverage_data_and_mandatory_links(
         df_coverage_data, mandatory_bb_links, document
     )
     if df_coverage_data.empty and bb_link_df.empty:
         return
+    partitioned = (
+        not df_coverage_data.empty
+        and definitions.PARTITION_WORKERS > 0
+        and reference_id is None
+    )
     if not df_coverage_data.empty:
-        df_capacity_pred = get_data.get_predicted_capacity(document)
+        df_capacity_pred = get_data.get_predicted_capacity(bb_dict, document)
         if stop_event_is_set(document):
             return
-        logger.info(ResponseStatus.OPTIMIZATION_BUILDING_CAPABILITY)
-        df_capability = capability_matrix.build_capability_matrix(
-            df_coverage_data, df_capacity_pred, document
-        )
-        if stop_event_is_set(document):
-            return
-        df_usability = usability_matrix.build_usability_matrix(
-            df_capability, definitions.CAPABILITY_LIMIT, document
-        )
-        if stop_event_is_set(document):
-            return
-        logger.info(ResponseStatus.OPTIMIZATION_BUILDING_BB_CONFIGURATIONS)
-        bb_link_value_list = bb_configuration.create_bb_link_value_list(
-            df_usability, definitions.MAX_EXTERNAL_CELLS_SECONDARY_GNB
-        )
-        filtered_bb_link_value_list = bb_configuration.check_unwanted_bb_link(
-            bb_link_value_list, unwanted_bb_links
-        )
-        bb_link_df = bb_configuration.add_mandatory_bb_links(
-            filtered_bb_link_value_list, mandatory_bb_links
-        )
+        if partitioned:
+            with stage_metrics.measure_stage(
+                document, stage_metrics.LINK_BUILDING
+            ) as stage:
+                bb_link_df = partitioning.build_partitioned_bb_links(
+                    df_coverage_data,
+                    df_capacity_pred,
+                    unwanted_bb_links,
+                    mandatory_bb_links,
+                    definitions.PARTITION_WORKERS,
+                    definitions.PARTITION_MAX_GNBS,
+                    document,
+                )
+                # None if the stop event was set while the partitions were optimized
+                if bb_link_df is not None:
+                    stage.rows = len(bb_link_df)
+            if stop_event_is_set(document):
+                return
+        else:
+            if definitions.FUSED_PIPELINE:
+                document.update(
+                    status=ResponseStatus.OPTIMIZATION_BUILDING_BB_CONFIGURATIONS
+                )
+                logger.info(ResponseStatus.OPTIMIZATION_BUILDING_BB_CONFIGURATIONS)
+            else:
+                logger.info(ResponseStatus.OPTIMIZATION_BUILDING_CAPABILITY)
+                with stage_metrics.measure_stage(
+                    document, stage_metrics.CAPABILITY
+                ) as stage:
+                    df_capability = capability_matrix.build_capability_matrix(
+                        df_coverage_data, df_capacity_pred, document
+                    )
+                    stage.rows = len(df_capability)
+                if stop_event_is_set(document):
+                    return
+                with stage_metrics.measure_stage(
+                    document, stage_metrics.USABILITY
+                ) as stage:
+                    df_usability = usability_matrix.build_usability_matrix(
+                        df_capability, definitions.CAPABILITY_LIMIT, document
+                    )
+                    stage.rows = len(df_usability)
+                if stop_event_is_set(document):
+                    return
+                logger.info(ResponseStatus.OPTIMIZATION_BUILDING_BB_CONFIGURATIONS)
+            with stage_metrics.measure_stage(
+                document, stage_metrics.LINK_BUILDING
+            ) as stage:
+                if definitions.FUSED_PIPELINE:
+                    bb_link_value_list = (
+                        bb_configuration.create_bb_link_value_list_from_coverage(
+                            df_coverage_data,
+                            capability_matrix.get_capacity_index(df_capacity_pred),
+                            definitions.CAPABILITY_LIMIT,
+                            definitions.MAX_EXTERNAL_CELLS_SECONDARY_GNB,
+                        )
+                    )
+                else:
+                    bb_link_value_list = bb_configuration.create_bb_link_value_list(
+                        df_usability, definitions.MAX_EXTERNAL_CELLS_SECONDARY_GNB
+                    )
+                filtered_bb_link_value_list = bb_configuration.check_unwanted_bb_link(
+                    bb_link_value_list, unwanted_bb_links
+                )
+                bb_link_df = bb_configuration.add_mandatory_bb_links(
+                    filtered_bb_link_value_list, mandatory_bb_links
+                )
+                stage.rows = len(bb_link_df)
         if bb_link_df.empty:
             document.update(
                 status=ResponseStatus.OPTIMIZATION_FINISHED,
                 optimization_end_date=datetime.datetime.now(),
             )
             return
-    bb_link_resulted_df = bb_configuration.assign_bb_links(
-        bb_link_df, definitions.MAX_BB_PARTNERS
-    )
-    bb_link_used = bb_configuration.get_bb_link_list(bb_link_resulted_df, bb_dict)
+    gnb_universe = bb_configuration.get_gnb_universe(bb_link_df)
+    reference = None
+    if reference_id is not None:
+        reference = incremental.load_reference(reference_id)
+        if reference is None:
+            logger.warning(
+                "No finished reference optimization with saved link values for ID: {}, assigning all links".format(
+                    reference_id
+                )
+            )
+    with stage_metrics.measure_stage(document, stage_metrics.ASSIGNMENT) as stage:
+        if partitioned:
+            bb_link_resulted_df = bb_link_df
+        elif reference is not None:
+            bb_link_resulted_df = incremental.assign_bb_links_incremental(
+                bb_link_df,
+                reference,
+                unwanted_bb_links,
+                mandatory_bb_links,
+                definitions.MAX_BB_PARTNERS,
+                gnb_universe,
+                definitions.INCREMENTAL_NEIGHBOURHOOD_HOPS,
+                definitions.INCREMENTAL_MAX_AFFECTED_SHARE,
+                definitions.ASSIGNMENT_SOLVER,
+            )
+        else:
+            bb_link_resulted_df = bb_configuration.assign_bb_links(
+                bb_link_df,
+                definitions.MAX_BB_PARTNERS,
+                gnb_universe,
+                definitions.ASSIGNMENT_SOLVER,
+            )
+        bb_link_resulted_df = local_search.improve_bb_links(
+            bb_link_resulted_df,
+            mandatory_bb_links,
+            definitions.MAX_BB_PARTNERS,
+            gnb_universe,
+            definitions.LOCAL_SEARCH_WORKERS,
+            definitions.LOCAL_SEARCH_TIME_BUDGET,
+            stage=stage,
+        )
+        bb_link_used = bb_configuration.get_bb_link_list(bb_link_resulted_df, bb_dict)
+        stage.rows = len(bb_link_used)
     if stop_event_is_set(document):
         return
-    bb_configuration.save_bb_links_result(bb_link_used, document)
+    with stage_metrics.measure_stage(document, stage_metrics.SAVING) as stage:
+        bb_configuration.save_bb_links_result(bb_link_used, document, gnb_universe)
+        incremental.save_link_values(
+            bb_link_resulted_df,
+            optimization_threading_helper.current_optimization_id(),
+        )
+        stage.rows = len(bb_link_resulted_df)
     total_arc_value = evaluate.calculate_arc_value(bb_link_resulted_df)
-    report.save_in_bucket(bb_link_df, mandatory_bb_links, optimization_threading_helper.task_opt_id)
+    with stage_metrics.measure_stage(document, stage_metrics.REPORT_UPLOAD) as stage:
+        report.save_in_bucket(
+            bb_link_df,
+            mandatory_bb_links,
+            optimization_threading_helper.current_optimization_id(),
+            gnb_universe,
+        )
+        stage.rows = len(bb_link_df)
     logger.debug("Total ARC value: {:.3f}".format(total_arc_value))
 
+
 # EOF
@@ -9,9 +9,15 @@
 # Functionality and script layout:
 #   - Use the coverage data to build a list of pCell-sCell pairs
 #   - To build a rich level of capability per cell pair, multiply the coverage weight with the value for predicted
-#     available capacity per sCell
+#     available capacity per sCell, looked up through a hash index on the sNCI built once per capacity table
+#   - Optionally apply the capability limit of the usability matrix in the same pass
 #   - Return the final capability matrix
 import logging
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
 from entities.api_response import ResponseStatus
 
 """
@@ -27,11 +33,14 @@ Description:
             - This can be a topic for improvement - use previous value, average value, or indicate in log?
 params:
     coverage_data() : A data frame that holds pNCI, sNCI, coded_usefulness, hitrate, primary_gnb, secondary_gnb data
-    capacity_data() : A data frame that holds pmMacRBSymAvailDl, pmMacRBSymUsedPdschTypeA,
-     sNCI, RBSymFree, secondary_gnb, RBSymFreeNorm, predictedCapacity data
+    capacity_data() : A data frame that holds sNCI, RBSymFree, secondary_gnb, predictedCapacity data
 """ ""
 logger = logging.getLogger(__name__)
 
+# Capacity index of the last capacity table given to get_capacity_index, as (weak reference to the table, index)
+_capacity_index = None
+_capacity_index_lock = threading.Lock()
+
 
 def build_capability_matrix(coverage_data, capacity_data, document):
     document.update(status=ResponseStatus.OPTIMIZATION_BUILDING_CAPABILITY)
@@ -40,32 +49,118 @@ def build_capability_matrix(coverage_data, capacity_data, document):
             ResponseStatus.OPTIMIZATION_BUILDING_CAPABILITY
         )
     )
-    capability_matrix = coverage_data.copy()
-    # Get predicted capacity for matching sNCI
-    capability_matrix = capability_matrix.merge(capacity_data, how="left", on="sNCI")
-    # Change NaN to 0, if any
-    capability_matrix["predictedCapacity"].fillna(0, inplace=True)
-    # Multiply hit rate with predicted capacity
-    capability_matrix["capability"] = (
-        capability_matrix["hitrate"] * capability_matrix["predictedCapacity"]
+    return calculate_capability_matrix(coverage_data, capacity_data)
+
+
+"""
+Summary:  Calculate the capability matrix for all P/S cell pairs
+Description:
+        - Calculation part of build_capability_matrix, without status updates
+        - Used directly by the partition workers in partitioning.py
+params:
+    coverage_data() : A data frame that holds pNCI, sNCI, coded_usefulness, hitrate, primary_gnb, secondary_gnb data
+    capacity_data() : A data frame that holds sNCI, RBSymFree, secondary_gnb, predictedCapacity data,
+     the other capacity columns (pmMacRBSymAvailDl, pmMacRBSymUsedPdschTypeA, RBSymFreeNorm) are dropped if present
+"""
+
+
+def calculate_capability_matrix(coverage_data, capacity_data):
+    return pd.DataFrame(
+        {
+            "pNCI": coverage_data["pNCI"].values,
+            "sNCI": coverage_data["sNCI"].values,
+            "primary_gnb": coverage_data["primary_gnb"].values,
+            "capability": _capability(coverage_data, get_capacity_index(capacity_data)),
+            "secondary_gnb": coverage_data["secondary_gnb"].values,
+        },
+        copy=False,
     )
-    # Clean up the resulting data frame
-    capability_matrix["secondary_gnb"] = capability_matrix["secondary_gnb_x"]
-    capability_matrix.drop(
-        columns=[
-            "coded_usefulness",
-            "hitrate",
-            "pmMacRBSymAvailDl",
-            "pmMacRBSymUsedPdschTypeA",
-            "RBSymFree",
-            "secondary_gnb_y",
-            "secondary_gnb_x",
-            "RBSymFreeNorm",
-            "predictedCapacity",
-        ],
-        inplace=True,
+
+
+"""
+Summary:  Calculate the usability matrix for all P/S cell pairs in one pass
+Description:
+        - Same result as usability_matrix.calculate_usability_matrix on calculate_capability_matrix, without the
+          intermediate capability matrix
+        - The capability is written to one float array and the values not above the capability limit, NaN included,
+          are set to zero in place, the other columns share the coverage arrays
+params:
+    coverage_data() : A data frame that holds pNCI, sNCI, hitrate, primary_gnb, secondary_gnb data
+    capacity_index(CapacityIndex) : predicted capacity per sCell, see get_capacity_index
+    capability_limit(double) : A usability limit value
+"""
+
+
+def calculate_usability_matrix(coverage_data, capacity_index, capability_limit):
+    usability = _capability(coverage_data, capacity_index)
+    # Negated so that NaN capabilities, an infinite hit rate times zero capacity, are zeroed as well
+    usability[~(usability > capability_limit)] = 0
+    return pd.DataFrame(
+        {
+            "pNCI": coverage_data["pNCI"].values,
+            "sNCI": coverage_data["sNCI"].values,
+            "primary_gnb": coverage_data["primary_gnb"].values,
+            "secondary_gnb": coverage_data["secondary_gnb"].values,
+            "usability": usability,
+        },
+        copy=False,
     )
-    return capability_matrix
+
+
+def _capability(coverage_data, capacity_index):
+    capability = capacity_index.capacity_of(coverage_data["sNCI"].values)
+    capability *= coverage_data["hitrate"].values
+    return capability
+
+
+"""
+Summary:  Predicted capacity per sNCI
+Description:
+        - Hash index on the sNCI of the capacity table, built once and used for any number of lookups
+        - sCells without predicted capacity get capacity 0, the first row is taken for repeated sNCIs
+        - max_capacity bounds the capability of a P/S cell pair with non-negative hit rate to hitrate * max_capacity
+params:
+    capacity_data() : A data frame that holds sNCI, predictedCapacity data
+"""
+
+
+class CapacityIndex:
+    def __init__(self, capacity_data):
+        sncis = pd.Index(capacity_data["sNCI"].values.astype(np.int64))
+        predicted_capacity = np.nan_to_num(
+            capacity_data["predictedCapacity"].values.astype(float)
+        )
+        if not sncis.is_unique:
+            first = np.flatnonzero(~sncis.duplicated())
+            sncis = sncis[first]
+            predicted_capacity = predicted_capacity[first]
+        self.sncis = sncis
+        # Capacity per index position, followed by the capacity 0 of unknown sNCIs at position -1
+        self.predicted_capacity = np.append(predicted_capacity, 0.0)
+        self.max_capacity = self.predicted_capacity.max()
+
+    def capacity_of(self, sncis):
+        return self.predicted_capacity[self.sncis.get_indexer(sncis.astype(np.int64))]
+
+
+"""
+Summary:  Get the capacity index of a capacity table
+Description:
+        - The index of the last table is kept while the table exists, so the capacity snapshot of get_data
+          is indexed once for all optimizations using it
+params:
+    capacity_data() : A data frame that holds sNCI, predictedCapacity data
+"""
+
+
+def get_capacity_index(capacity_data):
+    global _capacity_index
+    with _capacity_index_lock:
+        if _capacity_index is not None and _capacity_index[0]() is capacity_data:
+            return _capacity_index[1]
+        capacity_index = CapacityIndex(capacity_data)
+        _capacity_index = (weakref.ref(capacity_data), capacity_index)
+        return capacity_index
 
 
 # EOF
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# coding: utf-8
+#
+# Copyright Ericsson (c) 2023
+#
+# ARC Configuration - Capacity snapshot store
+# File with routines for keeping the predicted capacity table between optimizations, called from get_data.py
+# Functionality and script layout:
+#   - Fingerprint the source files (PM data, prediction model) with their modification time and size
+#   - Keep the last snapshot in the process, return it while the fingerprint is unchanged
+#   - Otherwise memory-map the snapshot columns stored as .npy files if their stored fingerprint matches
+#   - Otherwise build the table from the source files and store it, replacing the older snapshot
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+META_FILE = "meta.json"
+
+# Snapshot of the process as (fingerprint, DataFrame), set by get_snapshot
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+"""
+Summary: Get the snapshot table for the current source files
+Description:
+        - Returns the snapshot of the process or the stored snapshot if it was built from the same source files
+          and parameters, the stored columns are memory-mapped read-only
+        - Otherwise calls build, stores its columns in directory and returns its result
+        - The table must have numeric columns only, its index is not stored
+params:
+    source_files([str]) : paths of the files the table is built from
+    directory(str) : directory of the stored snapshot
+    build(callable) : function without arguments returning the table
+    parameters(list) : other JSON serializable values the table depends on
+"""
+
+
+def get_snapshot(source_files, directory, build, parameters=()):
+    global _snapshot
+    fingerprint = _fingerprint(source_files, parameters)
+    with _snapshot_lock:
+        if _snapshot is not None and _snapshot[0] == fingerprint:
+            return _snapshot[1]
+        snapshot = _load(directory, fingerprint)
+        if snapshot is None:
+            logger.debug("Building snapshot in %s", directory)
+            snapshot = build().reset_index(drop=True)
+            _store(directory, fingerprint, snapshot)
+        _snapshot = (fingerprint, snapshot)
+        return snapshot
+
+
+def _fingerprint(source_files, parameters):
+    fingerprint = []
+    for file_name in source_files:
+        stat = os.stat(file_name)
+        fingerprint.append([os.path.abspath(file_name), stat.st_mtime_ns, stat.st_size])
+    return fingerprint + list(parameters)
+
+
+def _load(directory, fingerprint):
+    try:
+        with open(os.path.join(directory, META_FILE)) as meta_file:
+            meta = json.load(meta_file)
+    except (OSError, ValueError):
+        return None
+    if meta["fingerprint"] != fingerprint:
+        return None
+    try:
+        columns = {
+            column: np.load(os.path.join(directory, column + ".npy"), mmap_mode="r")
+            for column in meta["columns"]
+        }
+    except (OSError, ValueError):
+        return None
+    logger.debug("Memory-mapped snapshot from %s", directory)
+    return pd.DataFrame(columns, columns=meta["columns"], copy=False)
+
+
+"""
+Summary: Store the snapshot columns
+Description:
+        - Every column is written to a temporary file and moved in place, the meta file with the fingerprint
+          is moved in place last so a snapshot is only loaded once all its columns are written
+"""
+
+
+def _store(directory, fingerprint, snapshot):
+    os.makedirs(directory, exist_ok=True)
+    for column in snapshot.columns:
+        _replace(
+            os.path.join(directory, column + ".npy"),
+            lambda file: np.save(file, snapshot[column].values, allow_pickle=False),
+        )
+    meta = {"fingerprint": fingerprint, "columns": list(snapshot.columns)}
+    _replace(
+        os.path.join(directory, META_FILE),
+        lambda file: file.write(json.dumps(meta).encode()),
+    )
+
+
+def _replace(file_name, write):
+    temporary_file_name = "{}.{}.tmp".format(file_name, os.getpid())
+    with open(temporary_file_name, "wb") as file:
+        write(file)
+    os.replace(temporary_file_name, file_name)
+
+
+# EOF
@@ -11,6 +11,8 @@
 
 import logging
 
+import numpy as np
+
 """
 Summary: Disguises the coverage data in CM
 Description:
@@ -35,10 +37,25 @@ def decoded_usefulness(coded_usefulness):
     return (coded_usefulness / k) ** (1 / (k - 1))
 
 
+"""
+Summary: Disguised coverage data decoding for arrays
+Description:
+        - Array version of decoded_usefulness, decodes all values with one numpy power
+params:
+    coded_usefulness(array) :
+"""
+
+
+def decoded_usefulness_array(coded_usefulness):
+    return decoded_usefulness(np.asarray(coded_usefulness, dtype=np.float64))
+
+
 """
 Summary: Cell ID conversion
 Description:
         - Extract the gNB ID from the NCI number
+        - Every hex digit of the cell ID is 4 bits, so the gNB ID is the NCI shifted right by 4 bits per digit
+        - Integer shift, exact for any 36-bit NCI (float division loses precision for large NCIs)
 params:
     nci() :
     digits_for_cell_id() :
@@ -46,7 +63,21 @@ params:
 
 
 def gnb_id_from_nci(nci, digits_for_cell_id):
-    return int(nci / (16**digits_for_cell_id))
+    return int(nci) >> (4 * digits_for_cell_id)
+
+
+"""
+Summary: Cell ID conversion for arrays
+Description:
+        - Array version of gnb_id_from_nci, one integer shift over all NCIs
+params:
+    ncis(array) :
+    digits_for_cell_id() :
+"""
+
+
+def gnb_ids_from_ncis(ncis, digits_for_cell_id):
+    return np.asarray(ncis, dtype=np.int64) >> (4 * digits_for_cell_id)
 
 
 # EOF
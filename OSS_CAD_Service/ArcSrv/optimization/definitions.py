@@ -21,6 +21,37 @@ CAPABILITY_LIMIT = 0.1
 # Set max number of BB partners per direction:
 MAX_BB_PARTNERS = 6
 
+# Build the BB link value list from the coverage data in one pass, False for the capability matrix, usability matrix
+# and P/S cell value list stages (kept for debugging):
+FUSED_PIPELINE = True
+
+# Set BB link assignment solver, "greedy" or "b_matching" (greedy improved as a maximum-weight b-matching):
+ASSIGNMENT_SOLVER = "greedy"
+
+# Set number of worker processes for the local search stage after the BB link assignment, 0 to skip the stage:
+LOCAL_SEARCH_WORKERS = 0
+
+# Set wall-clock budget in seconds for the local search stage:
+LOCAL_SEARCH_TIME_BUDGET = 60
+
+# Set number of worker processes for optimizing network partitions in parallel, 0 to optimize the network as a whole:
+PARTITION_WORKERS = 0
+
+# Set target number of gNBs per network partition, larger connected regions are cut:
+PARTITION_MAX_GNBS = 2000
+
+# Set number of links the changed gNBs are widened by when re-optimizing from a reference optimization:
+INCREMENTAL_NEIGHBOURHOOD_HOPS = 1
+
+# Set share of changed gNBs above which a re-optimization from a reference optimization assigns all links again:
+INCREMENTAL_MAX_AFFECTED_SHARE = 0.3
+
+# Set number of gNBs per NCMP coverage data request:
+NCMP_CHUNK_GNBS = 50
+
+# Set number of concurrent NCMP coverage data requests:
+NCMP_FETCH_WORKERS = 4
+
 # Set max number of external cells per partner and per direction:
 MAX_EXTERNAL_CELLS_SECONDARY_GNB = 10
 
@@ -31,6 +62,12 @@ DIGITS_FOR_CELL_ID = TOTAL_NCI_DIGITS - DIGITS_FOR_GNB_ID
 
 RESULTS_DIRECTORY = "./ArcSrv/resources/"
 
+# Source of PM data, "file" for PM_DATA_FILE or "database" for the PM data collection of the PM Data Handler:
+PM_DATA_SOURCE = "file"
+
+# Set number of hours of PM samples averaged per cell from the PM data collection:
+PM_DATA_WINDOW_HOURS = 24
+
 # File name for PM data
 PM_DATA_FILE = RESULTS_DIRECTORY + "pmDataFromLte.csv"
 
@@ -6,55 +6,144 @@
 # ARC Configuration - Get Data
 # File with routines for getting the ERAN data from PM and CM
 # Functionality and script layout:
-#   - Read data
+#   - Read data, the NCMP coverage data in concurrent chunks and the PM data through the capacity snapshot
+#     or aggregated per cell from the PM data collection
 #   - Create data frames
 #   - Return the data frames'
 
+import concurrent.futures
+import datetime
 import json
 import logging
 
 import numpy as np
 import pandas as pd
 import requests
+from configs import ncmp_config, optimization_config
 from entities.api_response import ResponseStatus
-from optimization import common_functions, definitions, predict_cell_capability
+from helper import optimization_threading_helper
+from optimization import (
+    capacity_snapshot,
+    common_functions,
+    definitions,
+    predict_cell_capability,
+    stage_metrics,
+)
+from services import database_service
 
 OPTIMIZATION_STATUS_MSG = "Optimization status msg : {}"
+NCMP_TIMEOUT_SECONDS = 300
+# Interval of the stop checks while a chunk is awaited
+NCMP_STOP_POLL_SECONDS = 1
+CAPACITY_COLUMNS = ["sNCI", "RBSymFree", "secondary_gnb", "predictedCapacity"]
 logger = logging.getLogger(__name__)
 
 """
 Summary: Query data from NCMPService
 Description:
         - Function to deserialize the CM data obtained from NCMPService API
+        - The gNBs are requested in chunks of NCMP_CHUNK_GNBS on NCMP_FETCH_WORKERS threads
+        - Each chunk response is parsed on its worker straight into int64 arrays, so only the responses
+          in flight are held as parsed JSON, and the arrays are appended in chunk order to growable columns
+        - No coverage data is read if the NCMP coverage URL is not configured
+        - The stop event of the optimization is checked every NCMP_STOP_POLL_SECONDS while a chunk is awaited,
+          a stop raises OptimizationStopped at once without waiting for the requests in flight
 params:
     bb_dict({gnb_id: "cm_handle"}) : dictionary containing gNbIds and corresponding cmHandles
 """
 
 
-# TODO: Needs to be modified when compose/integrate with NCMP service.
 def get_raw_coverage_data_ncmp(bb_dict, document):
     document.update(status=ResponseStatus.OPTIMIZATION_COLLECTING_CM_DATA)
     logger.debug("Read data from NCMP")
-    request_data = {"gnb_id_list": list(bb_dict)}
-    # Make sure NCMPService mockup container is running ..
-    logger.debug("Raw NCMP request data: %s", json.dumps(request_data))
-    # response = requests.request(method="post", url=definitions.NCMP_CM_URL, data=json.dumps(request_data))
-    # df_result = response.json()
-    df_result = {"gNBwithResult": []}
-    logger.debug("NCMP response received!")
-
-    df_total = pd.DataFrame([{
-        "pNCI": row["nci"],
-        "sNCI": usefullness["nci"],
-        "coded_usefulness": usefullness["CoverageRate"]
-    }
-        for gnb_cm in df_result["gNBwithResult"]
-        for row in gnb_cm["nrCells"]
-        for usefullness in row["cellUsefullness"]
-    ], dtype=np.int64, columns=["pNCI", "sNCI", "coded_usefulness"])
+    gnb_ids = list(bb_dict)
+    columns = _CoverageColumns()
+    if not ncmp_config.coverage_url:
+        logger.debug("NCMP coverage URL not configured, no coverage data read")
+    else:
+        chunks = [gnb_ids[start:start + definitions.NCMP_CHUNK_GNBS]
+                  for start in range(0, len(gnb_ids), definitions.NCMP_CHUNK_GNBS)]
+        logger.debug("Raw NCMP request: %s gNBs in %s chunks", len(gnb_ids), len(chunks))
+        # Not a with block, its exit would wait for the requests in flight also after a stop
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=definitions.NCMP_FETCH_WORKERS)
+        futures = [executor.submit(_fetch_coverage_chunk, chunk) for chunk in chunks]
+        try:
+            for future in futures:
+                while not concurrent.futures.wait([future], timeout=NCMP_STOP_POLL_SECONDS).done:
+                    optimization_threading_helper.check_stop()
+                optimization_threading_helper.check_stop()
+                columns.append(*future.result())
+        except BaseException:
+            # Chunks not started yet are not requested, the requests in flight are left to their threads
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown()
+        logger.debug("NCMP response received!")
+
+    df_total = columns.to_frame()
 
     logger.debug("Read data from NCMP, Done!")
-    return df_total.reset_index(drop=True)
+    return df_total
+
+
+"""
+Summary: Query one chunk of gNBs from NCMPService
+Description:
+        - Posts the gNB ID list of the chunk and parses the 'gNBwithResult -> nrCells -> cellUsefullness' structure
+          into pNCI, sNCI and coded usefulness arrays without building a row per cell relation
+params:
+    gnb_ids([gnb_id]) : gNbIds of the chunk
+"""
+
+
+def _fetch_coverage_chunk(gnb_ids):
+    response = requests.post(
+        ncmp_config.coverage_url, data=json.dumps({"gnb_id_list": gnb_ids}), timeout=NCMP_TIMEOUT_SECONDS
+    )
+    response.raise_for_status()
+    cells = [cell for gnb_cm in response.json()["gNBwithResult"] for cell in gnb_cm["nrCells"]]
+    relation_counts = [len(cell["cellUsefullness"]) for cell in cells]
+    count = sum(relation_counts)
+    p_nci = np.repeat(np.fromiter((cell["nci"] for cell in cells), dtype=np.int64, count=len(cells)), relation_counts)
+    s_nci = np.fromiter(
+        (usefullness["nci"] for cell in cells for usefullness in cell["cellUsefullness"]), dtype=np.int64, count=count
+    )
+    coded_usefulness = np.fromiter(
+        (usefullness["CoverageRate"] for cell in cells for usefullness in cell["cellUsefullness"]),
+        dtype=np.int64,
+        count=count,
+    )
+    return p_nci, s_nci, coded_usefulness
+
+
+"""
+Summary: Growable pNCI, sNCI and coded usefulness columns
+Description:
+        - Appends go to preallocated int64 arrays, the capacity is doubled when full
+        - to_frame returns the filled part as the raw coverage data frame
+"""
+
+
+class _CoverageColumns:
+    COLUMNS = ["pNCI", "sNCI", "coded_usefulness"]
+
+    def __init__(self, capacity=1024):
+        self.arrays = [np.empty(capacity, dtype=np.int64) for _ in self.COLUMNS]
+        self.size = 0
+
+    def append(self, *values):
+        end = self.size + len(values[0])
+        if end > len(self.arrays[0]):
+            capacity = max(end, 2 * len(self.arrays[0]))
+            self.arrays = [np.resize(array, capacity) for array in self.arrays]
+        for array, value in zip(self.arrays, values):
+            array[self.size:end] = value
+        self.size = end
+
+    def to_frame(self):
+        return pd.DataFrame(
+            dict(zip(self.COLUMNS, (array[:self.size] for array in self.arrays))), columns=self.COLUMNS
+        )
 
 
 """
@@ -62,6 +151,7 @@ Summary: Prepare the coverage data for usage in the optimization
 Description:
     - Convert the coded coverage data to original hit rate value
     - Add the gNB IDs for both nodes in the coverage data
+    - Both are decoded on whole columns with the array versions of the common functions
     - Remove the rows that contains possible links with non selected gNBs (not present in initial bb list)
 params:
     raw_coverage_data([]): A data frame that holds pNCI, sNCI, coded_usefulness data arrays.
@@ -73,19 +163,17 @@ params:
 
 def get_clean_coverage_data(raw_coverage_data, digits_for_cell_id, initial_bb_list):
     logger.debug("Coverage data from NCMP shape : %s", raw_coverage_data.shape)
-    df_coverage_data = raw_coverage_data.copy()
-    df_coverage_data["hitrate"] = [
-        common_functions.decoded_usefulness(val)
-        for val in df_coverage_data["coded_usefulness"]
-    ]
-    df_coverage_data["primary_gnb"] = [
-        common_functions.gnb_id_from_nci(nci, digits_for_cell_id)
-        for nci in df_coverage_data["pNCI"]
-    ]
-    df_coverage_data["secondary_gnb"] = [
-        common_functions.gnb_id_from_nci(nci, digits_for_cell_id)
-        for nci in df_coverage_data["sNCI"]
-    ]
+    df_coverage_data = raw_coverage_data.assign(
+        hitrate=common_functions.decoded_usefulness_array(
+            raw_coverage_data["coded_usefulness"].values
+        ),
+        primary_gnb=common_functions.gnb_ids_from_ncis(
+            raw_coverage_data["pNCI"].values, digits_for_cell_id
+        ),
+        secondary_gnb=common_functions.gnb_ids_from_ncis(
+            raw_coverage_data["sNCI"].values, digits_for_cell_id
+        ),
+    )
 
     # Keep only rows that contains secondary_gnb that is present on the initial bbList
     df_coverage_data = df_coverage_data[
@@ -112,10 +200,9 @@ def get_clean_capacity_data(raw_capacity_data, digits_for_cell_id):
         df_capacity_data["pmMacRBSymAvailDl"]
         - df_capacity_data["pmMacRBSymUsedPdschTypeA"]
     )
-    df_capacity_data["secondary_gnb"] = [
-        common_functions.gnb_id_from_nci(nci, digits_for_cell_id)
-        for nci in df_capacity_data["sNCI"]
-    ]
+    df_capacity_data["secondary_gnb"] = common_functions.gnb_ids_from_ncis(
+        df_capacity_data["sNCI"].values, digits_for_cell_id
+    )
     return df_capacity_data
 
 
@@ -123,18 +210,47 @@ def get_clean_capacity_data(raw_capacity_data, digits_for_cell_id):
 Summary: Calculate predicted capacity
 Description:
     - Update optimization response status
-    - Get capacity from pm handler
-    - Get clean pm data
+    - With the "database" PM data source, get the mean capacity per cell of the gNBs aggregated in the database
+    - Otherwise get the predicted capacity snapshot, rebuilt only if the PM data or model file changed
 params:
+    bb_dict({gnb_id: "cm_handle")}) : dictionary containing gNbIds and corresponding cmHandles
     document : collection model document
 """
 
 
-def get_predicted_capacity(document):
+def get_predicted_capacity(bb_dict, document):
     document.update(status=ResponseStatus.OPTIMIZATION_COLLECTING_PM_DATA)
     logger.info(
         OPTIMIZATION_STATUS_MSG.format(ResponseStatus.OPTIMIZATION_COLLECTING_PM_DATA)
     )
+    if definitions.PM_DATA_SOURCE == "database":
+        with stage_metrics.measure_stage(document, stage_metrics.PM_COLLECTION) as stage:
+            df_capacity_data = get_capacity_data_database(list(map(int, list(bb_dict))))
+            stage.rows = len(df_capacity_data)
+        return predict_capacity(df_capacity_data, document)
+    with stage_metrics.measure_stage(document, stage_metrics.PM_COLLECTION) as stage:
+        df_capacity_pred = capacity_snapshot.get_snapshot(
+            [definitions.PM_DATA_FILE, definitions.MODEL_FILENAME],
+            optimization_config.capacity_snapshot_directory,
+            lambda: read_predicted_capacity(document),
+            [definitions.DIGITS_FOR_CELL_ID, definitions.MODEL_SEPARATOR],
+        )
+        stage.rows = len(df_capacity_pred)
+    return df_capacity_pred
+
+
+"""
+Summary: Read and predict capacity
+Description:
+    - Get capacity from pm handler
+    - Get clean pm data
+    - Predict the cell capacity
+params:
+    document : collection model document
+"""
+
+
+def read_predicted_capacity(document):
     logger.debug("Read PM data.")
     raw_capacity_data = pd.read_csv(definitions.PM_DATA_FILE, sep=",", index_col=0)
     logger.debug("Capacity data from PM handler shape : %s", raw_capacity_data.shape)
@@ -143,13 +259,63 @@ def get_predicted_capacity(document):
         raw_capacity_data, definitions.DIGITS_FOR_CELL_ID
     )
     logger.debug("PM data cleaning done!")
+    return predict_capacity(df_capacity_data, document)
+
+
+"""
+Summary: Get capacity data from the PM data collection
+Description:
+    - The PM samples of the last PM_DATA_WINDOW_HOURS are averaged per cell by the database,
+      only one row per cell is returned
+    - Add gNB ID for the host of the sCell in the table
+params:
+    gnb_ids([int]) : gNB IDs of the cells
+"""
+
+
+def get_capacity_data_database(gnb_ids):
+    end_date = datetime.datetime.now(datetime.timezone.utc)
+    pm_capacity = database_service.get_pm_capacity(
+        gnb_ids,
+        end_date - datetime.timedelta(hours=definitions.PM_DATA_WINDOW_HOURS),
+        end_date,
+        16**definitions.DIGITS_FOR_CELL_ID,
+    )
+    df_capacity_data = pd.DataFrame(
+        {
+            "sNCI": np.array([cell["sNCI"] for cell in pm_capacity], dtype=np.int64),
+            "RBSymFree": np.array([cell["RBSymFree"] for cell in pm_capacity], dtype=float),
+        }
+    )
+    logger.debug("Capacity data from PM collection shape : %s", df_capacity_data.shape)
+    df_capacity_data["secondary_gnb"] = common_functions.gnb_ids_from_ncis(
+        df_capacity_data["sNCI"].values, definitions.DIGITS_FOR_CELL_ID
+    )
+    return df_capacity_data
+
+
+"""
+Summary: Predict capacity
+Description:
+    - Update optimization response status
+    - Predict the cell capacity and keep the CAPACITY_COLUMNS
+params:
+    df_capacity_data([]) : A data frame that holds sNCI, RBSymFree, secondary_gnb data arrays
+    document : collection model document
+"""
+
+
+def predict_capacity(df_capacity_data, document):
     document.update(status=ResponseStatus.OPTIMIZATION_PREDICTING_CELL_CAPABILITIES)
     logger.info(ResponseStatus.OPTIMIZATION_PREDICTING_CELL_CAPABILITIES)
-    return predict_cell_capability.add_predicted_cell_capacity(
-        definitions.MODEL_FILENAME,
-        definitions.MODEL_SEPARATOR,
-        df_capacity_data,
-    )
+    with stage_metrics.measure_stage(document, stage_metrics.PREDICTION) as stage:
+        df_capacity_pred = predict_cell_capability.add_predicted_cell_capacity(
+            definitions.MODEL_FILENAME,
+            definitions.MODEL_SEPARATOR,
+            df_capacity_data,
+        )[CAPACITY_COLUMNS]
+        stage.rows = len(df_capacity_pred)
+    return df_capacity_pred
 
 
 """
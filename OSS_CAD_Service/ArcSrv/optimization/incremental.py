@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# coding: utf-8
+#
+# Copyright Ericsson (c) 2023
+#
+# ARC Configuration - Incremental re-optimization
+# File with routines for re-using the result of a reference optimization, called from build_solution.py
+# Functionality and script layout:
+#   - Save the BB-BB link value list of every finished optimization, with the used links of its result,
+#     the lists of the latest LINK_VALUES_RETENTION optimizations are kept
+#   - Load the link value list and constraints of a reference optimization
+#   - Find the gNBs whose links changed since the reference:
+#       - Links added or removed, links with changed usability (coverage or capacity changes)
+#       - Links added to or removed from the unwanted and mandatory constraints
+#   - Widen the changed gNBs to their neighbourhood, keep the reference links between unchanged gNBs
+#     and run the greedy assignment on the remaining partner capacity for the links of the neighbourhood
+#   - Fall back to a full assignment if too many gNBs changed
+import logging
+
+import numpy as np
+import pandas as pd
+from configs import optimization_config
+from entities.api_response import ResponseStatus
+from optimization import bb_configuration, link_assignment
+from services import database_service
+
+logger = logging.getLogger(__name__)
+
+"""
+Summary: Save the BB-BB link value list of an optimization
+Description:
+        - Stores gNB IDs, usability and usage of every link
+        - Deletes the link value lists of older optimizations beyond the configured retention
+params:
+    bb_link_value_list(DataFrame) : BB-BB link list with aggregated usability and the resulting 'linkUsed'
+    optimization_id(str) : ID of the optimization
+"""
+
+
+def save_link_values(bb_link_value_list, optimization_id):
+    database_service.persist_link_values(
+        optimization_id,
+        bb_link_value_list["gNb0"].values.tolist(),
+        bb_link_value_list["gNb1"].values.tolist(),
+        bb_link_value_list["usability"].values.tolist(),
+        bb_link_value_list["linkUsed"].values.astype(bool).tolist(),
+    )
+    database_service.prune_link_values(int(optimization_config.link_values_retention))
+
+
+"""
+Summary: Load a reference optimization
+Description:
+        - Returns the link value list and the unwanted and mandatory links of the reference
+        - Returns None if the reference does not exist, is not finished or has no saved link value list
+params:
+    reference_id(str) : ID of the reference optimization
+"""
+
+
+def load_reference(reference_id):
+    document = database_service.get_optimization_by_id(reference_id, "Optimization")
+    if document is None or document.status != ResponseStatus.OPTIMIZATION_FINISHED:
+        return None
+    gnb0, gnb1, usability, link_used = database_service.get_link_values(reference_id)
+    if not gnb0:
+        return None
+    link_values = pd.DataFrame(
+        data={
+            "usability": np.array(usability, dtype=float),
+            "gNb0": np.array(gnb0, dtype=np.int64),
+            "gNb1": np.array(gnb1, dtype=np.int64),
+            "linkUsed": np.array(link_used, dtype=bool),
+        },
+        columns=bb_configuration.BB_LINK_VALUE_LIST_COLUMNS,
+    )
+    return (
+        link_values,
+        [(pair.p_gnbdu_id, pair.s_gnbdu_id) for pair in document.restricted_links],
+        [(pair.p_gnbdu_id, pair.s_gnbdu_id) for pair in document.mandatory_links],
+    )
+
+
+"""
+Summary: Assigns links to the BB units starting from a reference optimization
+Description:
+        - Matches the links with the reference links through a hash index on the (gNb0, gNb1) pairs
+        - Marks the gNBs of links that are new, removed, changed in usability or changed in the constraints
+        - Widens the marked gNBs by `hops` links of the current link list
+        - Reference links between unmarked gNBs keep their reference usage
+        - The links touching marked gNBs are assigned greedily in list order on the partner capacity left
+          by the kept links, so no gNB exceeds max_bb_partners
+        - Runs a full assign_bb_links if more than max_affected_share of the gNBs are marked,
+          or if the kept links exceed max_bb_partners (changed limit)
+params:
+    bb_link_value_list(DataFrame) : BB-BB link list with aggregated usability and the mandatory links marked as used
+    reference(tuple) : reference optimization as returned by load_reference
+    unwanted_bb_links([(p_gnbdu_id, s_gnbdu_id)]) : list containing unwanted primary and secondary gNbId tuples
+    mandatory_bb_links([(p_gnbdu_id, s_gnbdu_id)]) : list containing mandatory primary and secondary gNbId tuples
+    max_bb_partners(int) : limit of how many in/out links a gNb can have
+    gnb_universe(array) : gNB universe of bb_link_value_list
+    hops(int) : number of links the changed gNBs are widened by
+    max_affected_share(float) : share of changed gNBs above which all links are assigned again
+    solver(str) : assignment solver of the full assignment fallback
+"""
+
+
+def assign_bb_links_incremental(
+    bb_link_value_list,
+    reference,
+    unwanted_bb_links,
+    mandatory_bb_links,
+    max_bb_partners,
+    gnb_universe,
+    hops,
+    max_affected_share,
+    solver="greedy",
+):
+    (
+        reference_link_values,
+        reference_unwanted_links,
+        reference_mandatory_links,
+    ) = reference
+    gnb0_codes = link_assignment.gnb_codes(
+        gnb_universe, bb_link_value_list["gNb0"].values
+    )
+    gnb1_codes = link_assignment.gnb_codes(
+        gnb_universe, bb_link_value_list["gNb1"].values
+    )
+    reference_index = _reference_index(bb_link_value_list, reference_link_values)
+    matched = reference_index >= 0
+    changed = ~matched
+    changed[matched] = ~np.isclose(
+        bb_link_value_list["usability"].values[matched],
+        reference_link_values["usability"].values[reference_index[matched]],
+    )
+    removed = np.ones(len(reference_link_values), dtype=bool)
+    removed[reference_index[matched]] = False
+    affected = np.zeros(len(gnb_universe), dtype=bool)
+    affected[gnb0_codes[changed]] = True
+    affected[gnb1_codes[changed]] = True
+    changed_gnbs = np.concatenate(
+        [
+            reference_link_values["gNb0"].values[removed],
+            reference_link_values["gNb1"].values[removed],
+            np.array(
+                _changed_constraint_links(reference_unwanted_links, unwanted_bb_links)
+                + _changed_constraint_links(
+                    reference_mandatory_links, mandatory_bb_links
+                ),
+                dtype=np.int64,
+            ).ravel(),
+        ]
+    )
+    affected[_codes_in_universe(gnb_universe, changed_gnbs)] = True
+    for _ in range(hops):
+        touched = affected[gnb0_codes] | affected[gnb1_codes]
+        affected[gnb0_codes[touched]] = True
+        affected[gnb1_codes[touched]] = True
+    touched = affected[gnb0_codes] | affected[gnb1_codes]
+    link_used = np.zeros(len(bb_link_value_list), dtype=bool)
+    kept = ~touched & matched
+    link_used[kept] = reference_link_values["linkUsed"].values[reference_index[kept]]
+    links_to_sec = np.bincount(gnb0_codes[link_used], minlength=len(gnb_universe))
+    links_to_prim = np.bincount(gnb1_codes[link_used], minlength=len(gnb_universe))
+    affected_gnbs = np.count_nonzero(affected)
+    if affected_gnbs > max_affected_share * len(gnb_universe) or (
+        max(links_to_sec.max(initial=0), links_to_prim.max(initial=0)) > max_bb_partners
+    ):
+        logger.info(
+            "Incremental assignment not applicable ({} of {} gNBs changed), assigning all links".format(
+                affected_gnbs, len(gnb_universe)
+            )
+        )
+        return bb_configuration.assign_bb_links(
+            bb_link_value_list, max_bb_partners, gnb_universe, solver
+        )
+    link_used[touched] = link_assignment.assign_links_greedy(
+        gnb0_codes[touched],
+        gnb1_codes[touched],
+        len(gnb_universe),
+        max_bb_partners,
+        links_to_sec,
+        links_to_prim,
+    )
+    logger.info(
+        "Incremental assignment: {} of {} gNBs changed, {} of {} links assigned again".format(
+            affected_gnbs,
+            len(gnb_universe),
+            np.count_nonzero(touched),
+            len(bb_link_value_list),
+        )
+    )
+    bb_link_value_list.loc[:, "linkUsed"] = link_used
+    return bb_link_value_list
+
+
+"""
+Summary: Position of every link in the reference link list
+Description:
+        - Links are hashed on their (gNb0, gNb1) pair as one integer, gNB IDs have at most 32 bits
+        - Returns -1 for links without reference link, the first one is taken for repeated reference links
+"""
+
+
+def _reference_index(bb_link_value_list, reference_link_values):
+    reference_keys = pd.Index(_link_keys(reference_link_values))
+    keys = _link_keys(bb_link_value_list)
+    if reference_keys.is_unique:
+        return reference_keys.get_indexer(keys)
+    first = np.flatnonzero(~reference_keys.duplicated())
+    reference_index = reference_keys[first].get_indexer(keys)
+    return np.where(reference_index >= 0, first[reference_index], -1)
+
+
+def _link_keys(bb_link_value_list):
+    gnb0 = bb_link_value_list["gNb0"].values.astype(np.int64)
+    return (gnb0 << 32) | bb_link_value_list["gNb1"].values.astype(np.int64)
+
+
+def _codes_in_universe(gnb_universe, gnb_ids):
+    codes = link_assignment.gnb_codes(gnb_universe, gnb_ids)
+    in_universe = codes < len(gnb_universe)
+    in_universe[in_universe] = gnb_universe[codes[in_universe]] == gnb_ids[in_universe]
+    return codes[in_universe]
+
+
+def _changed_constraint_links(reference_links, bb_links):
+    return list(set(reference_links) ^ set(bb_links))
+
+
+# EOF
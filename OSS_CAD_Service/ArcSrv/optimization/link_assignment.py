@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+# coding: utf-8
+#
+# Copyright Ericsson (c) 2023
+#
+# ARC Configuration - Link assignment engine
+# File with routines for assigning BB-BB links to gNBs, called from bb_configuration.py
+# Functionality and script layout:
+#   - Map the gNB IDs of the link list to dense integer codes once, using a sorted gNB universe
+#   - Keep the per-gNB partner counters in integer arrays indexed by those codes
+#   - Run through the links in list order and mark the ones that fit in the partner limits
+#   - Optionally improve the greedy result as a degree-constrained maximum-weight b-matching,
+#     with local augmenting moves that swap in an unused link for at most one link per end
+#   - Check the stop event of the optimization every STOP_CHECK_LINKS links, so a stop is not delayed
+#     until the end of a long assignment
+import time
+
+import numpy as np
+from helper import optimization_threading_helper
+
+GAIN_TOLERANCE = 1e-12
+STOP_CHECK_LINKS = 50000
+NO_REFILL = -1
+UNKNOWN_REFILL = -2
+
+"""
+Summary: Build the gNB universe of a BB-BB link list
+Description:
+        - Union of the primary and secondary gNB ID arrays, sorted ascending
+        - The position of a gNB in this table is its dense integer code 0..n-1
+        - Both columns share the same table, so a gNB gets the same code as primary and as secondary
+params:
+    gnb0(array) : primary gNB ID per link
+    gnb1(array) : secondary gNB ID per link
+"""
+
+
+def gnb_universe(gnb0, gnb1):
+    return np.union1d(
+        np.asarray(gnb0, dtype=np.int64), np.asarray(gnb1, dtype=np.int64)
+    )
+
+
+"""
+Summary: Look up gNB codes in a gNB universe
+Description:
+        - Binary search of the gNB IDs in the sorted code table
+        - All gNB IDs are expected to be part of the universe
+params:
+    gnbs(array) : sorted gNB universe
+    gnb_ids(array) : gNB IDs to encode
+"""
+
+
+def gnb_codes(gnbs, gnb_ids):
+    return np.searchsorted(gnbs, np.asarray(gnb_ids, dtype=np.int64))
+
+
+"""
+Summary: Greedy link assignment on gNB codes
+Description:
+        - Runs through the links in list order, one link at a time
+        - A link is used if its primary gNB has fewer than max_bb_partners links towards secondaries
+          and its secondary gNB has fewer than max_bb_partners links towards primaries
+        - The counters are integer arrays indexed by gNB code, so every link costs O(1)
+        - The counters can start from the links already used by an earlier assignment (residual capacity)
+        - Raises OptimizationStopped when the stop event of the optimization is set, the partial
+          assignment is not usable
+params:
+    gnb0_codes(array) : primary gNB code per link
+    gnb1_codes(array) : secondary gNB code per link
+    gnb_count(int) : number of gNB codes
+    max_bb_partners(int) : limit of how many in/out links a gNB can have
+    links_to_sec(array) : links per gNB code already used towards secondaries, none if not given
+    links_to_prim(array) : links per gNB code already used towards primaries, none if not given
+"""
+
+
+def assign_links_greedy(
+    gnb0_codes,
+    gnb1_codes,
+    gnb_count,
+    max_bb_partners,
+    links_to_sec=None,
+    links_to_prim=None,
+):
+    links_per_gnb_to_sec = np.zeros(gnb_count, dtype=np.int64)
+    links_per_gnb_to_prim = np.zeros(gnb_count, dtype=np.int64)
+    if links_to_sec is not None:
+        links_per_gnb_to_sec += links_to_sec
+    if links_to_prim is not None:
+        links_per_gnb_to_prim += links_to_prim
+    link_used = np.zeros(len(gnb0_codes), dtype=bool)
+    for link, (code_0, code_1) in enumerate(
+        zip(np.asarray(gnb0_codes).tolist(), np.asarray(gnb1_codes).tolist())
+    ):
+        if link % STOP_CHECK_LINKS == 0:
+            optimization_threading_helper.check_stop()
+        if (links_per_gnb_to_sec[code_0] < max_bb_partners) and (
+            links_per_gnb_to_prim[code_1] < max_bb_partners
+        ):
+            link_used[link] = True
+            links_per_gnb_to_sec[code_0] += 1
+            links_per_gnb_to_prim[code_1] += 1
+    return link_used
+
+
+"""
+Summary: Local augmenting path improvement of a link assignment (max-weight b-matching)
+Description:
+        - Treats the link selection as a b-matching with at most max_bb_partners links per gNB and direction
+        - A move adds one unused link. At each end that is already saturated it drops one used link, and the
+          capacity this frees at the far gNB of the dropped link is refilled with the best unused link that fits,
+          so a move is an alternating (augmenting) path of at most five links
+        - Every round bounds the gain of all unused links in one vectorized pass, then evaluates the promising
+          ones exactly in decreasing order and applies them if they still increase the total usability
+        - Every applied move strictly increases the total usability, the rounds stop when no move is left
+        - Links marked as fixed (e.g. mandatory links) are never dropped
+        - A stop of the optimization ends the search like the deadline, with the feasible assignment so far
+params:
+    gnb0_codes(array) : primary gNB code per link
+    gnb1_codes(array) : secondary gNB code per link
+    usability(array) : usability per link
+    gnb_count(int) : number of gNB codes
+    max_bb_partners(int) : limit of how many in/out links a gNB can have
+    link_used(array) : feasible start assignment, e.g. from assign_links_greedy
+    fixed(array) : links that must stay used, none if not given
+    max_rounds(int) : upper limit of improvement rounds
+    deadline(float) : time.monotonic() value after which no new round is started, no limit if not given
+"""
+
+
+def improve_links_b_matching(
+    gnb0_codes,
+    gnb1_codes,
+    usability,
+    gnb_count,
+    max_bb_partners,
+    link_used,
+    fixed=None,
+    max_rounds=20,
+    deadline=None,
+):
+    gnb0_codes = np.asarray(gnb0_codes, dtype=np.int64)
+    gnb1_codes = np.asarray(gnb1_codes, dtype=np.int64)
+    usability = np.asarray(usability, dtype=np.float64)
+    link_used = np.array(link_used, dtype=bool)
+    if fixed is None:
+        fixed = np.zeros(len(link_used), dtype=bool)
+    state = _BMatchingState(
+        gnb0_codes, gnb1_codes, usability, gnb_count, max_bb_partners, link_used, fixed
+    )
+    for _ in range(max_rounds):
+        if deadline is not None and time.monotonic() > deadline:
+            break
+        bound = usability + state.release_bound(gnb0_codes, gnb1_codes, usability)
+        candidates = np.flatnonzero(
+            np.logical_not(state.used) & (bound > GAIN_TOLERANCE)
+        )
+        moves = 0
+        for checked, link in enumerate(
+            candidates[np.argsort(-bound[candidates], kind="stable")].tolist()
+        ):
+            if (
+                checked % STOP_CHECK_LINKS == 0
+                and optimization_threading_helper.stop_requested()
+            ):
+                return state.link_used
+            moves += state.apply_if_better(link)
+        if moves == 0:
+            break
+    return state.link_used
+
+
+"""
+Summary: Link assignment state of improve_links_b_matching
+Description:
+        - Degrees per gNB and direction, and the droppable (used, not fixed) links per gNB
+        - The links of every gNB in decreasing usability order, to look up refill links
+"""
+
+
+class _BMatchingState:
+    def __init__(
+        self,
+        gnb0_codes,
+        gnb1_codes,
+        usability,
+        gnb_count,
+        max_bb_partners,
+        link_used,
+        fixed,
+    ):
+        self.gnb_count = gnb_count
+        self.max_bb_partners = max_bb_partners
+        self.fixed = fixed & link_used
+        self.used = link_used.tolist()
+        self.weights = usability.tolist()
+        by_weight = np.argsort(-usability, kind="stable")
+        droppable = np.flatnonzero(link_used & ~self.fixed)
+        self.sides = []
+        for codes in (gnb0_codes, gnb1_codes):
+            side = _LinkEnd()
+            side.codes = codes.tolist()
+            side.degree = np.bincount(codes[link_used], minlength=gnb_count).tolist()
+            side.droppable = [[] for _ in range(gnb_count)]
+            for link in droppable.tolist():
+                side.droppable[side.codes[link]].append(link)
+            side.by_weight = _group_links(codes, by_weight, gnb_count)
+            self.sides.append(side)
+        for side, far in zip(self.sides, self.sides[::-1]):
+            side.far = far
+
+    @property
+    def link_used(self):
+        return np.array(self.used, dtype=bool)
+
+    def release_bound(self, gnb0_codes, gnb1_codes, usability):
+        link_used = self.link_used
+        unused = ~link_used
+        droppable = link_used & ~self.fixed
+        degrees = [np.array(side.degree) for side in self.sides]
+        fits = [
+            degree[codes] < self.max_bb_partners
+            for degree, codes in zip(degrees, (gnb0_codes, gnb1_codes))
+        ]
+        bound = np.zeros(len(usability))
+        for side, codes, far_codes, degree, fits_near in (
+            (self.sides[0], gnb0_codes, gnb1_codes, degrees[0], fits[0]),
+            (self.sides[1], gnb1_codes, gnb0_codes, degrees[1], fits[1]),
+        ):
+            refill_link = _best_link_per_gnb(
+                far_codes, usability, unused & fits_near, self.gnb_count
+            )
+            refill = np.where(refill_link >= 0, usability[refill_link], 0.0)
+            release = np.full(self.gnb_count, -np.inf)
+            np.maximum.at(
+                release,
+                codes[droppable],
+                refill[far_codes[droppable]] - usability[droppable],
+            )
+            release[degree < self.max_bb_partners] = 0.0
+            side.refill_cache = refill_link.tolist()
+            bound += release[codes]
+        return bound
+
+    def apply_if_better(self, link):
+        weights = self.weights
+        releases = []
+        for side in self.sides:
+            release = self._best_release(link, side)
+            if release is None:
+                return 0
+            releases.append(release)
+        (gain_0, drop_0, refill_0), (gain_1, drop_1, refill_1) = releases
+        side_0, side_1 = self.sides
+        if drop_0 is not None and side_1.codes[drop_0] == side_1.codes[link]:
+            return 0
+        if drop_1 is not None and side_0.codes[drop_1] == side_0.codes[link]:
+            return 0
+        if refill_0 is not None and refill_0 == refill_1:
+            gain_1 -= weights[refill_1]
+            refill_1 = None
+        if weights[link] + gain_0 + gain_1 <= GAIN_TOLERANCE:
+            return 0
+        for added in (link, refill_0, refill_1):
+            if added is not None:
+                self._set_used(added, True)
+        for drop in (drop_0, drop_1):
+            if drop is not None:
+                self._set_used(drop, False)
+        return 1
+
+    def _best_release(self, link, side):
+        code = side.codes[link]
+        if side.degree[code] < self.max_bb_partners:
+            return 0.0, None, None
+        weights = self.weights
+        used = self.used
+        near_codes = side.codes
+        far_codes = side.far.codes
+        best = None
+        for drop in side.droppable[code]:
+            # Fast path on a cached refill link that still fits, checked inline
+            refill = side.refill_cache[far_codes[drop]]
+            if (
+                refill < 0
+                or used[refill]
+                or near_codes[refill] == code
+                or side.degree[near_codes[refill]] >= self.max_bb_partners
+            ):
+                refill = self._refill(side, far_codes[drop], link, code)
+            gain = -weights[drop]
+            if refill is not None:
+                gain += weights[refill]
+            if best is None or gain > best[0]:
+                best = (gain, drop, refill)
+        return best
+
+    def _refill(self, side, far_code, link, code):
+        refill = side.refill_cache[far_code]
+        if refill == UNKNOWN_REFILL or (
+            refill != NO_REFILL
+            and (
+                self.used[refill]
+                or side.degree[side.codes[refill]] >= self.max_bb_partners
+            )
+        ):
+            refill = self._scan_refill(side, far_code, None, None)
+            side.refill_cache[far_code] = refill
+        if refill == NO_REFILL:
+            return None
+        if refill == link or side.codes[refill] == code:
+            refill = self._scan_refill(side, far_code, link, code)
+        return refill
+
+    def _scan_refill(self, side, far_code, link, code):
+        for candidate in side.far.by_weight[far_code]:
+            near_code = side.codes[candidate]
+            if (
+                not self.used[candidate]
+                and candidate != link
+                and near_code != code
+                and side.degree[near_code] < self.max_bb_partners
+            ):
+                return candidate
+        return NO_REFILL if link is None else None
+
+    def _set_used(self, link, used):
+        step = 1 if used else -1
+        self.used[link] = used
+        for side in self.sides:
+            code = side.codes[link]
+            side.degree[code] += step
+            if used:
+                side.droppable[code].append(link)
+            else:
+                side.droppable[code].remove(link)
+        if not used:
+            self._invalidate_refills(link)
+
+    def _invalidate_refills(self, link):
+        # A dropped link becomes a refill candidate itself, and if its gNB was saturated
+        # all links of that gNB may now be better refills than the cached ones
+        for side in self.sides:
+            side.refill_cache[side.far.codes[link]] = UNKNOWN_REFILL
+            code = side.codes[link]
+            if side.degree[code] == self.max_bb_partners - 1:
+                for candidate in side.by_weight[code]:
+                    side.refill_cache[side.far.codes[candidate]] = UNKNOWN_REFILL
+
+
+class _LinkEnd:
+    """Per gNB link bookkeeping of one end (primary or secondary) of the links"""
+
+
+"""
+Summary: Highest usability link per gNB code among the selected links, NO_REFILL where there is none
+Description:
+        - Ties are broken on the lowest link index, as in a stable sort on decreasing usability
+"""
+
+
+def _best_link_per_gnb(codes, usability, selected, gnb_count):
+    links = np.flatnonzero(selected)
+    links = links[np.lexsort((-usability[links], codes[links]))]
+    first = np.ones(len(links), dtype=bool)
+    first[1:] = codes[links[1:]] != codes[links[:-1]]
+    best_link = np.full(gnb_count, NO_REFILL, dtype=np.int64)
+    best_link[codes[links[first]]] = links[first]
+    return best_link
+
+
+"""
+Summary: Link indices per gNB code, keeping the order of the given link order
+"""
+
+
+def _group_links(codes, order, gnb_count):
+    order = order[np.argsort(codes[order], kind="stable")]
+    bounds = np.searchsorted(codes[order], np.arange(gnb_count + 1))
+    order = order.tolist()
+    return [order[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+# EOF
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# coding: utf-8
+#
+# Copyright Ericsson (c) 2023
+#
+# ARC Configuration - Local search improvement stage
+# File with routines for improving the assigned BB-BB links after the greedy pass, called from build_solution.py
+# Functionality and script layout:
+#   - Start spawned worker processes holding the link list as gNB codes and usability arrays,
+#     and a stop event shared with them that ends their running searches
+#   - Every round, each worker perturbs the best assignment with its own seed:
+#       - Ruin: drop a random share of the used links and keep them out while the assignment is repaired
+#       - Recreate: repair and improve with the link exchanges of link_assignment.improve_links_b_matching
+#   - Pick the best assignment of the round with evaluate.calculate_arc_value
+#   - Stop on the time budget, after ROUNDS_WITHOUT_GAIN rounds without gain or when the stop event is set
+#   - Record the ARC value gained over the greedy assignment on the measurement of the calling stage
+import concurrent.futures
+import logging
+import multiprocessing
+import time
+
+import numpy as np
+from helper import optimization_threading_helper
+from optimization import bb_configuration, evaluate, link_assignment
+
+logger = logging.getLogger(__name__)
+
+# Share of the used links that a worker drops before repairing the assignment:
+PERTURBATION_SHARE = 0.05
+
+# Number of rounds without gain after which the search stops before the time budget:
+ROUNDS_WITHOUT_GAIN = 3
+
+# Interval for checking the stop event while waiting for the workers:
+STOP_POLL_SECONDS = 0.5
+
+# Forked workers would copy locks held by other threads of the API or optimization process
+worker_process_context = multiprocessing.get_context("spawn")
+
+# Link list of a worker process, set by _init_worker
+_worker_links = None
+
+# Job of a worker process holding the shared stop event, set by _init_worker
+_worker_job = None
+
+"""
+Summary: Randomized local search over the greedy BB link assignment
+Description:
+        - Runs rounds of perturbation and local search on `workers` processes, each with its own seed
+        - Each round starts from the best assignment found so far, the best of the round replaces it
+          if it has a higher total ARC value
+        - Mandatory links used by the greedy pass are never dropped
+        - The stop event of the job is checked while waiting for a round, a stop returns the best assignment so far
+        - On a stop or when the time budget is used up the shared stop event is set, so the running workers return
+          at their next stop check instead of finishing their search
+        - Logs the ARC value gained over the greedy assignment and sets it as arc_value_gain of the stage
+params:
+    bb_link_value_list(DataFrame) : BB-BB link list with the greedy assignment in 'linkUsed'
+    mandatory_bb_links([(p_gnbdu_id, s_gnbdu_id)]) : list containing mandatory primary and secondary gNbId tuples
+    max_bb_partners(int) : limit of how many in/out links a gNb can have
+    gnb_universe(array) : gNB universe of bb_link_value_list
+    workers(int) : number of worker processes, the stage is skipped if lower than 1
+    time_budget(float) : wall-clock budget of the stage in seconds
+    seed(int) : seed of the first worker, the other workers and rounds use the following seeds
+    stage(StageMeasurement) : measurement of the calling stage, optional
+"""
+
+
+def improve_bb_links(
+    bb_link_value_list,
+    mandatory_bb_links,
+    max_bb_partners,
+    gnb_universe,
+    workers,
+    time_budget,
+    seed=0,
+    stage=None,
+):
+    if workers < 1 or bb_link_value_list.empty:
+        return bb_link_value_list
+    deadline = time.monotonic() + time_budget
+    gnb0_codes = link_assignment.gnb_codes(
+        gnb_universe, bb_link_value_list["gNb0"].values
+    )
+    gnb1_codes = link_assignment.gnb_codes(
+        gnb_universe, bb_link_value_list["gNb1"].values
+    )
+    best_link_used = bb_link_value_list["linkUsed"].values.astype(bool)
+    fixed = best_link_used & bb_configuration.is_link_in(
+        bb_link_value_list, mandatory_bb_links, gnb_universe
+    )
+    greedy_value = best_value = evaluate.calculate_arc_value(bb_link_value_list)
+    stop_event = worker_process_context.Event()
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=worker_process_context,
+        initializer=_init_worker,
+        initargs=(
+            stop_event,
+            gnb0_codes,
+            gnb1_codes,
+            bb_link_value_list["usability"].values,
+            len(gnb_universe),
+            max_bb_partners,
+            fixed,
+        ),
+    )
+    rounds = 0
+    rounds_without_gain = 0
+    try:
+        while rounds_without_gain < ROUNDS_WITHOUT_GAIN:
+            if time.monotonic() >= deadline:
+                break
+            futures = [
+                executor.submit(
+                    _perturb_and_search,
+                    best_link_used,
+                    seed + rounds * workers + worker,
+                    deadline,
+                )
+                for worker in range(workers)
+            ]
+            results = _wait_for_round(futures, deadline)
+            if results is None:
+                break
+            rounds += 1
+            rounds_without_gain += 1
+            for link_used in results:
+                value = evaluate.calculate_arc_value(
+                    bb_link_value_list.assign(linkUsed=link_used)
+                )
+                if value > best_value + link_assignment.GAIN_TOLERANCE:
+                    best_value = value
+                    best_link_used = link_used
+                    rounds_without_gain = 0
+    finally:
+        stop_event.set()
+        executor.shutdown(cancel_futures=True)
+    logger.info(
+        "Local search gained {:.3f} ARC value over greedy ({:.3f} -> {:.3f}) in {} rounds".format(
+            best_value - greedy_value, greedy_value, best_value, rounds
+        )
+    )
+    if stage is not None:
+        stage.arc_value_gain = best_value - greedy_value
+    bb_link_value_list.loc[:, "linkUsed"] = best_link_used
+    return bb_link_value_list
+
+
+"""
+Summary: Waits for the assignments of one round
+Description:
+        - Returns the assignments finished before the deadline, None if the stop event is set meanwhile
+"""
+
+
+def _wait_for_round(futures, deadline):
+    pending = set(futures)
+    while pending:
+        if optimization_threading_helper.stop_requested():
+            return None
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        _, pending = concurrent.futures.wait(
+            pending, timeout=min(STOP_POLL_SECONDS, remaining)
+        )
+    return [future.result() for future in futures if future.done()]
+
+
+def _init_worker(
+    stop_event, gnb0_codes, gnb1_codes, usability, gnb_count, max_bb_partners, fixed
+):
+    global _worker_links, _worker_job
+    # The stop checks of link_assignment look at the stop event of the current job
+    _worker_job = optimization_threading_helper.OptimizationJob(
+        None, None, {}, [], [], stop_event=stop_event
+    )
+    _worker_links = (
+        gnb0_codes,
+        gnb1_codes,
+        usability,
+        gnb_count,
+        max_bb_partners,
+        fixed,
+    )
+
+
+"""
+Summary: One perturbation and local search of a worker
+Description:
+        - Drops a random share of the used, not fixed links
+        - Improves the remaining assignment while the dropped links are left out (usability 0),
+          so the search has to find other links for the freed partner capacity
+        - Improves the result again with all links
+        - Returns early when the shared stop event is set
+params:
+    link_used(array) : assignment to start from
+    seed(int) : seed of the random link drops
+    deadline(float) : time.monotonic() value after which no new improvement round is started
+"""
+
+
+def _perturb_and_search(link_used, seed, deadline):
+    return optimization_threading_helper.run_as_current_job(
+        _worker_job, lambda job: _search(link_used, seed, deadline)
+    )
+
+
+def _search(link_used, seed, deadline):
+    gnb0_codes, gnb1_codes, usability, gnb_count, max_bb_partners, fixed = _worker_links
+    rng = np.random.default_rng(seed)
+    droppable = np.flatnonzero(link_used & ~fixed)
+    dropped = rng.choice(
+        droppable,
+        size=int(np.ceil(len(droppable) * PERTURBATION_SHARE)),
+        replace=False,
+    )
+    link_used = link_used.copy()
+    link_used[dropped] = False
+    ruined_usability = usability.copy()
+    ruined_usability[dropped] = 0.0
+    for weights in (ruined_usability, usability):
+        link_used = link_assignment.improve_links_b_matching(
+            gnb0_codes,
+            gnb1_codes,
+            weights,
+            gnb_count,
+            max_bb_partners,
+            link_used,
+            fixed=fixed,
+            deadline=deadline,
+        )
+    return link_used
+
+
+# EOF
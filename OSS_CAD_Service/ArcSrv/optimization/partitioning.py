@@ -0,0 +1,380 @@
+#!/usr/bin/env python
+# coding: utf-8
+#
+# Copyright Ericsson (c) 2023
+#
+# ARC Configuration - Partitioned optimization
+# File with routines for optimizing independent regions of the network in parallel, called from build_solution.py
+# Functionality and script layout:
+#   - Build the candidate link graph from the coverage gNB pairs and the mandatory gNB pairs
+#   - Find its connected components, cut components larger than the partition size in BFS order chunks,
+#     and pack the small components together into partitions
+#   - Run the BB link value list (fused pipeline or capability and usability stages) and assignment per partition
+#     on spawned worker processes
+#   - Assign the links cut between partitions greedily with the partner capacity left by the partitions
+#   - Merge the partition results into one BB link list
+import concurrent.futures
+import logging
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+from entities.api_response import ResponseStatus
+from helper import optimization_threading_helper
+from optimization import (
+    bb_configuration,
+    capability_matrix,
+    definitions,
+    link_assignment,
+)
+
+logger = logging.getLogger(__name__)
+
+# Interval for checking the stop event while waiting for the workers:
+STOP_POLL_SECONDS = 0.5
+
+# Forked workers would copy locks held by other threads of the API or optimization process
+worker_process_context = multiprocessing.get_context("spawn")
+
+"""
+Summary: Connected components of a gNB graph
+Description:
+        - Undirected graph over gNB codes 0..gnb_count-1, one edge per link
+        - Min-label propagation over all edges at once, with pointer jumping, until the labels are stable
+params:
+    gnb0_codes(array) : gNB code of one end per link
+    gnb1_codes(array) : gNB code of the other end per link
+    gnb_count(int) : number of gNB codes
+returns:
+    dense component number 0..k-1 per gNB code
+"""
+
+
+def gnb_components(gnb0_codes, gnb1_codes, gnb_count):
+    labels = np.arange(gnb_count)
+    while True:
+        previous = labels.copy()
+        lowest = np.minimum(labels[gnb0_codes], labels[gnb1_codes])
+        np.minimum.at(labels, gnb0_codes, lowest)
+        np.minimum.at(labels, gnb1_codes, lowest)
+        jumped = labels[labels]
+        while not np.array_equal(jumped, labels):
+            labels = jumped
+            jumped = labels[labels]
+        if np.array_equal(labels, previous):
+            break
+    return np.unique(labels, return_inverse=True)[1]
+
+
+"""
+Summary: Partition of a gNB graph into regions of bounded size
+Description:
+        - Components with more than max_partition_gnbs gNBs are cut into chunks of max_partition_gnbs gNBs
+          in breadth-first order, so neighbouring gNBs tend to stay in the same chunk
+        - Smaller components are packed into partitions in decreasing size order,
+          a partition holds at most 2 * max_partition_gnbs gNBs
+params:
+    gnb0_codes(array) : gNB code of one end per link
+    gnb1_codes(array) : gNB code of the other end per link
+    gnb_count(int) : number of gNB codes
+    max_partition_gnbs(int) : target number of gNBs per partition
+returns:
+    dense partition number per gNB code
+"""
+
+
+def partition_gnbs(gnb0_codes, gnb1_codes, gnb_count, max_partition_gnbs):
+    components = gnb_components(gnb0_codes, gnb1_codes, gnb_count)
+    sizes = np.bincount(components)
+    partitions = np.full(gnb_count, -1, dtype=np.int64)
+    partition_count = 0
+    large = np.flatnonzero(sizes > max_partition_gnbs)
+    if len(large):
+        adjacency = _adjacency(gnb0_codes, gnb1_codes, gnb_count)
+        for component in large.tolist():
+            start = int(np.flatnonzero(components == component)[0])
+            order = _breadth_first_order(adjacency, start, gnb_count)
+            partitions[order] = partition_count + (
+                np.arange(len(order)) // max_partition_gnbs
+            )
+            partition_count = int(partitions[order].max()) + 1
+    small = np.flatnonzero(sizes <= max_partition_gnbs)
+    small = small[np.argsort(-sizes[small], kind="stable")]
+    offsets = np.cumsum(sizes[small]) - sizes[small]
+    packed = np.zeros(len(sizes), dtype=np.int64)
+    packed[small] = partition_count + offsets // max_partition_gnbs
+    in_small = partitions < 0
+    partitions[in_small] = packed[components[in_small]]
+    return np.unique(partitions, return_inverse=True)[1]
+
+
+"""
+Summary: Builds the assigned BB link list per network partition
+Description:
+        - Partitions the gNBs of the coverage data and the mandatory links, see partition_gnbs
+        - Every partition gets the coverage rows and mandatory links within it, and the capacity of its sCells
+        - The partitions are optimized on `workers` processes by optimize_partition
+        - The coverage rows and mandatory links between partitions are aggregated to a boundary link list,
+          assigned greedily (mandatory links first) with the partner capacity left by the partitions
+        - The stop event is checked while waiting for the workers
+params:
+    coverage_data(DataFrame) : clean coverage data, see get_data.get_coverage_data
+    capacity_data(DataFrame) : predicted capacity per sCell, see get_data.get_predicted_capacity
+    unwanted_bb_links([(p_gnbdu_id, s_gnbdu_id)]) : list containing unwanted primary and secondary gNbId tuples
+    mandatory_bb_links([(p_gnbdu_id, s_gnbdu_id)]) : list containing mandatory primary and secondary gNbId tuples
+    workers(int) : number of worker processes
+    max_partition_gnbs(int) : target number of gNBs per partition
+    document : collection model document
+returns:
+    the merged BB link list with 'linkUsed' set, None if the optimization was stopped
+"""
+
+
+def build_partitioned_bb_links(
+    coverage_data,
+    capacity_data,
+    unwanted_bb_links,
+    mandatory_bb_links,
+    workers,
+    max_partition_gnbs,
+    document,
+):
+    document.update(status=ResponseStatus.OPTIMIZATION_BUILDING_CAPABILITY)
+    logger.info(ResponseStatus.OPTIMIZATION_BUILDING_CAPABILITY)
+    mandatory_pairs = np.array(list(mandatory_bb_links), dtype=np.int64).reshape(-1, 2)
+    primary_gnb = coverage_data["primary_gnb"].values.astype(np.int64)
+    secondary_gnb = coverage_data["secondary_gnb"].values.astype(np.int64)
+    gnb_universe = link_assignment.gnb_universe(
+        np.concatenate([primary_gnb, mandatory_pairs[:, 0]]),
+        np.concatenate([secondary_gnb, mandatory_pairs[:, 1]]),
+    )
+    row_codes = (
+        link_assignment.gnb_codes(gnb_universe, primary_gnb),
+        link_assignment.gnb_codes(gnb_universe, secondary_gnb),
+    )
+    mandatory_codes = (
+        link_assignment.gnb_codes(gnb_universe, mandatory_pairs[:, 0]),
+        link_assignment.gnb_codes(gnb_universe, mandatory_pairs[:, 1]),
+    )
+    partitions = partition_gnbs(
+        np.concatenate([row_codes[0], mandatory_codes[0]]),
+        np.concatenate([row_codes[1], mandatory_codes[1]]),
+        len(gnb_universe),
+        max_partition_gnbs,
+    )
+    row_partition = partitions[row_codes[0]]
+    row_is_cut = row_partition != partitions[row_codes[1]]
+    mandatory_partition = partitions[mandatory_codes[0]]
+    mandatory_is_cut = mandatory_partition != partitions[mandatory_codes[1]]
+    partition_count = int(partitions.max()) + 1 if len(partitions) else 0
+    logger.info(
+        "Optimizing {} gNBs in {} partitions, {} of {} coverage rows between partitions".format(
+            len(gnb_universe),
+            partition_count,
+            np.count_nonzero(row_is_cut),
+            len(row_is_cut),
+        )
+    )
+    partition_results = _optimize_partitions(
+        coverage_data,
+        capacity_data,
+        unwanted_bb_links,
+        mandatory_pairs,
+        row_partition,
+        row_is_cut,
+        mandatory_partition,
+        mandatory_is_cut,
+        partition_count,
+        workers,
+    )
+    if partition_results is None:
+        return None
+    return _merge_with_boundary_links(
+        partition_results,
+        _build_bb_link_value_list(
+            coverage_data[row_is_cut],
+            capacity_data,
+            unwanted_bb_links,
+            [tuple(pair) for pair in mandatory_pairs[mandatory_is_cut].tolist()],
+        ),
+    )
+
+
+"""
+Summary: Optimizes one network partition
+Description:
+        - Capability, usability, BB link value list, unwanted and mandatory links and assignment,
+          as in build_solution.run_optimization but without status updates
+        - Runs in a worker process
+params:
+    coverage_data(DataFrame) : coverage rows of the partition
+    capacity_data(DataFrame) : predicted capacity of the sCells of the partition
+    unwanted_bb_links([(p_gnbdu_id, s_gnbdu_id)]) : list containing unwanted primary and secondary gNbId tuples
+    mandatory_bb_links([(p_gnbdu_id, s_gnbdu_id)]) : mandatory gNbId tuples of the partition
+"""
+
+
+def optimize_partition(
+    coverage_data, capacity_data, unwanted_bb_links, mandatory_bb_links
+):
+    bb_link_value_list = _build_bb_link_value_list(
+        coverage_data, capacity_data, unwanted_bb_links, mandatory_bb_links
+    )
+    return bb_configuration.assign_bb_links(
+        bb_link_value_list,
+        definitions.MAX_BB_PARTNERS,
+        solver=definitions.ASSIGNMENT_SOLVER,
+    )
+
+
+def _build_bb_link_value_list(
+    coverage_data, capacity_data, unwanted_bb_links, mandatory_bb_links
+):
+    capacity_index = capability_matrix.get_capacity_index(capacity_data)
+    if definitions.FUSED_PIPELINE:
+        bb_link_value_list = bb_configuration.create_bb_link_value_list_from_coverage(
+            coverage_data,
+            capacity_index,
+            definitions.CAPABILITY_LIMIT,
+            definitions.MAX_EXTERNAL_CELLS_SECONDARY_GNB,
+        )
+    else:
+        df_usability = capability_matrix.calculate_usability_matrix(
+            coverage_data, capacity_index, definitions.CAPABILITY_LIMIT
+        )
+        bb_link_value_list = bb_configuration.create_bb_link_value_list(
+            df_usability, definitions.MAX_EXTERNAL_CELLS_SECONDARY_GNB
+        )
+    filtered_bb_link_value_list = bb_configuration.check_unwanted_bb_link(
+        bb_link_value_list, unwanted_bb_links
+    )
+    return bb_configuration.add_mandatory_bb_links(
+        filtered_bb_link_value_list, mandatory_bb_links
+    )
+
+
+"""
+Summary: Runs optimize_partition for all partitions on worker processes
+Description:
+        - Returns the assigned BB link list per partition, None if the stop event is set meanwhile
+"""
+
+
+def _optimize_partitions(
+    coverage_data,
+    capacity_data,
+    unwanted_bb_links,
+    mandatory_pairs,
+    row_partition,
+    row_is_cut,
+    mandatory_partition,
+    mandatory_is_cut,
+    partition_count,
+    workers,
+):
+    rows = np.flatnonzero(~row_is_cut)
+    rows = rows[np.argsort(row_partition[rows], kind="stable")]
+    row_bounds = np.searchsorted(row_partition[rows], np.arange(partition_count + 1))
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, mp_context=worker_process_context
+    )
+    try:
+        pending = set()
+        for partition in range(partition_count):
+            partition_mandatory = mandatory_pairs[
+                ~mandatory_is_cut & (mandatory_partition == partition)
+            ]
+            partition_coverage = coverage_data.iloc[
+                rows[row_bounds[partition] : row_bounds[partition + 1]]
+            ]
+            pending.add(
+                executor.submit(
+                    optimize_partition,
+                    partition_coverage,
+                    capacity_data[
+                        capacity_data["sNCI"].isin(partition_coverage["sNCI"])
+                    ],
+                    unwanted_bb_links,
+                    [tuple(pair) for pair in partition_mandatory.tolist()],
+                )
+            )
+        results = []
+        while pending:
+            if optimization_threading_helper.stop_requested():
+                return None
+            done, pending = concurrent.futures.wait(
+                pending,
+                timeout=STOP_POLL_SECONDS,
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            results.extend(future.result() for future in done)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results
+
+
+"""
+Summary: Merges the partition results and assigns the links between partitions
+Description:
+        - The boundary links are assigned greedily in list order (mandatory links first), using
+          only the partner capacity per gNB and direction that the partitions left unused
+        - The merged list is sorted in descending usability order
+"""
+
+
+def _merge_with_boundary_links(partition_results, boundary_links):
+    assigned = pd.concat(partition_results, ignore_index=True)
+    gnb_universe = link_assignment.gnb_universe(
+        np.concatenate([assigned["gNb0"].values, boundary_links["gNb0"].values]),
+        np.concatenate([assigned["gNb1"].values, boundary_links["gNb1"].values]),
+    )
+    used = assigned["linkUsed"].values.astype(bool)
+    boundary_links.loc[:, "linkUsed"] = link_assignment.assign_links_greedy(
+        link_assignment.gnb_codes(gnb_universe, boundary_links["gNb0"].values),
+        link_assignment.gnb_codes(gnb_universe, boundary_links["gNb1"].values),
+        len(gnb_universe),
+        definitions.MAX_BB_PARTNERS,
+        links_to_sec=np.bincount(
+            link_assignment.gnb_codes(gnb_universe, assigned["gNb0"].values[used]),
+            minlength=len(gnb_universe),
+        ),
+        links_to_prim=np.bincount(
+            link_assignment.gnb_codes(gnb_universe, assigned["gNb1"].values[used]),
+            minlength=len(gnb_universe),
+        ),
+    )
+    merged = pd.concat([assigned, boundary_links], ignore_index=True)
+    order = np.argsort(-merged["usability"].values, kind="stable")
+    return merged.take(order).reset_index(drop=True)
+
+
+def _adjacency(gnb0_codes, gnb1_codes, gnb_count):
+    sources = np.concatenate([gnb0_codes, gnb1_codes])
+    targets = np.concatenate([gnb1_codes, gnb0_codes])
+    order = np.argsort(sources, kind="stable")
+    bounds = np.searchsorted(sources[order], np.arange(gnb_count + 1))
+    return bounds, targets[order]
+
+
+"""
+Summary: Breadth-first visiting order of the component of start, one vectorized step per BFS level
+"""
+
+
+def _breadth_first_order(adjacency, start, gnb_count):
+    bounds, targets = adjacency
+    visited = np.zeros(gnb_count, dtype=bool)
+    visited[start] = True
+    frontier = np.array([start])
+    levels = [frontier]
+    while len(frontier):
+        counts = bounds[frontier + 1] - bounds[frontier]
+        first = np.repeat(bounds[frontier] - np.cumsum(counts) + counts, counts)
+        neighbours = targets[first + np.arange(counts.sum())]
+        frontier = np.unique(neighbours[~visited[neighbours]])
+        visited[frontier] = True
+        levels.append(frontier)
+    return np.concatenate(levels)
+
+
+# EOF
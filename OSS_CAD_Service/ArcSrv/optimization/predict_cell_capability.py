@@ -7,15 +7,24 @@
 # Use stored ML model to predict the capability of sCells in ARC Automation
 # Basic functionality:
 #   - Read in data samples
-#   - Read the stored regression model for prediction of cell load during set prediction time interval
-#   - Calculate cell capability estimate
+#   - Read the stored regression model for prediction of cell load during set prediction time interval,
+#     kept per model file until the file changes
+#   - Calculate cell capability estimate for all samples at once
 #   - Return results
 
 # Some ideas to try out:
 # -> Include min(prediction, availableRBSymbols)? To avoid predicting more than possible, but how to know maximum value?
 
+import os
+import threading
+
+import numpy as np
 import pandas as pd
 
+# Predictors read by get_predictor as {(model file path, separator): (fingerprint, predictor)}
+_predictors = {}
+_predictors_lock = threading.Lock()
+
 """
 Summary: Read in the model data, normalize capacity data, and calculate the predicted capacity value
 Description:
@@ -50,17 +59,106 @@ params:
 def normalize_data(df, normalize_columns, normalize_constants):
     df_final = df.copy()
     for index, col in enumerate(normalize_columns):
-        df_final[col + "Norm"] = [
-            (value / normalize_constants[index]) for value in df_final[col]
-        ]
+        df_final[col + "Norm"] = df_final[col].values / normalize_constants[index]
     return df_final
 
 
+"""
+Summary: Linear regression model for the cell capability
+Description:
+        - predicted value = intercept + sum(coefficient * value / normalizeConstant) over the feature columns
+        - The feature columns are the columns with a coefficient in the model file, RBSymFree for the
+          current model
+params:
+    intercept(float) : intercept of the model
+    feature_columns([str]) : names of the feature columns
+    coefficients([float]) : coefficient of every feature column
+    normalize_constants([float]) : normalization constant of every feature column
+"""
+
+
+class CellCapabilityPredictor:
+    def __init__(self, intercept, feature_columns, coefficients, normalize_constants):
+        self.intercept = float(intercept)
+        self.feature_columns = list(feature_columns)
+        self.coefficients = np.asarray(coefficients, dtype=float)
+        self.normalize_constants = np.asarray(normalize_constants, dtype=float)
+
+    """
+    Summary: Read the model from the CSV file with model and normalization data
+    Description:
+            - The first row holds the intercept and the coefficients, the second row the normalization constants
+    params:
+        file_name(String) : A csv file name
+        separator(Character) : A character that separates normalization data
+    """
+
+    @classmethod
+    def from_file(cls, file_name, separator):
+        df = pd.read_csv(file_name, sep=separator)
+        coefficients = df.loc[0].drop(["indices", "intercept"], errors="ignore")
+        feature_columns = coefficients.index[coefficients.notna()]
+        return cls(
+            df.loc[0]["intercept"],
+            feature_columns,
+            coefficients[feature_columns].values,
+            df.loc[1][feature_columns].values,
+        )
+
+    """
+    Summary: Predict the cell capability of samples
+    params:
+        features(array) : feature values as (samples, feature columns) array,
+                          or a one dimensional array of samples for a single feature model
+    """
+
+    def predict(self, features):
+        features = np.asarray(features, dtype=float)
+        if features.ndim == 1:
+            features = features[:, np.newaxis]
+        return (
+            self.intercept + (features / self.normalize_constants) @ self.coefficients
+        )
+
+    """
+    Summary: Predict the cell capability of the rows of a data frame holding the feature columns
+    """
+
+    def predict_frame(self, df):
+        return self.predict(df[self.feature_columns].to_numpy(dtype=float))
+
+
+"""
+Summary: Get the model of a model file
+Description:
+        - The model is read once and kept until the modification time or size of the file changes
+params:
+    file_name(String) : A csv file name
+    separator(Character) : A character that separates normalization data
+"""
+
+
+def get_predictor(file_name, separator):
+    stat = os.stat(file_name)
+    fingerprint = (stat.st_mtime_ns, stat.st_size)
+    key = (os.path.abspath(file_name), separator)
+    with _predictors_lock:
+        cached = _predictors.get(key)
+        if cached is None or cached[0] != fingerprint:
+            cached = (
+                fingerprint,
+                CellCapabilityPredictor.from_file(file_name, separator),
+            )
+            _predictors[key] = cached
+        return cached[1]
+
+
 """
 Summary: Entry point for the prediction
 Description:
         - Predict the average available cell capacity for the next time interval:
-        - Use the simple regression read from the stored model
+        - Use the simple regression read from the stored model, see get_predictor
+        - Returns a copy of the data frame with the 'predictedCapacity' column added
 params:
     model_file_name(String) : A file path
     model_separator(Character) : A character that separates cell availability data
@@ -69,17 +167,10 @@ params:
 
 
 def add_predicted_cell_capacity(model_file_name, model_separator, df_capacity_data):
-    intercept, coefficient_0, normalize_constant_0 = get_model(
-        model_file_name, model_separator
-    )
-    df_capacity_norm = normalize_data(
-        df_capacity_data.copy(), ["RBSymFree"], [normalize_constant_0]
-    )
-    df_capacity_pred = df_capacity_norm.copy()
-    df_capacity_pred["predictedCapacity"] = (
-        intercept + coefficient_0 * df_capacity_norm["RBSymFreeNorm"]
+    predictor = get_predictor(model_file_name, model_separator)
+    return df_capacity_data.assign(
+        predictedCapacity=predictor.predict_frame(df_capacity_data)
     )
-    return df_capacity_pred
 
 
 # EOF
@@ -15,6 +15,7 @@ from io import BytesIO
 from configs import object_store_config as storage_config
 from configs import optimization_config
 from minio.retention import Retention
+from optimization import bb_configuration
 
 import pandas as pd
 
@@ -27,7 +28,7 @@ def establish_object_storage_connection():
                  secret_key=storage_config.secret_key, secure=False)
 
 
-def save_in_bucket(bb_link_df, mandatory_bb_links, task_opt_id):
+def save_in_bucket(bb_link_df, mandatory_bb_links, task_opt_id, gnb_universe=None):
     minio_client = establish_object_storage_connection()
     fdate = datetime.now()
     file_name = 'CAD_Optimization_' + task_opt_id + '_' + fdate.strftime('%m%d%Y_%H%M%S') + '.csv'
@@ -41,10 +42,9 @@ def save_in_bucket(bb_link_df, mandatory_bb_links, task_opt_id):
 
     bb_link_df['Mandatory Pair'] = False
     dfnew = bb_link_df
-    dfnew['Mandatory Pair'] = bb_link_df.gNbs.isin(mandatory_bb_links)
+    dfnew['Mandatory Pair'] = bb_configuration.is_link_in(bb_link_df, mandatory_bb_links, gnb_universe)
 
     df = pd.DataFrame(dfnew)
-    df = df.drop('gNbs', axis=1)
     df = df.reindex(columns=['gNb0', 'gNb1', 'usability', 'linkUsed', 'Mandatory Pair'])
     df = df.rename(columns={'gNb0': 'Primary gNodeB ID', 'gNb1': 'Secondary gNodeB ID', 'usability': 'Usability',
                             'linkUsed': 'Link used'})
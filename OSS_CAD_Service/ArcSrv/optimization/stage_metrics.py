@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# coding: utf-8
+#
+# Copyright Ericsson (c) 2023
+#
+# ARC Configuration - Stage metrics
+# File with routines for measuring the optimization stages, called from build_solution.py and get_data.py
+# Functionality and script layout:
+#   - Measure wall time, CPU time of the optimization thread, peak RSS delta and row count of a stage,
+#     and the ARC value gained by the local search in the assignment stage
+#   - Append the measurement to the stage_metrics of the Optimization document when the stage ends,
+#     the times of a stage include the stages run inside it
+#   - Sum the measurements of the process for the Prometheus text endpoint
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+from entities.database_collection_models import StageMetrics
+
+CM_COLLECTION = "cm_collection"
+PM_COLLECTION = "pm_collection"
+PREDICTION = "prediction"
+CAPABILITY = "capability"
+USABILITY = "usability"
+LINK_BUILDING = "link_building"
+ASSIGNMENT = "assignment"
+SAVING = "saving"
+REPORT_UPLOAD = "report_upload"
+
+# Prometheus metrics as (name, type, help, field of the totals)
+PROMETHEUS_METRICS = (
+    (
+        "arc_optimization_stage_runs_total",
+        "counter",
+        "Runs of the optimization stage.",
+        "runs",
+    ),
+    (
+        "arc_optimization_stage_wall_seconds_total",
+        "counter",
+        "Wall time of the optimization stage.",
+        "wall_time",
+    ),
+    (
+        "arc_optimization_stage_cpu_seconds_total",
+        "counter",
+        "CPU time of the optimization stage.",
+        "cpu_time",
+    ),
+    (
+        "arc_optimization_stage_rows_total",
+        "counter",
+        "Rows produced by the optimization stage.",
+        "rows",
+    ),
+    (
+        "arc_optimization_stage_peak_rss_delta_bytes",
+        "gauge",
+        "Peak RSS growth of the last run of the optimization stage.",
+        "peak_rss_delta",
+    ),
+)
+
+# Totals of the process per stage name, read by render_prometheus
+_totals = {}
+_totals_lock = threading.Lock()
+
+
+class StageMeasurement:
+    def __init__(self, name):
+        self.name = name
+        self.rows = None
+        self.arc_value_gain = None
+
+
+"""
+Summary: Measure an optimization stage
+Description:
+        - Context manager yielding a StageMeasurement, set its rows to the number of rows of the stage result
+          and its arc_value_gain to the ARC value gained by the stage, if any
+        - The CPU time is the time of the calling thread, work of other processes is not included
+        - The peak RSS delta is the growth of the peak RSS of the process during the stage,
+          0 if the stage stayed below an earlier peak
+        - The measurement is appended to the document also if the stage raises
+params:
+    document : collection model document
+    name(str) : name of the stage
+"""
+
+
+@contextmanager
+def measure_stage(document, name):
+    measurement = StageMeasurement(name)
+    start_rss = _peak_rss()
+    start_cpu = time.thread_time()
+    start = time.perf_counter()
+    try:
+        yield measurement
+    finally:
+        metrics = StageMetrics(
+            name=name,
+            wall_time=time.perf_counter() - start,
+            cpu_time=time.thread_time() - start_cpu,
+            peak_rss_delta=_peak_rss() - start_rss,
+            rows=measurement.rows,
+            arc_value_gain=measurement.arc_value_gain,
+        )
+        add_to_totals(metrics)
+        document.update(push__stage_metrics=metrics)
+
+
+"""
+Summary: Render the stage totals of the process in the Prometheus text format
+"""
+
+
+def render_prometheus():
+    with _totals_lock:
+        totals = {name: dict(stage_totals) for name, stage_totals in _totals.items()}
+    lines = []
+    for metric, metric_type, description, field in PROMETHEUS_METRICS:
+        lines.append("# HELP {} {}".format(metric, description))
+        lines.append("# TYPE {} {}".format(metric, metric_type))
+        for name, stage_totals in sorted(totals.items()):
+            lines.append(
+                '{}{{stage="{}"}} {}'.format(metric, name, stage_totals[field])
+            )
+    return "\n".join(lines) + "\n"
+
+
+"""
+Summary: Add a stage measurement to the totals of the process
+Description:
+        - Called by measure_stage, and by the service for the measurements of optimizations run in worker processes
+"""
+
+
+def add_to_totals(metrics):
+    with _totals_lock:
+        stage_totals = _totals.setdefault(
+            metrics.name, {"runs": 0, "wall_time": 0.0, "cpu_time": 0.0, "rows": 0}
+        )
+        stage_totals["runs"] += 1
+        stage_totals["wall_time"] += metrics.wall_time
+        stage_totals["cpu_time"] += metrics.cpu_time
+        stage_totals["rows"] += metrics.rows or 0
+        stage_totals["peak_rss_delta"] = metrics.peak_rss_delta
+
+
+def _peak_rss():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# EOF
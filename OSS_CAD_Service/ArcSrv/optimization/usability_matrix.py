@@ -31,6 +31,21 @@ params:
 
 def build_usability_matrix(capability_matrix, capability_limit, document):
     document.update(status=ResponseStatus.OPTIMIZATION_BUILDING_USABILITY)
+    return calculate_usability_matrix(capability_matrix, capability_limit)
+
+
+"""
+Summary: Calculate the usability matrix for all P/S cell pairs
+Description:
+        - Calculation part of build_usability_matrix, without status updates
+        - Used directly by the partition workers in partitioning.py
+params:
+    capability_matrix([]) : A data frame that holds pNCI, sNCI, primary_gnb, capability, secondary_gnb data arrays.
+    capability_limit(double) : A usability limit value
+"""
+
+
+def calculate_usability_matrix(capability_matrix, capability_limit):
     usability_matrix = capability_matrix.copy()
     usability_matrix["usability"] = usability_matrix["capability"]
     usability_matrix["usability"].where(
@@ -17,7 +17,8 @@ from entities.references import ExternalId
 from entities.topology import GNodeB, NodeRelation
 from services.topology_service import iter_catalog, get_node_by_global_id, get_node_by_local_id
 
-__connection = RestConnection(cm_config.hostname, cm_config.username, cm_config.password)
+__connection = RestConnection(cm_config.hostname, cm_config.username, cm_config.password,
+                              session_ttl=float(cm_config.session_ttl))
 __client = CmClient(__connection)
 
 __cache_manage = multiprocessing.Manager()
@@ -26,6 +27,11 @@ __cache = __cache_manage.dict()
 EXTERNAL_NODE_FILTER = ManagedObject(mo_type="ExternalGNBCUCPFunction")
 
 
+# Login manager of the CM connection, for the auth metrics
+def auth_manager():
+    return __connection.auth
+
+
 def health_check() -> bool:
     try:
         __client.search_handle(json=dict())
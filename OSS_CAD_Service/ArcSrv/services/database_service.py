@@ -9,15 +9,31 @@
 from entities.database_collection_models import (
     GnbduPairs,
     Gnbdus,
+    LinkValues,
     Optimization,
     TargetGnbdus,
+    TopologyCatalog,
+    TopologyNodes,
 )
+import datetime
 import logging
+from configs import mongo_db_config
 from mongoengine import OperationError
+from mongoengine.connection import get_db
 from mongoengine.queryset.visitor import Q
+from pymongo import DeleteOne, ReplaceOne
 
 logger = logging.getLogger(__name__)
 
+# Number of links per link values document, keeps the documents well below the MongoDB document size limit
+LINK_VALUES_CHUNK_SIZE = 50000
+
+# Compound index of the PM data time series collection, created by the PM Data Handler
+PM_DATA_INDEX = [("metadata.gnb_id", 1), ("timestamp", -1)]
+
+# Fields of the unique key of a topology node, the global gNB ID
+TOPOLOGY_NODE_KEY = ("mcc", "mnc", "gnb_id", "gnb_id_length")
+
 
 def parse_target_ghbdus(selected_nodes):
     target_gnbdus_list = []
@@ -107,3 +123,151 @@ def persist_newly_created_optimization_instance(
 def get_optimization_by_id(_id, collection_name):
     if collection_name == "Optimization":
         return Optimization.objects.with_id(_id)
+
+
+def persist_link_values(optimization_id, gnb0, gnb1, usability, link_used):
+    logger.debug(
+        "Saving link values of optimization %s into the database.", optimization_id
+    )
+    LinkValues.objects(optimization_id=optimization_id).delete()
+    link_values = [
+        LinkValues(
+            optimization_id=optimization_id,
+            chunk=chunk,
+            gnb0=gnb0[start : start + LINK_VALUES_CHUNK_SIZE],
+            gnb1=gnb1[start : start + LINK_VALUES_CHUNK_SIZE],
+            usability=usability[start : start + LINK_VALUES_CHUNK_SIZE],
+            link_used=link_used[start : start + LINK_VALUES_CHUNK_SIZE],
+        )
+        for chunk, start in enumerate(range(0, len(gnb0), LINK_VALUES_CHUNK_SIZE))
+    ]
+    if link_values:
+        LinkValues.objects.insert(link_values, load_bulk=False)
+
+
+# Keeps the link value lists of the latest keep optimizations, ObjectIds grow with their creation time
+def prune_link_values(keep):
+    optimization_ids = sorted(LinkValues.objects.distinct("optimization_id"))
+    stale_ids = optimization_ids[: max(len(optimization_ids) - keep, 0)]
+    if stale_ids:
+        logger.debug(
+            "Deleting link values of %d optimizations from the database.",
+            len(stale_ids),
+        )
+        LinkValues.objects(optimization_id__in=stale_ids).delete()
+
+
+def get_link_values(optimization_id):
+    gnb0, gnb1, usability, link_used = [], [], [], []
+    chunks = LinkValues.objects(optimization_id=optimization_id).order_by("chunk")
+    for link_values in chunks:
+        gnb0.extend(link_values.gnb0)
+        gnb1.extend(link_values.gnb1)
+        usability.extend(link_values.usability)
+        link_used.extend(link_values.link_used)
+    return gnb0, gnb1, usability, link_used
+
+
+# Mean free downlink RB symbols per cell of the gNBs, averaged over the PM samples between start_date
+# and end_date by the database, returned as one {"sNCI", "RBSymFree"} document per cell
+def get_pm_capacity(gnb_ids, start_date, end_date, cells_per_gnb):
+    logger.debug("Aggregating PM capacity of %d gNBs from the database.", len(gnb_ids))
+    pipeline = [
+        {
+            "$match": {
+                "metadata.gnb_id": {"$in": gnb_ids},
+                "timestamp": {"$gte": start_date, "$lt": end_date},
+            }
+        },
+        {
+            "$group": {
+                "_id": {
+                    "gnb_id": "$metadata.gnb_id",
+                    "cell_id": "$metadata.cell_id",
+                },
+                "RBSymFree": {
+                    "$avg": {
+                        "$subtract": [
+                            "$pm_mac_r_b_sym_avail_dl",
+                            "$pm_mac_r_b_sym_used_pdsch_type_a",
+                        ]
+                    }
+                },
+            }
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "sNCI": {
+                    "$add": [
+                        {"$multiply": ["$_id.gnb_id", cells_per_gnb]},
+                        "$_id.cell_id",
+                    ]
+                },
+                "RBSymFree": 1,
+            }
+        },
+    ]
+    pm_collection = get_db(mongo_db_config.arc_db_name)[
+        mongo_db_config.pm_collection_name
+    ]
+    # Time series collections only use a secondary index for the $match if it is given as hint
+    return list(pm_collection.aggregate(pipeline, hint=PM_DATA_INDEX))
+
+
+def get_topology_catalog(name):
+    return TopologyCatalog.objects(name=name).first()
+
+
+# Claims the refresh of a topology catalog for lease_seconds, False if another process holds an unexpired lease
+# The lease ends with save_topology_catalog
+def claim_topology_catalog_refresh(name, lease_seconds):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    TopologyCatalog.objects(name=name).update_one(set_on_insert__version=0, upsert=True)
+    claimed = TopologyCatalog.objects(
+        Q(name=name) & (Q(refresh_lease_until=None) | Q(refresh_lease_until__lt=now))
+    ).update_one(
+        set__refresh_lease_until=now + datetime.timedelta(seconds=lease_seconds)
+    )
+    return claimed > 0
+
+
+# Ends the refresh lease of a topology catalog without saving it, after a failed refresh
+def release_topology_catalog_refresh(name):
+    TopologyCatalog.objects(name=name).update_one(unset__refresh_lease_until=True)
+
+
+# Topology nodes as raw documents without the MongoDB ID
+def get_topology_nodes():
+    return TopologyNodes.objects.exclude("id").as_pymongo()
+
+
+def get_topology_node_digests():
+    return {
+        tuple(document[field] for field in TOPOLOGY_NODE_KEY): document["digest"]
+        for document in TopologyNodes.objects.only(
+            *TOPOLOGY_NODE_KEY, "digest"
+        ).as_pymongo()
+    }
+
+
+# Saves a topology catalog refresh: upserts the new and changed nodes, deletes the removed ones by their
+# TOPOLOGY_NODE_KEY values and ends the refresh lease. The version is incremented if nodes changed, it is returned
+def save_topology_catalog(name, changed_nodes, removed_keys, node_count):
+    operations = [
+        ReplaceOne(
+            {field: node[field] for field in TOPOLOGY_NODE_KEY}, node, upsert=True
+        )
+        for node in changed_nodes
+    ] + [DeleteOne(dict(zip(TOPOLOGY_NODE_KEY, key))) for key in removed_keys]
+    if operations:
+        TopologyNodes._get_collection().bulk_write(operations, ordered=False)
+    update = dict(
+        set__refreshed_at=datetime.datetime.now(datetime.timezone.utc),
+        set__node_count=node_count,
+        unset__refresh_lease_until=True,
+    )
+    if operations:
+        update["inc__version"] = 1
+    catalog = TopologyCatalog.objects(name=name).modify(upsert=True, new=True, **update)
+    return catalog.version
@@ -4,10 +4,11 @@
 # Copyright Ericsson (c) 2022
 import datetime
 import logging
+import multiprocessing
 import threading
-import time
 
 import pymongoose
+from configs import optimization_config
 from entities.api_response import ResponseStatus
 from entities.configuration_status_get_parameters import (
     ConfigurationStatusGetResponse,
@@ -41,11 +42,20 @@ from entities.partner_configuration_create_instance_post_parameters import (
 )
 from fastapi import status
 from helper import optimization_threading_helper
-from optimization import build_solution
+from optimization import build_solution, stage_metrics
 from services import database_service
 
 logger = logging.getLogger(__name__)
 
+# Scheduler of the optimization jobs of the service, created by get_scheduler
+optimization_scheduler = None
+optimization_scheduler_lock = threading.Lock()
+
+# With the process backend every optimization runs in a new interpreter process, away from the GIL of the API.
+# Spawned processes do not inherit the threads and the Mongo connection of the API process
+PROCESS_BACKEND = "process"
+optimization_process_context = multiprocessing.get_context("spawn")
+
 # Configuration Instances IDs and logic
 configuration_instance_id_counter = 0
 configuration_instances_with_ids_and_data = {}
@@ -101,7 +111,9 @@ def get_str(id):
         return id.__str__()
 
 
-def start_optimization(optimization_id: str):
+def start_optimization(
+    optimization_id: str, reference_id: str = None, priority: int = 0
+):
     response_code = status.HTTP_404_NOT_FOUND
     if pymongoose.ObjectId.is_valid(optimization_id):
         response_orm = OptimizationStartPostResponseCls(
@@ -112,40 +124,61 @@ def start_optimization(optimization_id: str):
         current_optimization = database_service.get_optimization_by_id(
             optimization_id, "Optimization"
         )
-        if current_optimization:
-            stop_ongoing_optimization(optimization_id)
-            if not optimization_threading_helper.task_thread.is_alive():
-                (
+        if current_optimization and not reference_exists(reference_id):
+            response_orm = OptimizationStartPostResponseCls(
+                status=ResponseStatus.ERROR,
+                result=OptimizationStartPostResponseResult.OPTIMIZATION_START_POST_REFERENCE_NOT_EXIST_404,
+            )
+            response = OptimizationStartPostResponse.from_orm(response_orm)
+        elif current_optimization and not reference_finished(reference_id):
+            response_orm = OptimizationStartPostResponseCls(
+                status=ResponseStatus.ERROR,
+                result=OptimizationStartPostResponseResult.OPTIMIZATION_START_POST_REFERENCE_NOT_FINISHED_409,
+            )
+            response = OptimizationStartPostResponse.from_orm(response_orm)
+            response_code = status.HTTP_409_CONFLICT
+        elif current_optimization and get_scheduler().is_active(optimization_id):
+            response_orm = OptimizationStartPostResponseCls(
+                status=ResponseStatus.ERROR,
+                result=OptimizationStartPostResponseResult.OPTIMIZATION_START_POST_BUSY_409,
+            )
+            response = OptimizationStartPostResponse.from_orm(response_orm)
+            response_code = status.HTTP_409_CONFLICT
+        elif current_optimization:
+            (
+                gnb_dict,
+                unwanted_bb_links,
+                mandatory_bb_links,
+            ) = parse_start_optimization_body(
+                current_optimization.target_gnbdus,
+                current_optimization.restricted_links,
+                current_optimization.mandatory_links,
+            )
+            response_orm = OptimizationStartPostResponseCls(
+                status=ResponseStatus.ERROR,
+                result=OptimizationStartPostResponseResult.OPTIMIZATION_START_POST_DATA_NOT_PROVIDED_400,
+            )
+            response = OptimizationStartPostResponse.from_orm(response_orm)
+            response_code = status.HTTP_400_BAD_REQUEST
+            if gnb_dict:
+                response_orm = OptimizationStartPostResponseCls(
+                    status=ResponseStatus.SUCCESS,
+                    result=OptimizationStartPostResponseResult.OPTIMIZATION_START_POST_START_SUCCESS_200,
+                )
+                response = OptimizationStartPostResponse.from_orm(response_orm)
+                response_code = status.HTTP_200_OK
+                current_optimization.update(
+                    status=ResponseStatus.OPTIMIZATION_IN_QUEUE, stage_metrics=[]
+                )
+                submit_optimization_job(
+                    optimization_id,
                     gnb_dict,
                     unwanted_bb_links,
                     mandatory_bb_links,
-                ) = parse_start_optimization_body(
-                    current_optimization.target_gnbdus,
-                    current_optimization.restricted_links,
-                    current_optimization.mandatory_links,
-                )
-                response_orm = OptimizationStartPostResponseCls(
-                    status=ResponseStatus.ERROR,
-                    result=OptimizationStartPostResponseResult.OPTIMIZATION_START_POST_DATA_NOT_PROVIDED_400,
+                    current_optimization,
+                    reference_id,
+                    priority,
                 )
-                response = OptimizationStartPostResponse.from_orm(response_orm)
-                response_code = status.HTTP_400_BAD_REQUEST
-                if gnb_dict:
-                    response_orm = OptimizationStartPostResponseCls(
-                        status=ResponseStatus.SUCCESS,
-                        result=OptimizationStartPostResponseResult.OPTIMIZATION_START_POST_START_SUCCESS_200,
-                    )
-                    response = OptimizationStartPostResponse.from_orm(response_orm)
-                    response_code = status.HTTP_200_OK
-                    current_optimization.update(
-                        status=ResponseStatus.OPTIMIZATION_IN_QUEUE
-                    )
-                    start_optimization_thread(
-                        gnb_dict,
-                        unwanted_bb_links,
-                        mandatory_bb_links,
-                        current_optimization,
-                    )
     else:
         response_orm = OptimizationStartPostResponseCls(
             status=ResponseStatus.OPTIMIZATION_INVALID_ID,
@@ -155,24 +188,20 @@ def start_optimization(optimization_id: str):
     return response, response_code
 
 
-def stop_ongoing_optimization(optimization_id):
-    existing_thread_opt_id = optimization_threading_helper.task_opt_id
-    if optimization_id != existing_thread_opt_id:
-        # Updating the status of the running optimization instance to Interrupted
-        if (
-            optimization_threading_helper.task_thread.is_alive()
-            and existing_thread_opt_id != "None"
-        ):
-            already_running_optimization = database_service.get_optimization_by_id(
-                existing_thread_opt_id, "Optimization"
-            )
-            already_running_optimization.update(
-                status=ResponseStatus.OPTIMIZATION_FINISHED,
-                optimization_end_date=datetime.datetime.now(),
-            )
-            # Stop the running optimization for the specific optimization instance
-            stop_optimization(existing_thread_opt_id)
-        optimization_threading_helper.task_opt_id = optimization_id
+def reference_exists(reference_id):
+    return reference_id is None or (
+        pymongoose.ObjectId.is_valid(reference_id)
+        and database_service.get_optimization_by_id(reference_id, "Optimization")
+        is not None
+    )
+
+
+# Only a finished optimization has a complete link value list, a failed one may have none or that of an earlier run
+def reference_finished(reference_id):
+    return reference_id is None or (
+        database_service.get_optimization_by_id(reference_id, "Optimization").status
+        == ResponseStatus.OPTIMIZATION_FINISHED
+    )
 
 
 def parse_start_optimization_body(target_gnbdus, restricted_links, mandatory_links):
@@ -205,26 +234,138 @@ def parse_node_partner_constraints_list(gnb_pairs_partner_name):
     return gnb_pairs_list
 
 
-def start_optimization_thread(
-    gnb_dict, unwanted_bb_pairs, mandatory_bb_links, current_optimization
+def get_scheduler():
+    global optimization_scheduler
+    with optimization_scheduler_lock:
+        if optimization_scheduler is None:
+            optimization_scheduler = (
+                optimization_threading_helper.OptimizationScheduler(
+                    (
+                        run_optimization_job_in_process
+                        if process_backend()
+                        else run_optimization_job
+                    ),
+                    int(optimization_config.max_concurrent_optimizations),
+                    confirm_optimization_stopped,
+                )
+            )
+        return optimization_scheduler
+
+
+def process_backend():
+    return optimization_config.optimization_backend == PROCESS_BACKEND
+
+
+def submit_optimization_job(
+    optimization_id,
+    gnb_dict,
+    unwanted_bb_pairs,
+    mandatory_bb_links,
+    current_optimization,
+    reference_id=None,
+    priority=0,
 ):
-    logger.debug("Optimization service starting ...")
-    optimization_threading_helper.task_thread = threading.Thread(
-        target=build_solution.run_optimization_service,
-        args=(gnb_dict, unwanted_bb_pairs, mandatory_bb_links, current_optimization),
+    logger.debug("Optimization service queueing ...")
+    job = optimization_threading_helper.OptimizationJob(
+        optimization_id,
+        current_optimization,
+        gnb_dict,
+        unwanted_bb_pairs,
+        mandatory_bb_links,
+        reference_id,
+        priority,
+        optimization_process_context.Event() if process_backend() else None,
     )
-    try:
-        optimization_threading_helper.task_thread.start()
-    except RuntimeError:
-        logger.exception(
-            "RuntimeError: Failed to start optimization thread - already running."
-        )
+    if get_scheduler().submit(job):
+        logger.debug("Optimization service queued")
     else:
-        current_optimization.update(
-            status=ResponseStatus.OPTIMIZATION_IN_PROGRESS,
-            optimization_start_date=datetime.datetime.now(),
+        logger.error(
+            "Failed to queue optimization %s - already queued or running.",
+            optimization_id,
         )
-        logger.debug("Optimization service started")
+
+
+# Runs on a worker thread of the scheduler, or in the worker process of the job with the process backend
+def run_optimization_job(job):
+    job.document.update(
+        status=ResponseStatus.OPTIMIZATION_IN_PROGRESS,
+        optimization_start_date=datetime.datetime.now(),
+    )
+    build_solution.run_optimization_service(
+        job.bb_dict,
+        job.unwanted_bb_links,
+        job.mandatory_bb_links,
+        job.document,
+        job.reference_id,
+    )
+
+
+# Runs on a worker thread of the scheduler, the job runs in a new worker process while the thread waits for it
+def run_optimization_job_in_process(job):
+    process = optimization_process_context.Process(
+        target=run_optimization_process,
+        args=(
+            job.optimization_id,
+            job.bb_dict,
+            job.unwanted_bb_links,
+            job.mandatory_bb_links,
+            job.reference_id,
+            job.stop_event,
+        ),
+        name="optimization-{}".format(job.optimization_id),
+    )
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        logger.error(
+            "Optimization process of ID %s exited with code %s",
+            job.optimization_id,
+            process.exitcode,
+        )
+        job.document.update(status=ResponseStatus.OPTIMIZATION_UNEXPECTED_ERROR)
+    document = database_service.get_optimization_by_id(
+        job.optimization_id, "Optimization"
+    )
+    if document is not None:
+        for metrics in document.stage_metrics:
+            stage_metrics.add_to_totals(metrics)
+
+
+# Called by the scheduler before the stop event of a running job is set, so it never overwrites the confirmation
+def mark_optimization_stopping(job):
+    job.document.update(status=ResponseStatus.OPTIMIZATION_STOPPING)
+
+
+# Called by the scheduler when a stopped job has ended, the optimization may have ended before any stop checkpoint
+def confirm_optimization_stopped(job):
+    job.document.update(
+        status=ResponseStatus.OPTIMIZATION_FINISHED,
+        optimization_end_date=datetime.datetime.now(),
+    )
+
+
+# Entry point of the worker process, the optimization reads and updates its document through its own connection
+def run_optimization_process(
+    optimization_id,
+    gnb_dict,
+    unwanted_bb_pairs,
+    mandatory_bb_links,
+    reference_id,
+    stop_event,
+):
+    document = database_service.get_optimization_by_id(optimization_id, "Optimization")
+    optimization_threading_helper.run_as_current_job(
+        optimization_threading_helper.OptimizationJob(
+            optimization_id,
+            document,
+            gnb_dict,
+            unwanted_bb_pairs,
+            mandatory_bb_links,
+            reference_id,
+            stop_event=stop_event,
+        ),
+        run_optimization_job,
+    )
 
 
 def stop_optimization(optimization_id: str):
@@ -237,24 +378,27 @@ def stop_optimization(optimization_id: str):
         current_optimization = database_service.get_optimization_by_id(
             optimization_id, "Optimization"
         )
-        if (
-            current_optimization is not None
-            and optimization_id == optimization_threading_helper.task_opt_id
-        ):
-            optimization_threading_helper.task_stop_event.set()
-            while optimization_threading_helper.task_thread.is_alive():
-                time.sleep(0.1)
-            optimization_threading_helper.task_stop_event.clear()
-            response_orm = OptimizationStopPostResponseCls(
-                status=ResponseStatus.SUCCESS,
-                result=OptimizationStopPostResponseResult.OPTIMIZATION_STOP_POST_STOPPED_SUCCESS,
-            )
-            response_code = status.HTTP_200_OK
-            optimization_threading_helper.task_opt_id = "None"
-            current_optimization.update(
-                status=ResponseStatus.OPTIMIZATION_FINISHED,
-                optimization_end_date=datetime.datetime.now(),
+        if current_optimization is not None:
+            # Does not wait for a running optimization, its worker confirms the stop when the job ends
+            job_state = get_scheduler().stop(
+                optimization_id, mark_optimization_stopping
             )
+            if job_state == optimization_threading_helper.QUEUED:
+                response_orm = OptimizationStopPostResponseCls(
+                    status=ResponseStatus.SUCCESS,
+                    result=OptimizationStopPostResponseResult.OPTIMIZATION_STOP_POST_STOPPED_SUCCESS,
+                )
+                response_code = status.HTTP_200_OK
+                current_optimization.update(
+                    status=ResponseStatus.OPTIMIZATION_FINISHED,
+                    optimization_end_date=datetime.datetime.now(),
+                )
+            elif job_state == optimization_threading_helper.RUNNING:
+                response_orm = OptimizationStopPostResponseCls(
+                    status=ResponseStatus.OPTIMIZATION_STOPPING,
+                    result=OptimizationStopPostResponseResult.OPTIMIZATION_STOP_POST_STOPPING,
+                )
+                response_code = status.HTTP_202_ACCEPTED
     else:
         response_orm = OptimizationStatusGetResponseCls(
             status=ResponseStatus.OPTIMIZATION_INVALID_ID,
@@ -279,7 +423,12 @@ def get_optimization_status(optimization_id: str):
             for bb in result_links:
                 response.append(bb.as_dict())
             response_orm = OptimizationStatusGetResponseCls(
-                status=current_optimization.status, result=response
+                status=current_optimization.status,
+                result=response,
+                stage_metrics=[
+                    stage.as_dict() for stage in current_optimization.stage_metrics
+                ],
+                queue_position=get_scheduler().queue_position(optimization_id),
             )
             if (
                 response_orm.status == ResponseStatus.ERROR
@@ -6,22 +6,44 @@
 # conditions stipulated in the agreement/contract under which the
 # program(s) have been supplied.
 
+import datetime
+import hashlib
+import json
 import logging
 import threading
+import time
 
 from configs import topology_config
 from clients.connections import RestConnection
 from clients.topology import TopologyClient, TopologyType
 from clients.utils import validate_json
 from entities.topology import GNodeB
-from entities.references import reverse_engineer_fdn, ExternalId
+from entities.references import reverse_engineer_fdn, ExternalId, Fdn
+from services import database_service
 from typing import Tuple
 
-__connection = RestConnection(topology_config.hostname, topology_config.username, topology_config.password)
+# Name of the persisted catalog of the gNBs, and the longest expected duration of its refresh
+CATALOG = "gnbdu"
+CATALOG_REFRESH_LEASE_SECONDS = 3600
+
+__connection = RestConnection(topology_config.hostname, topology_config.username, topology_config.password,
+                              session_ttl=float(topology_config.session_ttl))
 __client = TopologyClient(__connection)
 __lock = threading.Lock()
 __node_catalog = dict()
 __node_local_catalog = dict()
+__list_validation = dict(sample_size=int(topology_config.validation_sample_size),
+                         sample=topology_config.validation_sample)
+# Serializes the loads of the catalog and guards its state, a background refresh only takes it to update the state
+__catalog_lock = threading.Lock()
+__catalog_state = dict(version=None, checked_at=None, refreshing=False)
+__catalog_ttl = float(topology_config.catalog_ttl)
+__catalog_check_interval = float(topology_config.catalog_check_interval)
+
+
+# Login manager of the Topology connection, for the auth metrics
+def auth_manager():
+    return __connection.auth
 
 
 def health_check() -> bool:
@@ -53,23 +75,24 @@ def get_cell(identity: int):
     return __client.get(TopologyType.NRCELL, identity)
 
 
-@validate_json("topology/gnbs.json")
+@validate_json("topology/gnbs.json", **__list_validation)
 def list_nodes(**kwargs):
     return __client.list(TopologyType.GNBDU, **kwargs)
 
 
-@validate_json("topology/nrcells.json")
+@validate_json("topology/nrcells.json", **__list_validation)
 def list_cells(**kwargs):
     return __client.list(TopologyType.NRCELL, **kwargs)
 
 
-@validate_json("topology/function-connections.json")
+@validate_json("topology/function-connections.json", **__list_validation)
 def list_function_connections(**kwargs):
     return __client.list(TopologyType.NETFUNCON, **kwargs)
 
 
 def get_node_by_name(gnb_name):
-    for gnbdu in __client.list(TopologyType.GNBDU, params={"name.lk": f"'%/{gnb_name}/%'", "fs.wirelessNFConnections": "assoc"}):
+    for gnbdu in __iter_objects(TopologyType.GNBDU,
+                                params={"name.lk": f"'%/{gnb_name}/%'", "fs.wirelessNFConnections": "assoc"}):
         node = __extract_node_data(gnbdu)
         for connection in gnbdu['wirelessNFConnections']:
             _, con_data = __extract_connection_data(connection['value'])
@@ -78,28 +101,39 @@ def get_node_by_name(gnb_name):
 
 
 def get_node_by_gnb_id(gnb_id):
-    for connection in __client.list(TopologyType.NETFUNCON,
-                                    params={"name.lk": f"'%-{gnb_id}-__'", "fs.wirelessNetFunctions": "assoc"}):
+    for connection in __iter_objects(TopologyType.NETFUNCON,
+                                     params={"name.lk": f"'%-{gnb_id}-__'", "fs.wirelessNetFunctions": "assoc"}):
         return __extract_data(connection)
 
 
 # Todo: Implement a proper topology node lookup if the link create got fixed
 # Todo: Don't forget that 3gpp allows multiple DU & CUUP for a node (ericsson not implementing this at the moment)
+# The nodes of a page are yielded as soon as the page arrives, while the next pages are fetched
 def stream_nodes():
-    for connection in __client.list(TopologyType.NETFUNCON, params={"fs.wirelessNetFunctions": "assoc"}):
+    for connection in __iter_objects(TopologyType.NETFUNCON, params={"fs.wirelessNetFunctions": "assoc"}):
         yield __extract_data(connection)
 
 
+def __iter_objects(topology_type: TopologyType, **kwargs):
+    for page in __client.iter_pages(topology_type, **kwargs):
+        yield from page
+
+
 def __extract_data(connection):
-    cgi, node = __extract_connection_data(connection)
-    for wireless in connection['wirelessNetFunctions']:
-        node |= __extract_node_data(wireless['value'])
+    cgi, node = __connection_node(connection)
     with __lock:
         __node_catalog[cgi] = node
         __node_local_catalog[cgi[2]] = node
     return GNodeB.parse_obj(node)
 
 
+def __connection_node(connection):
+    cgi, node = __extract_connection_data(connection)
+    for wireless in connection['wirelessNetFunctions']:
+        node |= __extract_node_data(wireless['value'])
+    return cgi, node
+
+
 def __extract_node_data(node):
     external_id, name = ExternalId.from_str(node['externalId']), node['name']
     function_ref = f"{external_id.type}Ref"
@@ -118,13 +152,119 @@ def __extract_connection_data(connection):
 
 def _catalog(func):
     def wrapper(*args, **kwargs):
-        if not __node_catalog:
-            tuple(stream_nodes())
+        __sync_catalog()
         with __lock:
             return func(*args, **kwargs)
     return wrapper
 
 
+# The catalog is persisted in MongoDB and shared by the replicas: a process loads it on first use and whenever
+# another process saved a new version. Only a process without a persisted catalog waits for a topology crawl,
+# a catalog older than the catalog TTL is refreshed in the background while the loaded one is used
+def __sync_catalog():
+    with __catalog_lock:
+        checked_at = __catalog_state["checked_at"]
+        if __node_catalog and checked_at is not None and time.monotonic() - checked_at < __catalog_check_interval:
+            return
+        __catalog_state["checked_at"] = time.monotonic()
+        try:
+            catalog = database_service.get_topology_catalog(CATALOG)
+            if catalog is not None and catalog.refreshed_at is not None and \
+                    catalog.version != __catalog_state["version"]:
+                __load_catalog(catalog.version)
+        except Exception as e:
+            logging.warning(f"Topology catalog could not be loaded from the database: {e}")
+            catalog = None
+        if not __node_catalog:
+            version = refresh_catalog()
+            if version is not None:
+                __catalog_state["version"] = version
+        elif catalog is not None and not __catalog_state["refreshing"] and __catalog_age(catalog) > __catalog_ttl:
+            __catalog_state["refreshing"] = True
+            threading.Thread(target=__refresh_catalog_in_background, name="topology-catalog-refresh",
+                             daemon=True).start()
+
+
+def __refresh_catalog_in_background():
+    version = None
+    try:
+        # Another process refreshing the catalog saves a new version, loaded at the next check
+        if database_service.claim_topology_catalog_refresh(CATALOG, CATALOG_REFRESH_LEASE_SECONDS):
+            try:
+                version = refresh_catalog()
+            finally:
+                # Saving the catalog ends the lease, a failed refresh releases it so another process can retry
+                if version is None:
+                    database_service.release_topology_catalog_refresh(CATALOG)
+    except Exception as e:
+        logging.warning(f"Topology catalog refresh failed: {e}")
+    finally:
+        with __catalog_lock:
+            if version is not None:
+                __catalog_state["version"] = version
+            __catalog_state["refreshing"] = False
+
+
+# Crawls the topology into a new catalog, then saves only the nodes that changed since the persisted catalog.
+# Returns the saved catalog version, None if the catalog could not be saved. The caller updates the catalog state
+def refresh_catalog():
+    node_catalog = dict()
+    for connection in __iter_objects(TopologyType.NETFUNCON, params={"fs.wirelessNetFunctions": "assoc"}):
+        cgi, node = __connection_node(connection)
+        node_catalog[cgi] = node
+    __set_catalog(node_catalog)
+    try:
+        digests = database_service.get_topology_node_digests()
+        changed_nodes = []
+        for cgi, node in node_catalog.items():
+            document = __node_document(node)
+            if digests.pop(cgi, None) != document["digest"]:
+                changed_nodes.append(document)
+        version = database_service.save_topology_catalog(CATALOG, changed_nodes, list(digests), len(node_catalog))
+        logging.info(f"Topology catalog version {version} saved, {len(changed_nodes)} nodes changed, "
+                     f"{len(digests)} nodes removed")
+        return version
+    except Exception as e:
+        logging.warning(f"Topology catalog could not be saved in the database: {e}")
+        return None
+
+
+def __load_catalog(version):
+    node_catalog = dict()
+    for document in database_service.get_topology_nodes():
+        node = {'mcc': document['mcc'], 'mnc': document['mnc'], 'gNBId': document['gnb_id'],
+                'gNBIdLength': document['gnb_id_length'], 'name': document['name'],
+                'cmHandle': document['cm_handle']}
+        node |= {ref: Fdn.from_str(fdn) for ref, fdn in document['function_refs'].items()}
+        node_catalog[(node['mcc'], node['mnc'], node['gNBId'], node['gNBIdLength'])] = node
+    __set_catalog(node_catalog)
+    __catalog_state["version"] = version
+    logging.info(f"Topology catalog version {version} loaded, {len(node_catalog)} nodes")
+
+
+# Replaces the catalog, iterations over the previous catalog are not affected
+def __set_catalog(node_catalog):
+    global __node_catalog, __node_local_catalog
+    with __lock:
+        __node_catalog = node_catalog
+        __node_local_catalog = {cgi[2]: node for cgi, node in node_catalog.items()}
+
+
+def __node_document(node):
+    document = {'mcc': node['mcc'], 'mnc': node['mnc'], 'gnb_id': node['gNBId'], 'gnb_id_length': node['gNBIdLength'],
+                'name': node['name'], 'cm_handle': node['cmHandle'],
+                'function_refs': {key: str(value) for key, value in node.items() if key.endswith('Ref')}}
+    document['digest'] = hashlib.sha1(json.dumps(document, sort_keys=True).encode()).hexdigest()
+    return document
+
+
+def __catalog_age(catalog):
+    refreshed_at = catalog.refreshed_at
+    if refreshed_at.tzinfo is None:
+        refreshed_at = refreshed_at.replace(tzinfo=datetime.timezone.utc)
+    return (datetime.datetime.now(datetime.timezone.utc) - refreshed_at).total_seconds()
+
+
 @_catalog
 def iter_catalog():
     for v in __node_catalog.values():
@@ -2,6 +2,7 @@
 #
 # Copyright Ericsson (c) 2022
 import json
+import threading
 import unittest
 from unittest.mock import patch
 
@@ -44,6 +45,25 @@ class TestApiServer(unittest.IsolatedAsyncioTestCase):
         mocked_get_optimization_status.assert_called_once_with(self.OPTIMIZATION_ID)
         self.assertEqual(self.HTTP_STATUS_400, test_response.status_code)
 
+    """
+    GIVEN GET optimization status request
+    THEN the optimization service is called off the event loop thread
+    """
+
+    async def test_get_optimize_off_event_loop(self):
+        service_threads = []
+
+        def get_optimization_status(optimization_id):
+            service_threads.append(threading.current_thread())
+            return self.dummy_status_message_result, self.HTTP_STATUS_400
+
+        with patch.object(
+            optimization_service, "get_optimization_status", get_optimization_status
+        ):
+            await api_server.get_optimize(self.OPTIMIZATION_ID, Response())
+        self.assertEqual(1, len(service_threads))
+        self.assertIsNot(threading.current_thread(), service_threads[0])
+
     """
     GIVEN POST create optimization instance request
     THEN return an optimization ID with a creation of an optimization instance
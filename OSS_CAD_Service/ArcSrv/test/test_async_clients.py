@@ -0,0 +1,147 @@
+# COPYRIGHT Ericsson 2023
+#
+# The copyright to the computer program(s) herein is the property of
+# Ericsson Inc. The programs may be used and/or copied only with written
+# permission from Ericsson Inc. or in accordance with the terms and
+# conditions stipulated in the agreement/contract under which the
+# program(s) have been supplied.
+
+import asyncio
+import json
+from unittest import IsolatedAsyncioTestCase
+
+import httpx
+from clients.cm import AsyncCmClient
+from clients.connections import AsyncRestConnection
+from clients.constants import ContentType, HttpHeader
+from clients.topology import AsyncTopologyClient, TopologyType
+from entities.references import ExternalId
+
+from . import TEST_DIR
+
+
+class TestAsyncClients(IsolatedAsyncioTestCase):
+    JSON_HEADER = {HttpHeader.CONTENT_TYPE: ContentType.JSON}
+    HOSTNAME = "localhost"
+
+    def setUp(self):
+        self.requests = []
+        self.logged_in = False
+        self.responses = {}
+
+    def handle(self, request):
+        self.requests.append(request)
+        if request.url.path == "/auth/v1/login":
+            self.logged_in = True
+            return httpx.Response(200, headers=self.JSON_HEADER, json={})
+        if not self.logged_in:
+            return httpx.Response(401)
+        return self.responses[request.url.path](request)
+
+    def connection(self, **kwargs):
+        return AsyncRestConnection(
+            self.HOSTNAME,
+            "username",
+            "password",
+            transport=httpx.MockTransport(self.handle),
+            **kwargs,
+        )
+
+    async def test_concurrent_requests_login_once(self):
+        self.responses[
+            "/oss-core-ws/rest/ctw/gnbdu/647"
+        ] = lambda request: httpx.Response(
+            200, headers=self.JSON_HEADER, json={"id": 647}
+        )
+        async with self.connection() as connection:
+            client = AsyncTopologyClient(connection)
+            results = await asyncio.gather(
+                *(client.get(TopologyType.GNBDU, 647) for _ in range(20))
+            )
+        self.assertEqual([{"id": 647}] * 20, results)
+        self.assertEqual(
+            1, sum(request.url.path == "/auth/v1/login" for request in self.requests)
+        )
+        self.assertEqual(1, connection.auth.metrics()["logins"])
+
+    async def test_proactive_refresh(self):
+        self.responses[
+            "/oss-core-ws/rest/ctw/gnbdu/647"
+        ] = lambda request: httpx.Response(
+            200, headers=self.JSON_HEADER, json={"id": 647}
+        )
+        async with self.connection(session_ttl=0) as connection:
+            client = AsyncTopologyClient(connection)
+            await client.get(TopologyType.GNBDU, 647)
+            await client.get(TopologyType.GNBDU, 647)
+        metrics = connection.auth.metrics()
+        self.assertEqual(2, metrics["logins"])
+        self.assertEqual(1, metrics["proactive_refreshes"])
+
+    async def test_retry_unavailable(self):
+        statuses = iter([503, 503, 200])
+        self.responses[
+            "/oss-core-ws/rest/ctw/gnbduTask/count"
+        ] = lambda request: httpx.Response(
+            next(statuses), headers={**self.JSON_HEADER, "Retry-After": "0"}, json=2
+        )
+        self.logged_in = True
+        async with self.connection() as connection:
+            self.assertEqual(
+                2, await AsyncTopologyClient(connection).count(TopologyType.GNBDU)
+            )
+        self.assertEqual(3, len(self.requests))
+
+    async def test_list_keyset_pages(self):
+        with open(f"{TEST_DIR}/resources/sample_gnbdu.json", "r") as f:
+            response_json = json.load(f)
+        nodes = [dict(response_json, id=identity) for identity in (3, 5, 8)]
+
+        def page(request):
+            last_id = int(request.url.params["criteria"].strip("(objectInstId > )L"))
+            return httpx.Response(
+                200,
+                headers=self.JSON_HEADER,
+                json=[node for node in nodes if node["id"] > last_id][
+                    : int(request.url.params["limit"])
+                ],
+            )
+
+        self.responses[
+            "/oss-core-ws/rest/ctw/gnbduTask/count"
+        ] = lambda request: httpx.Response(
+            200, headers=self.JSON_HEADER, json=len(nodes)
+        )
+        self.responses["/oss-core-ws/rest/ctw/gnbdu"] = page
+        async with self.connection() as connection:
+            client = AsyncTopologyClient(connection)
+            pages = [
+                page
+                async for page in client.iter_pages(TopologyType.GNBDU, page_size=2)
+            ]
+            self.assertEqual(nodes, await client.list(TopologyType.GNBDU, page_size=2))
+        self.assertEqual(
+            [[3, 5], [8]], [[node["id"] for node in page] for page in pages]
+        )
+
+    async def test_cm_list_resources(self):
+        external_id = ExternalId.from_str(
+            "16E3AB5A157DEB90C415D4638D5B4156/ericsson-enm-ComTop:ManagedElement=NR124gNodeBRadio00040/"
+            "ericsson-enm-GNBCUCP:GNBCUCPFunction=1"
+        )
+        self.responses[
+            "/ncmp/v1/ch/16E3AB5A157DEB90C415D4638D5B4156/data/ds/ncmp-datastore:passthrough-running"
+        ] = lambda request: httpx.Response(
+            200,
+            headers=self.JSON_HEADER,
+            json={
+                "ExternalGNBCUCPFunction": [
+                    {"id": "1", "attributes": {"gNBId": 208727}}
+                ]
+            },
+        )
+        async with self.connection() as connection:
+            resources = await AsyncCmClient(connection).list_resources(external_id)
+        self.assertEqual(
+            [208727], [resource.attributes["gNBId"] for resource in resources]
+        )
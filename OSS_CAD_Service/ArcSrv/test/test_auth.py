@@ -0,0 +1,91 @@
+# COPYRIGHT Ericsson 2023
+#
+# The copyright to the computer program(s) herein is the property of
+# Ericsson Inc. The programs may be used and/or copied only with written
+# permission from Ericsson Inc. or in accordance with the terms and
+# conditions stipulated in the agreement/contract under which the
+# program(s) have been supplied.
+
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+from unittest.mock import patch
+
+import requests
+import requests_mock
+from clients import auth
+from clients.auth import AuthManager
+from clients.connections import RestConnection
+from clients.constants import ContentType, HttpHeader, HttpMethod
+
+
+class TestAuthManager(TestCase):
+    JSON_HEADER = {HttpHeader.CONTENT_TYPE: ContentType.JSON}
+    HOSTNAME = "localhost"
+    LOGIN_URL = f"https://{HOSTNAME}/auth/v1/login"
+    NODE_URL = f"https://{HOSTNAME}/oss-core-ws/rest/ctw/gnbdu/647"
+
+    @requests_mock.Mocker()
+    def test_concurrent_requests_login_once(self, m):
+        logins = []
+
+        def node(request, context):
+            if not logins:
+                context.status_code = 401
+                return {}
+            return {"id": 647}
+
+        def login(request, context):
+            logins.append(request)
+            return {}
+
+        m.post(self.LOGIN_URL, json=login, headers=self.JSON_HEADER)
+        m.get(self.NODE_URL, json=node, headers=self.JSON_HEADER)
+        connection = RestConnection(self.HOSTNAME, "username", "password")
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(
+                executor.map(
+                    lambda _: connection.request_json(
+                        HttpMethod.GET, "/oss-core-ws/rest/ctw/gnbdu/647"
+                    ),
+                    range(8),
+                )
+            )
+        self.assertEqual([{"id": 647}] * 8, results)
+        self.assertEqual(
+            1, sum(request.url == self.LOGIN_URL for request in m.request_history)
+        )
+        self.assertEqual(1, connection.auth.metrics()["logins"])
+
+    def test_proactive_refresh(self):
+        logins = []
+        manager = AuthManager(
+            lambda: logins.append(1), session_ttl=3600, refresh_margin=60
+        )
+        with patch.object(auth.time, "monotonic", return_value=1000):
+            manager.refresh(manager.ensure_fresh())
+        with patch.object(auth.time, "monotonic", return_value=1000 + 3500):
+            manager.ensure_fresh()
+        self.assertEqual(1, len(logins))
+        with patch.object(auth.time, "monotonic", return_value=1000 + 3541):
+            attempts = manager.ensure_fresh()
+        self.assertEqual(2, len(logins))
+        self.assertEqual(2, attempts)
+        self.assertEqual(1, manager.metrics()["proactive_refreshes"])
+
+    def test_failed_proactive_refresh(self):
+        manager = AuthManager(lambda: None, session_ttl=0)
+        manager.refresh(manager.ensure_fresh())
+        with patch.object(manager, "_login", side_effect=requests.HTTPError("503")):
+            manager.ensure_fresh()
+            # Until a login succeeds again only rejected requests log in
+            manager.ensure_fresh()
+        metrics = manager.metrics()
+        self.assertEqual(2, metrics["logins"])
+        self.assertEqual(1, metrics["failures"])
+
+    def test_render_prometheus(self):
+        manager = AuthManager(lambda: None)
+        manager.refresh(0)
+        text = auth.render_prometheus({"cm": manager})
+        self.assertIn('arc_client_auth_logins_total{client="cm"} 1\n', text)
+        self.assertIn("# TYPE arc_client_auth_coalesced_total counter\n", text)
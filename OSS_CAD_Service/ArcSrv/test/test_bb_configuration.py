@@ -6,10 +6,17 @@
 import unittest
 from unittest.mock import patch
 
+import numpy as np
 import pandas as pd
 from entities import database_collection_models
 from entities.database_collection_models import Optimization
-from optimization import bb_configuration
+from optimization import (
+    bb_configuration,
+    capability_matrix,
+    common_functions,
+    evaluate,
+    usability_matrix,
+)
 
 
 class TestBbConfiguration(unittest.TestCase):
@@ -21,19 +28,11 @@ class TestBbConfiguration(unittest.TestCase):
             "capability": [0.133, 0.3, 0.12, 0.2, 0.34],
             "secondary_gnb": [209024, 209024, 208727, 209026, 209024],
             "usability": [0.133, 0.3, 0.12, 0.2, 0.34],
-            "gNbs": [
-                (209331, 209024),
-                (209331, 209024),
-                (209331, 208727),
-                (209335, 209026),
-                (209331, 209024),
-            ],
         }
     )
     test_unique_gnb_list = [208727, 209024, 209026, 209331, 209335]
     test_bb_link_value_list = pd.DataFrame(
         data={
-            "gNbs": [(209331, 209024), (209335, 209026), (209331, 208727)],
             "usability": [0.64, 0.2, 0.12],
             "gNb0": [209331, 209335, 209331],
             "gNb1": [209024, 209026, 208727],
@@ -54,13 +53,6 @@ class TestBbConfiguration(unittest.TestCase):
     def setUp(self):
         self.test_bb_link_value_list_expanded = pd.DataFrame(
             data={
-                "gNbs": [
-                    (209331, 209024),
-                    (209335, 209024),
-                    (209331, 208727),
-                    (209026, 209024),
-                    (209331, 209026),
-                ],
                 "usability": [0.433, 0.2, 0.12, 0.23, 0.34],
                 "gNb0": [209331, 209335, 209331, 209026, 209331],
                 "gNb1": [209024, 209024, 208727, 209024, 209026],
@@ -95,7 +87,6 @@ class TestBbConfiguration(unittest.TestCase):
                 "capability": [0.133, 0.2],
                 "secondary_gnb": [208727, 209026],
                 "usability": [0.133, 0.2],
-                "gNbs": [(209331, 208727), (209335, 209026)],
             },
             index=pd.Index(data=[2, 1]),
         )
@@ -133,7 +124,85 @@ class TestBbConfiguration(unittest.TestCase):
         pd.testing.assert_frame_equal(self.test_bb_link_value_list, action_output)
 
     """
-    GIVEN valid PS cell value list with gNbs
+    GIVEN a random usability matrix with repeated gNB pairs
+    AND limit of maximum number of external cells
+    THEN the BB link value list matches the per gNB pair groupby aggregation
+    """
+
+    def test_create_bb_link_value_list_matches_pair_groupby(self):
+        rng = np.random.default_rng(3)
+        test_usability_matrix = pd.DataFrame(
+            data={
+                "primary_gnb": rng.integers(208000, 208040, 2000),
+                "secondary_gnb": rng.integers(208000, 208040, 2000),
+                "usability": np.round(rng.random(2000), 3) * rng.integers(0, 2, 2000),
+            }
+        )
+        ps_cell_value_list = test_usability_matrix.query(
+            "usability != 0 and primary_gnb != secondary_gnb"
+        ).sort_values(["primary_gnb", "secondary_gnb", "usability"], ascending=False)
+        ps_cell_value_list = ps_cell_value_list[
+            ps_cell_value_list.groupby(["primary_gnb", "secondary_gnb"]).cumcount() < 4
+        ]
+        expected = (
+            ps_cell_value_list.groupby(["primary_gnb", "secondary_gnb"])["usability"]
+            .sum()
+            .sort_values(ascending=False, kind="stable")
+        )
+        action_output = bb_configuration.create_bb_link_value_list(
+            test_usability_matrix, 4
+        )
+        np.testing.assert_array_equal(
+            expected.index.get_level_values(0), action_output["gNb0"]
+        )
+        np.testing.assert_array_equal(
+            expected.index.get_level_values(1), action_output["gNb1"]
+        )
+        np.testing.assert_allclose(expected.values, action_output["usability"])
+        self.assertFalse(action_output["linkUsed"].any())
+
+    """
+    GIVEN random coverage data with sCells missing in the capacity data
+    THEN the fused pipeline gives the same BB link value list as the capability matrix,
+      usability matrix and create_bb_link_value_list stages
+    """
+
+    def test_create_bb_link_value_list_from_coverage_matches_stages(self):
+        rng = np.random.default_rng(5)
+        primary_gnb = rng.integers(208000, 208040, 5000)
+        secondary_gnb = rng.integers(208000, 208040, 5000)
+        test_coverage = pd.DataFrame(
+            data={
+                "pNCI": primary_gnb * 256 + 1,
+                "sNCI": secondary_gnb * 256 + rng.integers(0, 4, 5000),
+                "hitrate": common_functions.decoded_usefulness_array(
+                    rng.integers(1, 10, 5000)
+                ),
+                "primary_gnb": primary_gnb,
+                "secondary_gnb": secondary_gnb,
+            }
+        )
+        sncis = np.unique(test_coverage["sNCI"].values)[::2]
+        test_capacity = pd.DataFrame(
+            data={"sNCI": sncis, "predictedCapacity": 0.5 + rng.random(len(sncis))}
+        )
+        expected = bb_configuration.create_bb_link_value_list(
+            usability_matrix.calculate_usability_matrix(
+                capability_matrix.calculate_capability_matrix(
+                    test_coverage, test_capacity
+                ),
+                0.05,
+            ),
+            4,
+        )
+        action_output = bb_configuration.create_bb_link_value_list_from_coverage(
+            test_coverage, capability_matrix.CapacityIndex(test_capacity), 0.05, 4
+        )
+        self.assertGreater(len(action_output), 0)
+        pd.testing.assert_frame_equal(expected, action_output)
+
+    """
+    GIVEN valid BB link value list
     THEN return list of unique gNbs
     """
 
@@ -157,7 +226,6 @@ class TestBbConfiguration(unittest.TestCase):
                 "capability",
                 "secondary_gnb",
                 "usability",
-                "gNbs",
             ]
         )
         test_empty_unique_gnb_list = []
@@ -172,26 +240,40 @@ class TestBbConfiguration(unittest.TestCase):
     THEN gNb pairs are marked as linked if they fit in the limit
     """
 
-    @patch.object(bb_configuration, "get_unique_gnb_list")
-    def test_assign_bb_links(self, mocked_get_unique_gnb_list):
+    def test_assign_bb_links(self):
         test_max_bb_partners = 2
         expected_link_used = [True, True, True, False, False]
         expected_bb_link_value_list = self.test_bb_link_value_list_expanded.copy()
         expected_bb_link_value_list["linkUsed"] = expected_link_used
-        mocked_get_unique_gnb_list.return_value = [
-            208727,
-            209024,
-            209026,
-            209331,
-            209335,
-        ]
         action_output = bb_configuration.assign_bb_links(
             self.test_bb_link_value_list_expanded,
             test_max_bb_partners,
         )
-        mocked_get_unique_gnb_list.assert_called_once()
         pd.testing.assert_frame_equal(expected_bb_link_value_list, action_output)
 
+    """
+    GIVEN gNb pairs with their usability and BB partner limit
+    WHEN the b_matching solver is selected
+    THEN the used links have at least the greedy total usability
+    AND an unknown solver is rejected
+    """
+
+    def test_assign_bb_links_b_matching(self):
+        greedy_output = bb_configuration.assign_bb_links(
+            self.test_bb_link_value_list_expanded.copy(), 2
+        )
+        action_output = bb_configuration.assign_bb_links(
+            self.test_bb_link_value_list_expanded.copy(), 2, solver="b_matching"
+        )
+        self.assertGreaterEqual(
+            evaluate.calculate_arc_value(action_output),
+            evaluate.calculate_arc_value(greedy_output),
+        )
+        with self.assertRaises(ValueError):
+            bb_configuration.assign_bb_links(
+                self.test_bb_link_value_list_expanded, 2, solver="random"
+            )
+
     """
     GIVEN valid BB link value list
     THEN gNb pairs for which a link is proposed are returned
@@ -214,6 +296,25 @@ class TestBbConfiguration(unittest.TestCase):
         mocked_logger.assert_called_once()
         pd.testing.assert_frame_equal(expected_bb_link_list, action_output)
 
+    """
+    GIVEN valid BB link value list and a list of gNB pairs
+    WHEN a gNB pair contains a gNB that is not in the link list
+    THEN only the links matching a gNB pair in both directions are flagged
+    """
+
+    def test_is_link_in(self):
+        test_bb_links = [(209024, 209331), (209331, 209026), (209331, 200000)]
+        gnb_universe = bb_configuration.get_gnb_universe(
+            self.test_bb_link_value_list_expanded
+        )
+        np.testing.assert_array_equal(
+            [208727, 209024, 209026, 209331, 209335], gnb_universe
+        )
+        action_output = bb_configuration.is_link_in(
+            self.test_bb_link_value_list_expanded, test_bb_links, gnb_universe
+        )
+        np.testing.assert_array_equal([False, False, False, False, True], action_output)
+
     """
      GIVEN gNb pairs list and list of unwanted gNB pairs
      WHEN there are gNb links that exists in the unwanted gNB pairs
@@ -244,14 +345,6 @@ class TestBbConfiguration(unittest.TestCase):
     def test_add_mandatory_bb_link(self):
         expected_bb_link_list = pd.DataFrame(
             data={
-                "gNbs": [
-                    (209331, 209024),
-                    (209331, 208727),
-                    (209335, 209027),
-                    (209331, 209026),
-                    (209026, 209024),
-                    (209335, 209024),
-                ],
                 "usability": [0.433, 0.12, 0, 0.34, 0.23, 0.2],
                 "gNb0": [209331, 209331, 209335, 209331, 209026, 209335],
                 "gNb1": [209024, 208727, 209027, 209026, 209024, 209024],
@@ -263,6 +356,28 @@ class TestBbConfiguration(unittest.TestCase):
         )
         pd.testing.assert_frame_equal(expected_bb_link_list, action_output)
 
+    """
+        GIVEN empty gNb pairs list and list of mandatory gNB pairs
+        WHEN a mandatory gNB pair is given twice
+        THEN it is added once and linkUsed is set to True
+    """
+
+    def test_add_mandatory_bb_link_to_empty_list(self):
+        test_empty_bb_link_list = self.test_bb_link_value_list_expanded.iloc[:0]
+        expected_bb_link_list = pd.DataFrame(
+            data={
+                "usability": [0.0, 0.0],
+                "gNb0": [209331, 209335],
+                "gNb1": [209024, 209027],
+                "linkUsed": [True, True],
+            }
+        )
+        action_output = bb_configuration.add_mandatory_bb_links(
+            test_empty_bb_link_list,
+            [(209331, 209024), (209335, 209027), (209331, 209024)],
+        )
+        pd.testing.assert_frame_equal(expected_bb_link_list, action_output)
+
     """
             GIVEN gNb pairs result dataframe and the collection model document
             THEN the gNb pairs result will be saved in list
@@ -321,7 +436,6 @@ class TestBbConfiguration(unittest.TestCase):
     ):
         expected_result = pd.DataFrame(
             data={
-                "gNbs": [(209331, 209024), (209331, 208727), (209335, 209027)],
                 "usability": [0.433, 0.12, 0],
                 "gNb0": [209331, 209331, 209335],
                 "gNb1": [209024, 208727, 209027],
@@ -3,8 +3,9 @@
 # Copyright Ericsson (c) 2022
 import datetime
 import unittest
-from unittest.mock import patch
+from unittest.mock import ANY, patch
 
+import numpy as np
 import pandas as pd
 from entities import database_collection_models
 from entities.api_response import ResponseStatus
@@ -17,8 +18,12 @@ from optimization import (
     definitions,
     evaluate,
     get_data,
+    incremental,
+    local_search,
+    partitioning,
     usability_matrix,
-    report
+    report,
+    stage_metrics,
 )
 
 
@@ -75,9 +80,47 @@ class TestBuildSolutionRunOptimizationService(
             self.test_unwanted_bb_links,
             self.test_mandatory_bb_links,
             optimization_document,
+            None,
         )
         mocked_logger.assert_called_once()
 
+    """
+    GIVEN BB dictionary and unwanted BB pairs
+    WHEN a stop checkpoint of run_optimization raises OptimizationStopped
+    THEN the optimization is finished without an error
+    """
+
+    @patch.object(
+        build_solution,
+        "run_optimization",
+        side_effect=optimization_threading_helper.OptimizationStopped(),
+    )
+    @patch.object(database_collection_models.Optimization, "update")
+    def test_stopped(self, mocked_update, mocked_run_optimization):
+        optimization_document = Optimization(
+            status=ResponseStatus.OPTIMIZATION_IN_PROGRESS,
+            creation_date=datetime.datetime.now(),
+            target_gnbdus=[{"gnbdu_id": 20866259}, {"gnbdu_id": 20866260}],
+        )
+        job = optimization_threading_helper.OptimizationJob(
+            "a", optimization_document, self.test_bb_dict, [], []
+        )
+        job.stop_event.set()
+        optimization_threading_helper.run_as_current_job(
+            job,
+            lambda job: build_solution.run_optimization_service(
+                self.test_bb_dict,
+                self.test_unwanted_bb_links,
+                self.test_mandatory_bb_links,
+                optimization_document,
+            ),
+        )
+        mocked_update.assert_called_once()
+        self.assertEqual(
+            ResponseStatus.OPTIMIZATION_FINISHED,
+            mocked_update.call_args.kwargs["status"],
+        )
+
     """
     GIVEN BB dictionary and unwanted BB pairs
     WHEN run_optimization does not raise an exception
@@ -104,6 +147,7 @@ class TestBuildSolutionRunOptimizationService(
             self.test_unwanted_bb_links,
             self.test_mandatory_bb_links,
             optimization_document,
+            None,
         )
 
     """
@@ -222,26 +266,18 @@ class TestBuildSolutionRunOptimization(TestBuildSolutionCommon, unittest.TestCas
     test_usability_matrix = test_capability_matrix.copy()
     test_usability = test_capability.copy()
     test_usability_matrix["usability"] = test_usability
-    test_gnbs = list(zip(test_primary_gnb, test_secondary_gnb))
     test_ps_cell_value_list = test_usability_matrix.copy()
-    test_ps_cell_value_list["gNbs"] = test_gnbs
     test_gnb_0 = 2 * [208727] + [208728] + 2 * [208730]
     test_gnb_1 = [208730, 208731, 208733, 208731, 208728]
     test_filtered_gnb_0 = [208727] + [208728] + 2 * [208730]
     test_filtered_gnb_1 = [208730, 208733, 208731, 208728]
     test_gnb_0_with_mandatory_bb = [208731] + [208727] + [208728] + 2 * [208730]
     test_gnb_1_with_mandatory_bb = [208733, 208730, 208733, 208731, 208728]
-    test_gnbs_grouped = list(zip(test_gnb_0, test_gnb_1))
-    test_filtered_gnbs_grouped = list(zip(test_filtered_gnb_0, test_filtered_gnb_1))
-    test_gnbs_grouped_with_mandatory_bb = list(
-        zip(test_gnb_0_with_mandatory_bb, test_gnb_1_with_mandatory_bb)
-    )
     test_usability_1 = [0.1303, 0.0309, 0.0040, 0.0088, 0]
     test_filtered_bb_usability_1 = [0.1303, 0.0040, 0.0088, 0]
     test_bb_usability_with_mandatory_links1 = [0, 0.1303, 0.0040, 0.0088, 0]
     test_bb_link_value_list = pd.DataFrame(
         data={
-            "gNbs": test_gnbs_grouped,
             "usability": test_usability_1,
             "gNb0": test_gnb_0,
             "gNb1": test_gnb_1,
@@ -250,7 +286,6 @@ class TestBuildSolutionRunOptimization(TestBuildSolutionCommon, unittest.TestCas
     )
     test_filtered_bb_link_value_list = pd.DataFrame(
         data={
-            "gNbs": test_filtered_gnbs_grouped,
             "usability": test_filtered_bb_usability_1,
             "gNb0": test_filtered_gnb_0,
             "gNb1": test_filtered_gnb_1,
@@ -259,7 +294,6 @@ class TestBuildSolutionRunOptimization(TestBuildSolutionCommon, unittest.TestCas
     )
     test_resulted_bb_link_with_mandatory_links_list = pd.DataFrame(
         data={
-            "gNbs": test_gnbs_grouped_with_mandatory_bb,
             "usability": test_bb_usability_with_mandatory_links1,
             "gNb0": test_gnb_0_with_mandatory_bb,
             "gNb1": test_gnb_1_with_mandatory_bb,
@@ -267,7 +301,7 @@ class TestBuildSolutionRunOptimization(TestBuildSolutionCommon, unittest.TestCas
         }
     )
     test_max_external_cells_secondary_gnb = 10
-    test_unique_gnbs = [208727, 208728, 208730, 208731, 208733]
+    test_gnb_universe = np.array([208727, 208728, 208730, 208731, 208733])
     test_max_bb_partners = 6
     test_updated_bb_link_value_list = test_filtered_bb_link_value_list.copy()
     test_updated_bb_link_value_list["linkUsed"] = 4 * [True]
@@ -282,7 +316,6 @@ class TestBuildSolutionRunOptimization(TestBuildSolutionCommon, unittest.TestCas
     )
     expected_bb_link_list_with_mandatory_links = pd.DataFrame(
         data={
-            "gNbs": [(209331, 209333), (209330, 209328)],
             "usability": [0, 0],
             "gNb0": [209331, 209330],
             "gNb1": [209333, 209328],
@@ -334,6 +367,8 @@ class TestBuildSolutionRunOptimization(TestBuildSolutionCommon, unittest.TestCas
         return mock
 
     def setUp(self):
+        # The capability and usability stages are checked one by one, the fused pipeline in its own test
+        self.apply_patch(definitions, "FUSED_PIPELINE", new=False)
         self.mocked_update = self.apply_patch(
             database_collection_models.Optimization, "update"
         )
@@ -344,7 +379,7 @@ class TestBuildSolutionRunOptimization(TestBuildSolutionCommon, unittest.TestCas
             build_solution.logger, "debug"
         )  # suppress logging messages
         self.mocked_is_set = self.apply_patch(
-            optimization_threading_helper.task_stop_event, "is_set"
+            optimization_threading_helper, "stop_requested"
         )
         self.mocked_build_capability_matrix = self.apply_patch(
             capability_matrix,
@@ -366,10 +401,10 @@ class TestBuildSolutionRunOptimization(TestBuildSolutionCommon, unittest.TestCas
             "create_bb_link_value_list",
             return_value=self.test_bb_link_value_list,
         )
-        self.mocked_get_unique_gnb_list = self.apply_patch(
+        self.mocked_get_gnb_universe = self.apply_patch(
             bb_configuration,
-            "get_unique_gnb_list",
-            return_value=self.test_unique_gnbs,
+            "get_gnb_universe",
+            return_value=self.test_gnb_universe,
         )
         self.mocked_check_unwanted_bb_link = self.apply_patch(
             bb_configuration,
@@ -391,10 +426,16 @@ class TestBuildSolutionRunOptimization(TestBuildSolutionCommon, unittest.TestCas
             "assign_bb_links",
             return_value=self.test_updated_bb_link_value_list,
         )
+        self.mocked_improve_bb_links = self.apply_patch(
+            local_search,
+            "improve_bb_links",
+            side_effect=lambda bb_link_value_list, *args, **kwargs: bb_link_value_list,
+        )
         self.mocked_get_bb_link_list = self.apply_patch(
             bb_configuration, "get_bb_link_list", return_value=self.test_bb_link_list
         )
         self.mocked_save_report = self.apply_patch(report, "save_in_bucket")
+        self.mocked_save_link_values = self.apply_patch(incremental, "save_link_values")
         self.mocked_save_bb_links_result = self.apply_patch(
             bb_configuration,
             "save_bb_links_result",
@@ -473,6 +514,8 @@ class TestBuildSolutionRunOptimization(TestBuildSolutionCommon, unittest.TestCas
         self.mocked_assign_bb_links.assert_called_once_with(
             self.expected_bb_link_list_with_mandatory_links,
             self.test_max_bb_partners,
+            self.test_gnb_universe,
+            definitions.ASSIGNMENT_SOLVER,
         )
 
         self.mocked_get_bb_link_list.assert_called_once_with(
@@ -537,6 +580,8 @@ class TestBuildSolutionRunOptimization(TestBuildSolutionCommon, unittest.TestCas
         self.mocked_assign_bb_links.assert_called_once_with(
             self.expected_bb_link_list_with_mandatory_links,
             self.test_max_bb_partners,
+            self.test_gnb_universe,
+            definitions.ASSIGNMENT_SOLVER,
         )
 
         self.mocked_get_bb_link_list.assert_called_once_with(
@@ -567,7 +612,7 @@ class TestBuildSolutionRunOptimization(TestBuildSolutionCommon, unittest.TestCas
             self.test_bb_dict, self.optimization_document
         )
         self.mocked_get_predicted_capacity.assert_called_once_with(
-            self.optimization_document
+            self.test_bb_dict, self.optimization_document
         )
         self.assertEqual(2, self.mocked_is_set.call_count)
         self.assertIsNone(action_output)
@@ -590,7 +635,7 @@ class TestBuildSolutionRunOptimization(TestBuildSolutionCommon, unittest.TestCas
             self.test_bb_dict, self.optimization_document
         )
         self.mocked_get_predicted_capacity.assert_called_once_with(
-            self.optimization_document
+            self.test_bb_dict, self.optimization_document
         )
         self.mocked_build_capability_matrix.assert_called_once_with(
             self.test_clean_coverage_data,
@@ -623,7 +668,19 @@ class TestBuildSolutionRunOptimization(TestBuildSolutionCommon, unittest.TestCas
             self.optimization_document,
         )
         self.assertEqual(3, self.mocked_is_set.call_count)
-        self.assertEqual(1, self.mocked_update.call_count)
+        self.assertEqual(
+            [
+                stage_metrics.CM_COLLECTION,
+                stage_metrics.CAPABILITY,
+                stage_metrics.USABILITY,
+            ],
+            [
+                call.kwargs["push__stage_metrics"].name
+                for call in self.mocked_update.call_args_list
+                if "push__stage_metrics" in call.kwargs
+            ],
+        )
+        self.assertEqual(4, self.mocked_update.call_count)
         self.assertEqual(
             1, self.mocked_check_coverage_data_and_mandatory_links.call_count
         )
@@ -671,7 +728,7 @@ class TestBuildSolutionRunOptimization(TestBuildSolutionCommon, unittest.TestCas
             self.test_bb_dict, self.optimization_document
         )
         self.mocked_get_predicted_capacity.assert_called_once_with(
-            self.optimization_document
+            self.test_bb_dict, self.optimization_document
         )
         self.mocked_build_capability_matrix.assert_called_once_with(
             self.test_clean_coverage_data,
@@ -695,12 +752,40 @@ class TestBuildSolutionRunOptimization(TestBuildSolutionCommon, unittest.TestCas
         self.mocked_assign_bb_links.assert_called_once_with(
             self.test_resulted_bb_link_with_mandatory_links_list,
             self.test_max_bb_partners,
+            self.test_gnb_universe,
+            definitions.ASSIGNMENT_SOLVER,
+        )
+        self.mocked_improve_bb_links.assert_called_once_with(
+            self.test_updated_bb_link_value_list,
+            self.test_mandatory_bb_links,
+            self.test_max_bb_partners,
+            self.test_gnb_universe,
+            definitions.LOCAL_SEARCH_WORKERS,
+            definitions.LOCAL_SEARCH_TIME_BUDGET,
+            stage=ANY,
         )
         self.mocked_debug_logger.assert_called_once()
         self.mocked_get_bb_link_list.assert_called_once_with(
             self.test_updated_bb_link_value_list, self.test_bb_dict
         )
-        self.mocked_save_bb_links_result.assert_called_once()
+        self.mocked_get_gnb_universe.assert_called_once_with(
+            self.test_resulted_bb_link_with_mandatory_links_list
+        )
+        self.mocked_save_bb_links_result.assert_called_once_with(
+            self.test_bb_link_list,
+            self.optimization_document,
+            self.test_gnb_universe,
+        )
+        self.mocked_save_report.assert_called_once_with(
+            self.test_resulted_bb_link_with_mandatory_links_list,
+            self.test_mandatory_bb_links,
+            optimization_threading_helper.current_optimization_id(),
+            self.test_gnb_universe,
+        )
+        self.mocked_save_link_values.assert_called_once_with(
+            self.test_updated_bb_link_value_list,
+            optimization_threading_helper.current_optimization_id(),
+        )
         self.assertEqual(4, self.mocked_is_set.call_count)
         mocked_calculate_arc_value.assert_called_once_with(
             self.test_updated_bb_link_value_list
@@ -711,6 +796,187 @@ class TestBuildSolutionRunOptimization(TestBuildSolutionCommon, unittest.TestCas
             1, self.mocked_check_coverage_data_and_mandatory_links.call_count
         )
 
+    """
+    GIVEN BB dictionary and unwanted BB pairs and mandatory BB pairs
+    WHEN the fused pipeline is configured
+    THEN the BB link value list is built from the coverage data and the capacity index in one stage
+    AND the capability and usability matrices are not built
+    """
+
+    @patch.object(definitions, "FUSED_PIPELINE", True)
+    @patch.object(bb_configuration, "create_bb_link_value_list_from_coverage")
+    def test_produces_bb_link_list_with_fused_pipeline(self, mocked_create_fused):
+        self.mocked_is_set.return_value = False
+        mocked_create_fused.return_value = self.test_bb_link_value_list
+        build_solution.run_optimization(
+            self.test_bb_dict,
+            self.test_unwanted_bb_links,
+            self.test_mandatory_bb_links,
+            self.optimization_document,
+        )
+        (
+            coverage_data,
+            capacity_index,
+            capability_limit,
+            max_external_cells_secondary_gnb,
+        ) = mocked_create_fused.call_args.args
+        pd.testing.assert_frame_equal(self.test_clean_coverage_data, coverage_data)
+        self.assertIs(
+            capability_matrix.get_capacity_index(self.test_predicted_cell_capacity),
+            capacity_index,
+        )
+        self.assertEqual(self.test_capability_limit, capability_limit)
+        self.assertEqual(
+            self.test_max_external_cells_secondary_gnb,
+            max_external_cells_secondary_gnb,
+        )
+        self.mocked_build_capability_matrix.assert_not_called()
+        self.mocked_build_usability_matrix.assert_not_called()
+        self.mocked_check_unwanted_bb_link.assert_called_once_with(
+            self.test_bb_link_value_list, self.test_unwanted_bb_links
+        )
+        self.mocked_save_bb_links_result.assert_called_once()
+        self.assertEqual(2, self.mocked_is_set.call_count)
+
+    """
+    GIVEN BB dictionary and unwanted BB pairs and mandatory BB pairs
+    WHEN partition workers are configured
+    AND optimization is stopped while the partitions are optimized
+    THEN optimization exits prematurely without assigning or saving links
+    """
+
+    @patch.object(definitions, "PARTITION_WORKERS", 2)
+    @patch.object(partitioning, "build_partitioned_bb_links", return_value=None)
+    def test_stopped_while_partitioned(self, mocked_build_partitioned):
+        self.mocked_is_set.side_effect = [False, True]
+        action_output = build_solution.run_optimization(
+            self.test_bb_dict,
+            self.test_unwanted_bb_links,
+            self.test_mandatory_bb_links,
+            self.optimization_document,
+        )
+        mocked_build_partitioned.assert_called_once()
+        self.mocked_improve_bb_links.assert_not_called()
+        self.mocked_save_bb_links_result.assert_not_called()
+        self.assertEqual(2, self.mocked_is_set.call_count)
+        self.assertIsNone(action_output)
+
+    """
+    GIVEN BB dictionary and unwanted BB pairs and mandatory BB pairs
+    WHEN partition workers are configured
+    THEN the BB link list is built and assigned per network partition
+    AND the partitioned result is stored
+    """
+
+    @patch.object(definitions, "PARTITION_WORKERS", 2)
+    @patch.object(partitioning, "build_partitioned_bb_links")
+    def test_produces_partitioned_bb_link_list(self, mocked_build_partitioned):
+        self.mocked_is_set.return_value = False
+        mocked_build_partitioned.return_value = self.test_updated_bb_link_value_list
+        action_output = build_solution.run_optimization(
+            self.test_bb_dict,
+            self.test_unwanted_bb_links,
+            self.test_mandatory_bb_links,
+            self.optimization_document,
+        )
+        mocked_build_partitioned.assert_called_once_with(
+            self.test_clean_coverage_data,
+            self.test_predicted_cell_capacity,
+            self.test_unwanted_bb_links,
+            self.test_mandatory_bb_links,
+            2,
+            definitions.PARTITION_MAX_GNBS,
+            self.optimization_document,
+        )
+        self.mocked_build_capability_matrix.assert_not_called()
+        self.mocked_create_bb_link_value_list.assert_not_called()
+        self.mocked_assign_bb_links.assert_not_called()
+        self.mocked_get_gnb_universe.assert_called_once_with(
+            self.test_updated_bb_link_value_list
+        )
+        self.mocked_get_bb_link_list.assert_called_once_with(
+            self.test_updated_bb_link_value_list, self.test_bb_dict
+        )
+        self.mocked_save_bb_links_result.assert_called_once_with(
+            self.test_bb_link_list,
+            self.optimization_document,
+            self.test_gnb_universe,
+        )
+        self.assertIsNone(action_output)
+
+    """
+    GIVEN BB dictionary and unwanted BB pairs and mandatory BB pairs
+    WHEN a reference optimization with saved link values is given
+    THEN the links are assigned incrementally from the reference
+    AND the resulting BB list is stored
+    """
+
+    @patch.object(definitions, "PARTITION_WORKERS", 2)
+    @patch.object(incremental, "assign_bb_links_incremental")
+    @patch.object(incremental, "load_reference")
+    def test_produces_incremental_bb_link_list(
+        self, mocked_load_reference, mocked_assign_incremental
+    ):
+        self.mocked_is_set.return_value = False
+        test_reference = (self.test_bb_link_value_list, [], [])
+        mocked_load_reference.return_value = test_reference
+        mocked_assign_incremental.return_value = self.test_updated_bb_link_value_list
+        action_output = build_solution.run_optimization(
+            self.test_bb_dict,
+            self.test_unwanted_bb_links,
+            self.test_mandatory_bb_links,
+            self.optimization_document,
+            "6385d9f53ced2cd471234123",
+        )
+        mocked_load_reference.assert_called_once_with("6385d9f53ced2cd471234123")
+        mocked_assign_incremental.assert_called_once_with(
+            self.test_resulted_bb_link_with_mandatory_links_list,
+            test_reference,
+            self.test_unwanted_bb_links,
+            self.test_mandatory_bb_links,
+            self.test_max_bb_partners,
+            self.test_gnb_universe,
+            definitions.INCREMENTAL_NEIGHBOURHOOD_HOPS,
+            definitions.INCREMENTAL_MAX_AFFECTED_SHARE,
+            definitions.ASSIGNMENT_SOLVER,
+        )
+        self.mocked_build_capability_matrix.assert_called_once()
+        self.mocked_assign_bb_links.assert_not_called()
+        self.mocked_save_bb_links_result.assert_called_once_with(
+            self.test_bb_link_list,
+            self.optimization_document,
+            self.test_gnb_universe,
+        )
+        self.assertIsNone(action_output)
+
+    """
+    GIVEN BB dictionary and unwanted BB pairs and mandatory BB pairs
+    WHEN the reference optimization has no saved link values
+    THEN all links are assigned
+    """
+
+    @patch.object(build_solution.logger, "warning")
+    @patch.object(incremental, "load_reference", return_value=None)
+    def test_reference_without_link_values(
+        self, mocked_load_reference, mocked_warning_logger
+    ):
+        self.mocked_is_set.return_value = False
+        build_solution.run_optimization(
+            self.test_bb_dict,
+            self.test_unwanted_bb_links,
+            self.test_mandatory_bb_links,
+            self.optimization_document,
+            "6385d9f53ced2cd471234123",
+        )
+        mocked_warning_logger.assert_called_once()
+        self.mocked_assign_bb_links.assert_called_once_with(
+            self.test_resulted_bb_link_with_mandatory_links_list,
+            self.test_max_bb_partners,
+            self.test_gnb_universe,
+            definitions.ASSIGNMENT_SOLVER,
+        )
+        self.mocked_save_bb_links_result.assert_called_once()
+
 
 if __name__ == "__main__":
     unittest.main()
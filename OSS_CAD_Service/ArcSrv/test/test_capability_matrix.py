@@ -11,7 +11,7 @@ import pandas as pd
 from entities import database_collection_models
 from entities.api_response import ResponseStatus
 from entities.database_collection_models import Optimization
-from optimization import capability_matrix
+from optimization import capability_matrix, usability_matrix
 
 
 class TestCapabilityMatrix(unittest.TestCase):
@@ -68,6 +68,72 @@ class TestCapabilityMatrix(unittest.TestCase):
         mocked_update.assert_called_once()
         pd.testing.assert_frame_equal(expected_capability_matrix, action_output)
 
+    """
+    GIVEN coverage data, a capacity index and a capability limit
+    THEN usability is the capability above the limit and 0 otherwise
+    AND sCells missing in the capacity data get usability 0
+    AND the first capacity row is used for repeated sNCIs
+    """
+
+    def test_calculate_usability_matrix(self):
+        test_coverage = pd.DataFrame(
+            data={
+                "pNCI": [53588737, 53588737, 53588738, 53588738],
+                "sNCI": [53510146, 53510672, 53434115, 53434116],
+                "hitrate": [0.008, 0.5, 0.133, 0.9],
+                "primary_gnb": [209331, 209331, 209331, 209331],
+                "secondary_gnb": [209024, 209026, 208727, 208727],
+            }
+        )
+        test_capacity = pd.DataFrame(
+            data={
+                "sNCI": [53510146, 53510672, 53434115, 53510672],
+                "predictedCapacity": [0.06, 0.02, 0.10, 0.5],
+            }
+        )
+        capacity_index = capability_matrix.get_capacity_index(test_capacity)
+        self.assertIs(
+            capacity_index, capability_matrix.get_capacity_index(test_capacity)
+        )
+        action_output = capability_matrix.calculate_usability_matrix(
+            test_coverage, capacity_index, 0.005
+        )
+        np.testing.assert_allclose([0, 0.01, 0.0133, 0], action_output["usability"])
+        self.assertListEqual(
+            ["pNCI", "sNCI", "primary_gnb", "secondary_gnb", "usability"],
+            list(action_output.columns),
+        )
+
+    """
+    GIVEN a P/S cell pair with an infinite hit rate and a sCell with zero predicted capacity
+    THEN its NaN capability gets usability 0, as in the usability matrix of the capability matrix
+    """
+
+    def test_calculate_usability_matrix_nan(self):
+        test_coverage = pd.DataFrame(
+            data={
+                "pNCI": [53588737, 53588737],
+                "sNCI": [53510146, 53510672],
+                "hitrate": [np.inf, 0.5],
+                "primary_gnb": [209331, 209331],
+                "secondary_gnb": [209024, 209026],
+            }
+        )
+        test_capacity = pd.DataFrame(
+            data={"sNCI": [53510146, 53510672], "predictedCapacity": [0.0, 0.02]}
+        )
+        action_output = capability_matrix.calculate_usability_matrix(
+            test_coverage, capability_matrix.get_capacity_index(test_capacity), 0.005
+        )
+        expected = usability_matrix.calculate_usability_matrix(
+            capability_matrix.calculate_capability_matrix(test_coverage, test_capacity),
+            0.005,
+        )
+        np.testing.assert_array_equal([0, 0.01], action_output["usability"])
+        np.testing.assert_array_equal(
+            expected["usability"].values, action_output["usability"].values
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+# Test file for capacity_snapshot
+
+# Copyright Ericsson (c) 2023
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+import numpy as np
+import pandas as pd
+from optimization import capacity_snapshot
+
+
+class TestCapacitySnapshot(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.source_file = os.path.join(self.directory.name, "pm_data.csv")
+        with open(self.source_file, "w") as source_file:
+            source_file.write("sNCI,RBSymFree\n")
+        self.snapshot_directory = os.path.join(self.directory.name, "snapshot")
+        self.capacity = pd.DataFrame(
+            data={
+                "sNCI": np.array([53434885, 53435140], dtype=np.int64),
+                "secondary_gnb": np.array([208730, 208731], dtype=np.int64),
+                "predictedCapacity": [0.696, 0.909],
+            },
+            index=[3, 7],
+        )
+        self.build = MagicMock(return_value=self.capacity)
+        capacity_snapshot._snapshot = None
+
+    def tearDown(self):
+        capacity_snapshot._snapshot = None
+        self.directory.cleanup()
+
+    def get_snapshot(self):
+        return capacity_snapshot.get_snapshot(
+            [self.source_file], self.snapshot_directory, self.build, [2]
+        )
+
+    """
+    GIVEN unchanged source files
+    THEN the table is built once and returned again from the process
+    WHEN the process snapshot is cleared
+    THEN the stored columns are memory-mapped instead of building the table again
+    """
+
+    def test_snapshot_is_built_once(self):
+        action_output = self.get_snapshot()
+        self.assertIs(action_output, self.get_snapshot())
+        capacity_snapshot._snapshot = None
+        stored_output = self.get_snapshot()
+        self.build.assert_called_once()
+        self.assertIsInstance(stored_output["sNCI"].values, np.memmap)
+        pd.testing.assert_frame_equal(
+            self.capacity.reset_index(drop=True), stored_output
+        )
+
+    """
+    GIVEN a stored snapshot
+    WHEN a source file is modified
+    THEN the table is built again
+    """
+
+    def test_snapshot_is_rebuilt_on_changed_source(self):
+        self.get_snapshot()
+        stat = os.stat(self.source_file)
+        os.utime(self.source_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        capacity_snapshot._snapshot = None
+        self.get_snapshot()
+        self.assertEqual(2, self.build.call_count)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+# COPYRIGHT Ericsson 2023
+#
+# The copyright to the computer program(s) herein is the property of
+# Ericsson Inc. The programs may be used and/or copied only with written
+# permission from Ericsson Inc. or in accordance with the terms and
+# conditions stipulated in the agreement/contract under which the
+# program(s) have been supplied.
+
+import builtins
+import json
+from unittest import TestCase
+from unittest.mock import patch
+
+from clients.utils import SAMPLE_HEAD, schema_validator, validate_json
+from jsonschema import ValidationError
+
+from . import TEST_DIR
+
+
+class TestValidateJson(TestCase):
+    def setUp(self):
+        with open(f"{TEST_DIR}/resources/sample_gnbdu.json", "r") as f:
+            self.node = json.load(f)
+
+    def test_schemas_loaded_once(self):
+        list_nodes = validate_json("topology/gnbs.json")(lambda: [self.node] * 3)
+        list_nodes()
+        with patch.object(
+            builtins, "open", side_effect=AssertionError("schema read again")
+        ):
+            self.assertEqual([self.node] * 3, list_nodes())
+            self.assertIs(
+                schema_validator("topology/gnbs.json"),
+                schema_validator("topology/gnbs.json"),
+            )
+
+    def test_invalid_element(self):
+        with self.assertRaises(ValidationError):
+            validate_json("topology/gnbs.json")(lambda: [self.node, {"id": 1}])()
+
+    def test_sample(self):
+        nodes = [self.node] * 9 + [{"id": 1}]
+        # The spread sample holds every 5th element, the head sample the first 2
+        self.assertEqual(
+            nodes, validate_json("topology/gnbs.json", sample_size=2)(lambda: nodes)()
+        )
+        self.assertEqual(
+            nodes, validate_json("topology/gnbs.json", 2, SAMPLE_HEAD)(lambda: nodes)()
+        )
+        with self.assertRaises(ValidationError):
+            validate_json("topology/gnbs.json", sample_size=2)(lambda: nodes[::-1])()
@@ -4,6 +4,7 @@
 
 import unittest
 
+import numpy as np
 from optimization import common_functions
 
 
@@ -40,6 +41,49 @@ class TestCommonFunctions(unittest.TestCase):
                 )
                 self.assertEqual(action_output, expected_gnb_id[i])
 
+    """
+    GIVEN an NCI with 36 bits
+    THEN the gNb ID is extracted exactly
+    """
+
+    def test_gnb_id_from_nci_large(self):
+        test_nci = 2**36 - 1
+        action_output = common_functions.gnb_id_from_nci(test_nci, 2)
+        self.assertEqual(2**28 - 1, action_output)
+
+    """
+    GIVEN arrays of coded usefulness values and NCIs, including 36-bit NCIs
+    THEN the array versions return the same gNb IDs as the scalar versions
+    AND the same decoded usefulness up to floating point rounding
+    """
+
+    def test_array_versions_match_scalar_versions(self):
+        rng = np.random.default_rng(3)
+        test_coded_usefulness = rng.uniform(0.01, 50, 1000)
+        test_nci = np.concatenate(
+            [rng.integers(0, 2**36, 1000), [0, 2**36 - 1, 2**36 - 256]]
+        )
+        for test_digits_for_cell_id in (1, 2, 3):
+            with self.subTest(digits_for_cell_id=test_digits_for_cell_id):
+                np.testing.assert_array_equal(
+                    [
+                        common_functions.gnb_id_from_nci(nci, test_digits_for_cell_id)
+                        for nci in test_nci.tolist()
+                    ],
+                    common_functions.gnb_ids_from_ncis(
+                        test_nci, test_digits_for_cell_id
+                    ),
+                )
+        # numpy power may differ from the scalar power in the last bit
+        np.testing.assert_allclose(
+            [
+                common_functions.decoded_usefulness(coded_usefulness)
+                for coded_usefulness in test_coded_usefulness.tolist()
+            ],
+            common_functions.decoded_usefulness_array(test_coded_usefulness),
+            rtol=1e-15,
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
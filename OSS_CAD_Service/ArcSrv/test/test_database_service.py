@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+# Test file for database_service
+
+# Copyright Ericsson (c) 2023
+import datetime
+import unittest
+from unittest.mock import MagicMock, patch
+
+from entities.database_collection_models import (
+    LinkValues,
+    TopologyCatalog,
+    TopologyNodes,
+)
+from pymongo import DeleteOne, ReplaceOne
+from services import database_service
+
+
+class TestDatabaseService(unittest.TestCase):
+    """
+    GIVEN gNB IDs and a time window
+    THEN the PM capacity is aggregated per cell in the PM data collection
+    AND the compound index on gNB ID and timestamp is given as hint
+    """
+
+    @patch.object(database_service, "get_db")
+    def test_get_pm_capacity(self, mocked_get_db):
+        pm_collection = MagicMock()
+        pm_collection.aggregate.return_value = iter(
+            [{"sNCI": 53434885, "RBSymFree": 14241436336.5}]
+        )
+        mocked_get_db.return_value = {"pm_data": pm_collection}
+        end_date = datetime.datetime(2023, 3, 2, tzinfo=datetime.timezone.utc)
+        start_date = end_date - datetime.timedelta(hours=24)
+        action_output = database_service.get_pm_capacity(
+            [208730, 208731], start_date, end_date, 256
+        )
+        self.assertEqual(
+            [{"sNCI": 53434885, "RBSymFree": 14241436336.5}], action_output
+        )
+        pipeline = pm_collection.aggregate.call_args.args[0]
+        self.assertEqual(
+            {
+                "metadata.gnb_id": {"$in": [208730, 208731]},
+                "timestamp": {"$gte": start_date, "$lt": end_date},
+            },
+            pipeline[0]["$match"],
+        )
+        self.assertEqual(
+            ["$group", "$project"], [list(stage)[0] for stage in pipeline[1:]]
+        )
+        self.assertEqual(
+            database_service.PM_DATA_INDEX,
+            pm_collection.aggregate.call_args.kwargs["hint"],
+        )
+
+    """
+    GIVEN link values of more optimizations than the retention
+    THEN the link values of the oldest optimizations are deleted
+    """
+
+    @patch.object(LinkValues, "objects")
+    def test_prune_link_values(self, mocked_objects):
+        mocked_objects.distinct.return_value = [
+            "6385d9f53ced2cd471234125",
+            "6385d9f53ced2cd471234123",
+            "6385d9f53ced2cd471234124",
+        ]
+        database_service.prune_link_values(1)
+        mocked_objects.assert_called_once_with(
+            optimization_id__in=["6385d9f53ced2cd471234123", "6385d9f53ced2cd471234124"]
+        )
+        mocked_objects.return_value.delete.assert_called_once_with()
+        mocked_objects.reset_mock()
+        database_service.prune_link_values(3)
+        mocked_objects.assert_not_called()
+
+    """
+    GIVEN a changed and a removed topology node
+    THEN they are written in one unordered bulk write
+    AND the catalog version is incremented and the refresh lease ended
+    """
+
+    @patch.object(TopologyCatalog, "objects")
+    @patch.object(TopologyNodes, "_get_collection")
+    def test_save_topology_catalog(self, mocked_get_collection, mocked_objects):
+        mocked_objects.return_value.modify.return_value = MagicMock(version=4)
+        node = {"mcc": 128, "mnc": 49, "gnb_id": 208727, "gnb_id_length": 32}
+        version = database_service.save_topology_catalog(
+            "gnbdu", [node], [(128, 49, 208731, 32)], 1
+        )
+        self.assertEqual(4, version)
+        mocked_get_collection.return_value.bulk_write.assert_called_once_with(
+            [
+                ReplaceOne(node, node, upsert=True),
+                DeleteOne(
+                    {"mcc": 128, "mnc": 49, "gnb_id": 208731, "gnb_id_length": 32}
+                ),
+            ],
+            ordered=False,
+        )
+        update = mocked_objects.return_value.modify.call_args.kwargs
+        self.assertEqual(1, update["inc__version"])
+        self.assertTrue(update["unset__refresh_lease_until"])
+
+
+if __name__ == "__main__":
+    unittest.main()
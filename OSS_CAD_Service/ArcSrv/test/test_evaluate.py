@@ -19,7 +19,6 @@ class TestEvaluate(unittest.TestCase):
     def test_calculate_arc_value(self):
         test_bb_link_value_list = pd.DataFrame(
             data={
-                "gNbs": [(209331, 209024), (209335, 209026), (209331, 208727)],
                 "usability": [0.64, 0.2, 0.12],
                 "gNb0": [209331, 209335, 209331],
                 "gNb1": [209024, 209026, 208727],
@@ -1,26 +1,43 @@
 #!/usr/bin/env python
 #
 # Copyright Ericsson (c) 2022
-import json
+import datetime
+import threading
+import time
 import unittest
+from types import SimpleNamespace
 from unittest.mock import patch
 
 import numpy as np
 import pandas as pd
-import requests
+import requests_mock
+from configs import optimization_config
 from entities import database_collection_models
 from entities.api_response import ResponseStatus
 from entities.database_collection_models import Optimization
+from helper import optimization_threading_helper
 from optimization import (
+    capacity_snapshot,
     common_functions,
     definitions,
     get_data,
     predict_cell_capability,
+    stage_metrics,
 )
+from services import database_service
+
+
+def pushed_stage_names(mocked_update):
+    return [
+        call.kwargs["push__stage_metrics"].name
+        for call in mocked_update.call_args_list
+        if "push__stage_metrics" in call.kwargs
+    ]
 
 
 class TestGetData(unittest.TestCase):
     GNB_ID_LIST = '{{"gnb_id_list": {}}}'
+    NCMP_URL = "http://ncmp:8080/coverage"
     digits_for_cell_id = 2
     test_snci_get_clean_coverage_data = [53510146, 53539082, 53588736]
     test_snci = [53510146, 53539082]
@@ -53,68 +70,76 @@ class TestGetData(unittest.TestCase):
     """
     GIVEN non-empty BB dictionary
     WHEN data for some of BBs is returned from NCMP
-    THEN received data should be parsed, processed
-    AND returned as a DataFrame
+    THEN the BBs are requested in chunks
+    AND received data should be parsed, processed
+    AND returned as a DataFrame in chunk order
     """
 
-    @unittest.skip
-    @patch.object(requests, "request")
-    @patch.object(get_data.logger, "debug")
+    @patch.object(definitions, "NCMP_CHUNK_GNBS", 2)
+    @patch.object(get_data, "ncmp_config", SimpleNamespace(coverage_url=NCMP_URL))
     @patch.object(database_collection_models.Optimization, "update")
-    def test_get_raw_coverage_data_ncmp_two_gnbs_found(
-        self, mocked_update, mocked_debug_logger, mocked_request
-    ):
+    def test_get_raw_coverage_data_ncmp_two_gnbs_found(self, mocked_update):
         test_bb_dict = {
             209331: "12341",
-            209333: "12342",
             123456: "12343",
+            209333: "12342",
             234567: "12344",
         }
-        test_response = requests.Response()
         response_content = {
-            "gNBwithResult": [
-                {
-                    "gNB": 209331,
-                    "nrCells": [
-                        {
-                            "nci": 53588737,
-                            "cellUsefullness": [
-                                {"nci": 53510146, "CoverageRate": 9},
-                                {"nci": 53510672, "CoverageRate": 4},
-                            ],
-                        },
-                        {
-                            "nci": 53588738,
-                            "cellUsefullness": [
-                                {"nci": 53434115, "CoverageRate": 1},
-                                {"nci": 53434626, "CoverageRate": 1},
-                            ],
-                        },
-                    ],
-                },
-                {
-                    "gNB": 209333,
-                    "nrCells": [
-                        {
-                            "nci": 53589249,
-                            "cellUsefullness": [
-                                {"nci": 53539074, "CoverageRate": 1},
-                                {"nci": 53588993, "CoverageRate": 11},
-                            ],
-                        },
-                        {
-                            "nci": 53589250,
-                            "cellUsefullness": [
-                                {"nci": 53539073, "CoverageRate": 1},
-                                {"nci": 53539082, "CoverageRate": 1},
-                            ],
-                        },
-                    ],
-                },
-            ],
-            "gNBNotFound": [123456, 234567],
+            209331: {
+                "gNB": 209331,
+                "nrCells": [
+                    {
+                        "nci": 53588737,
+                        "cellUsefullness": [
+                            {"nci": 53510146, "CoverageRate": 9},
+                            {"nci": 53510672, "CoverageRate": 4},
+                        ],
+                    },
+                    {
+                        "nci": 53588738,
+                        "cellUsefullness": [
+                            {"nci": 53434115, "CoverageRate": 1},
+                            {"nci": 53434626, "CoverageRate": 1},
+                        ],
+                    },
+                ],
+            },
+            209333: {
+                "gNB": 209333,
+                "nrCells": [
+                    {
+                        "nci": 53589249,
+                        "cellUsefullness": [
+                            {"nci": 53539074, "CoverageRate": 1},
+                            {"nci": 53588993, "CoverageRate": 11},
+                        ],
+                    },
+                    {"nci": 53589251, "cellUsefullness": []},
+                    {
+                        "nci": 53589250,
+                        "cellUsefullness": [
+                            {"nci": 53539073, "CoverageRate": 1},
+                            {"nci": 53539082, "CoverageRate": 1},
+                        ],
+                    },
+                ],
+            },
         }
-        test_response._content = json.dumps(response_content).encode("utf-8")
+
+        def ncmp_response(request, context):
+            gnb_id_list = request.json()["gnb_id_list"]
+            return {
+                "gNBwithResult": [
+                    response_content[gnb_id]
+                    for gnb_id in gnb_id_list
+                    if gnb_id in response_content
+                ],
+                "gNBNotFound": [
+                    gnb_id for gnb_id in gnb_id_list if gnb_id not in response_content
+                ],
+            }
+
         expected_output = pd.DataFrame(
             data={
                 "pNCI": [
@@ -140,18 +165,19 @@ class TestGetData(unittest.TestCase):
                 "coded_usefulness": [9, 4, 1, 1, 1, 11, 1, 1],
             }
         )
-        mocked_request.return_value = test_response
-        action_output = get_data.get_raw_coverage_data_ncmp(
-            test_bb_dict, self.optimization_document
-        )
-        mocked_request.assert_called_once_with(
-            method="post",
-            url=definitions.NCMP_CM_URL,
-            data=self.GNB_ID_LIST.format(list(test_bb_dict)),
-        )
+        with requests_mock.Mocker() as mocker:
+            mocker.post(self.NCMP_URL, json=ncmp_response)
+            action_output = get_data.get_raw_coverage_data_ncmp(
+                test_bb_dict, self.optimization_document
+            )
+            self.assertEqual(
+                [[209331, 123456], [209333, 234567]],
+                sorted(
+                    request.json()["gnb_id_list"] for request in mocker.request_history
+                ),
+            )
         pd.testing.assert_frame_equal(expected_output, action_output)
         mocked_update.assert_called_once()
-        self.assertEqual(4, mocked_debug_logger.call_count)
 
     """
     GIVEN non-empty BB dictionary
@@ -159,59 +185,106 @@ class TestGetData(unittest.TestCase):
     THEN empty DataFrame should be returned
     """
 
-    @unittest.skip
-    @patch.object(requests, "request")
-    @patch.object(get_data.logger, "debug")
+    @patch.object(get_data, "ncmp_config", SimpleNamespace(coverage_url=NCMP_URL))
     @patch.object(database_collection_models.Optimization, "update")
-    def test_get_raw_coverage_data_ncmp_no_gnbs_found(
-        self, mocked_update, mocked_debug_logger, mocked_request
-    ):
+    def test_get_raw_coverage_data_ncmp_no_gnbs_found(self, mocked_update):
         test_bb_dict = {123456: "12341", 234567: "12342"}
-        test_response = requests.Response()
         response_content = {"gNBwithResult": [], "gNBNotFound": [123456, 234567]}
-        test_response._content = json.dumps(response_content).encode("utf-8")
-        mocked_request.return_value = test_response
-        action_output = get_data.get_raw_coverage_data_ncmp(
-            test_bb_dict, self.optimization_document
-        )
-        mocked_request.assert_called_once_with(
-            method="post",
-            url=definitions.NCMP_CM_URL,
-            data=self.GNB_ID_LIST.format(list(test_bb_dict)),
-        )
+        with requests_mock.Mocker() as mocker:
+            mocker.post(self.NCMP_URL, json=response_content)
+            action_output = get_data.get_raw_coverage_data_ncmp(
+                test_bb_dict, self.optimization_document
+            )
+            self.assertEqual(
+                self.GNB_ID_LIST.format(list(test_bb_dict)),
+                mocker.last_request.text,
+            )
         mocked_update.assert_called_once()
         pd.testing.assert_frame_equal(self.empty_raw_coverage_data, action_output)
-        self.assertEqual(4, mocked_debug_logger.call_count)
 
     """
     GIVEN empty BB dictionary
-    THEN no data to parse should be received from NCMP
+    THEN no data should be requested from NCMP
     AND empty DataFrame should be returned
     """
 
-    @unittest.skip
-    @patch.object(requests, "request")
-    @patch.object(get_data.logger, "debug")
+    @patch.object(get_data, "ncmp_config", SimpleNamespace(coverage_url=NCMP_URL))
     @patch.object(database_collection_models.Optimization, "update")
-    def test_get_raw_coverage_data_ncmp_empty_bb_list(
-        self, mocked_update, mocked_debug_logger, mocked_request
-    ):
-        test_bb_dict_empty = {}
-        test_response = requests.Response()
-        response_content = {"gNBwithResult": [], "gNBNotFound": []}
-        test_response._content = json.dumps(response_content).encode("utf-8")
-        mocked_request.return_value = test_response
-        action_output = get_data.get_raw_coverage_data_ncmp(
-            test_bb_dict_empty, self.optimization_document
-        )
-        mocked_request.assert_called_once_with(
-            method="post",
-            url=definitions.NCMP_CM_URL,
-            data=self.GNB_ID_LIST.format(list(test_bb_dict_empty)),
-        )
+    def test_get_raw_coverage_data_ncmp_empty_bb_list(self, mocked_update):
+        with requests_mock.Mocker() as mocker:
+            action_output = get_data.get_raw_coverage_data_ncmp(
+                {}, self.optimization_document
+            )
+            self.assertFalse(mocker.called)
         mocked_update.assert_called_once()
         pd.testing.assert_frame_equal(self.empty_raw_coverage_data, action_output)
-        self.assertEqual(4, mocked_debug_logger.call_count)
+
+    """
+    GIVEN non-empty BB dictionary
+    WHEN the NCMP coverage URL is not configured
+    THEN no data should be requested from NCMP
+    AND empty DataFrame should be returned
+    """
+
+    @patch.object(get_data, "ncmp_config", SimpleNamespace(coverage_url=""))
+    @patch.object(database_collection_models.Optimization, "update")
+    def test_get_raw_coverage_data_ncmp_not_configured(self, mocked_update):
+        with requests_mock.Mocker() as mocker:
+            action_output = get_data.get_raw_coverage_data_ncmp(
+                {209331: "12341"}, self.optimization_document
+            )
+            self.assertFalse(mocker.called)
+        pd.testing.assert_frame_equal(self.empty_raw_coverage_data, action_output)
+
+    """
+    GIVEN an NCMP request in flight
+    WHEN the optimization is stopped
+    THEN OptimizationStopped is raised without waiting for the response
+    """
+
+    @patch.object(get_data, "NCMP_STOP_POLL_SECONDS", 0.01)
+    @patch.object(get_data, "ncmp_config", SimpleNamespace(coverage_url=NCMP_URL))
+    @patch.object(database_collection_models.Optimization, "update")
+    def test_get_raw_coverage_data_ncmp_stopped(self, mocked_update):
+        job = optimization_threading_helper.OptimizationJob(
+            "id", self.optimization_document, {}, [], []
+        )
+        release = threading.Event()
+
+        def coverage(request, context):
+            job.stop_event.set()
+            release.wait(timeout=5)
+            return {"gNBwithResult": [], "gNBNotFound": []}
+
+        with requests_mock.Mocker() as mocker:
+            mocker.post(self.NCMP_URL, json=coverage)
+            start = time.monotonic()
+            with self.assertRaises(optimization_threading_helper.OptimizationStopped):
+                optimization_threading_helper.run_as_current_job(
+                    job,
+                    lambda job: get_data.get_raw_coverage_data_ncmp(
+                        {209331: "12341"}, job.document
+                    ),
+                )
+            self.assertLess(time.monotonic() - start, 4)
+            release.set()
+
+    """
+    GIVEN growable coverage columns with a small capacity
+    WHEN more values than the capacity are appended
+    THEN the columns grow and keep all values in append order
+    """
+
+    def test_coverage_columns_grow(self):
+        columns = get_data._CoverageColumns(capacity=2)
+        for start in range(0, 9, 3):
+            values = np.arange(start, start + 3)
+            columns.append(values, values + 100, values + 200)
+        action_output = columns.to_frame()
+        np.testing.assert_array_equal(np.arange(9), action_output["pNCI"].values)
+        np.testing.assert_array_equal(
+            np.arange(9) + 200, action_output["coded_usefulness"]
+        )
 
     """
     GIVEN raw coverage data (pNCI, sNCI, coded_usefulness)
@@ -219,26 +292,33 @@ class TestGetData(unittest.TestCase):
     AND gNb IDs are calculated from respective NCIs
     """
 
-    @patch.object(common_functions, "decoded_usefulness")
-    @patch.object(common_functions, "gnb_id_from_nci")
+    @patch.object(common_functions, "decoded_usefulness_array")
+    @patch.object(common_functions, "gnb_ids_from_ncis")
     def test_get_clean_coverage_data(
-        self, mocked_gnb_id_from_nci, mocked_decoded_usefulness
+        self, mocked_gnb_ids_from_ncis, mocked_decoded_usefulness_array
     ):
-        mocked_hit_rate = [0.05, 0.3, 0.3]
-        mocked_primary_gnb = [209331, 209332, 209332]
-        mocked_decoded_usefulness.side_effect = mocked_hit_rate
-        mocked_gnb_id_from_nci.side_effect = (
-            mocked_primary_gnb + self.mocked_secondary_gnb
-        )
+        mocked_hit_rate = np.array([0.05, 0.3, 0.3])
+        mocked_primary_gnb = np.array([209331, 209332, 209332])
+        mocked_decoded_usefulness_array.return_value = mocked_hit_rate
+        mocked_gnb_ids_from_ncis.side_effect = [
+            mocked_primary_gnb,
+            np.array(self.mocked_secondary_gnb),
+        ]
         action_output = get_data.get_clean_coverage_data(
             self.test_raw_coverage_data, self.digits_for_cell_id, self.initial_bb_list
         )
-        self.assertEqual(
-            self.test_raw_coverage_data.shape[0], mocked_decoded_usefulness.call_count
-        )
-        self.assertEqual(
-            self.test_raw_coverage_data.shape[0] * 2, mocked_gnb_id_from_nci.call_count
+        mocked_decoded_usefulness_array.assert_called_once()
+        np.testing.assert_array_equal(
+            self.test_coded_usefulness,
+            mocked_decoded_usefulness_array.call_args.args[0],
         )
+        self.assertEqual(2, mocked_gnb_ids_from_ncis.call_count)
+        for call_args, test_nci in zip(
+            mocked_gnb_ids_from_ncis.call_args_list,
+            [self.test_pnci, self.test_snci_get_clean_coverage_data],
+        ):
+            np.testing.assert_array_equal(test_nci, call_args.args[0])
+            self.assertEqual(self.digits_for_cell_id, call_args.args[1])
         self.assertListEqual(self.expected_hit_rate, action_output["hitrate"].to_list())
         self.assertListEqual(
             self.expected_primary_gnb, action_output["primary_gnb"].to_list()
@@ -253,8 +333,7 @@ class TestGetData(unittest.TestCase):
     AND gNb IDs are calculated from NCIs
     """
 
-    @patch.object(common_functions, "gnb_id_from_nci")
-    def test_get_clean_capacity_data(self, mocked_gnb_id_from_nci):
+    def test_get_clean_capacity_data(self):
         test_raw_capacity_data = pd.DataFrame(
             data={
                 "pmMacRBSymAvailDl": [20442253104, 20442253104],
@@ -263,28 +342,25 @@ class TestGetData(unittest.TestCase):
             }
         )
         expected_rb_sym_free = [1022112656, 1158394350]
-        mocked_gnb_id_from_nci.side_effect = self.expected_secondary_gnb
         action_output = get_data.get_clean_capacity_data(
             test_raw_capacity_data, self.digits_for_cell_id
         )
-        self.assertEqual(
-            test_raw_capacity_data.shape[0], mocked_gnb_id_from_nci.call_count
-        )
-        for i in range(len(self.test_snci)):
-            self.assertEqual(
-                (self.test_snci[i], self.digits_for_cell_id),
-                mocked_gnb_id_from_nci.call_args_list[i].args,
-            )
         self.assertListEqual(expected_rb_sym_free, action_output["RBSymFree"].to_list())
         self.assertListEqual(
-            self.expected_secondary_gnb, action_output["secondary_gnb"].to_list()
+            [
+                common_functions.gnb_id_from_nci(nci, self.digits_for_cell_id)
+                for nci in self.test_snci
+            ],
+            action_output["secondary_gnb"].to_list(),
         )
 
     """
         GIVEN pm capacity data (pmMacRBSymAvailDl, pmMacRBSymUsedPdschTypeA, sNCI)
         THEN clean capacity data is calculated and cell capability is predicted
+        AND the capacity snapshot is built from the PM data and model file
     """
 
+    @patch.object(capacity_snapshot, "get_snapshot")
     @patch.object(pd, "read_csv")
     @patch.object(get_data.logger, "debug")
     @patch.object(get_data.logger, "info")
@@ -299,7 +375,11 @@ class TestGetData(unittest.TestCase):
         mocked_info,
         mocked_debug,
         mocked_read_csv,
+        mocked_get_snapshot,
     ):
+        mocked_get_snapshot.side_effect = (
+            lambda source_files, directory, build, parameters: build()
+        )
         test_raw_capacity_data = pd.DataFrame(
             data={
                 "pmMacRBSymAvailDl": 5 * [20442253104],
@@ -335,10 +415,16 @@ class TestGetData(unittest.TestCase):
         mocked_read_csv.return_value = test_raw_capacity_data
         mocked_clean_capacity.return_value = test_clean_capacity_data
         mocked_add_predicted_cell_capacity.return_value = test_predicted_cell_capacity
-        action_output = get_data.get_predicted_capacity(self.optimization_document)
+        action_output = get_data.get_predicted_capacity(
+            {208730: "12341"}, self.optimization_document
+        )
         self.assertEqual(2, mocked_info.call_count)
         self.assertEqual(4, mocked_debug.call_count)
-        self.assertEqual(2, mocked_update.call_count)
+        self.assertEqual(4, mocked_update.call_count)
+        self.assertEqual(
+            [stage_metrics.PREDICTION, stage_metrics.PM_COLLECTION],
+            pushed_stage_names(mocked_update),
+        )
         mocked_read_csv.assert_called_once_with(
             definitions.PM_DATA_FILE, sep=definitions.MODEL_SEPARATOR, index_col=0
         )
@@ -350,7 +436,73 @@ class TestGetData(unittest.TestCase):
             definitions.MODEL_SEPARATOR,
             test_clean_capacity_data,
         )
-        pd.testing.assert_frame_equal(test_predicted_cell_capacity, action_output)
+        mocked_get_snapshot.assert_called_once()
+        self.assertEqual(
+            [definitions.PM_DATA_FILE, definitions.MODEL_FILENAME],
+            mocked_get_snapshot.call_args.args[0],
+        )
+        self.assertEqual(
+            optimization_config.capacity_snapshot_directory,
+            mocked_get_snapshot.call_args.args[1],
+        )
+        pd.testing.assert_frame_equal(
+            test_predicted_cell_capacity[get_data.CAPACITY_COLUMNS], action_output
+        )
+
+    """
+        GIVEN the database PM data source
+        THEN the mean capacity per cell of the gNBs in the bb dict is aggregated in the database
+        AND cell capability is predicted
+    """
+
+    @patch.object(definitions, "PM_DATA_SOURCE", "database")
+    @patch.object(database_service, "get_pm_capacity")
+    @patch.object(database_collection_models.Optimization, "update")
+    @patch.object(predict_cell_capability, "add_predicted_cell_capacity")
+    def test_get_predicted_capacity_from_database(
+        self,
+        mocked_add_predicted_cell_capacity,
+        mocked_update,
+        mocked_get_pm_capacity,
+    ):
+        mocked_get_pm_capacity.return_value = [
+            {"sNCI": 53434885, "RBSymFree": 14241436336.5},
+            {"sNCI": 53435140, "RBSymFree": 18602450325.0},
+        ]
+        mocked_add_predicted_cell_capacity.side_effect = lambda *args: args[2].assign(
+            predictedCapacity=[0.696, 0.909]
+        )
+        action_output = get_data.get_predicted_capacity(
+            {"208730": "12341", "208731": "12342"}, self.optimization_document
+        )
+        self.assertEqual(4, mocked_update.call_count)
+        self.assertEqual(
+            [stage_metrics.PM_COLLECTION, stage_metrics.PREDICTION],
+            pushed_stage_names(mocked_update),
+        )
+        (
+            gnb_ids,
+            start_date,
+            end_date,
+            cells_per_gnb,
+        ) = mocked_get_pm_capacity.call_args.args
+        self.assertEqual([208730, 208731], gnb_ids)
+        self.assertEqual(
+            datetime.timedelta(hours=definitions.PM_DATA_WINDOW_HOURS),
+            end_date - start_date,
+        )
+        self.assertEqual(16**definitions.DIGITS_FOR_CELL_ID, cells_per_gnb)
+        pd.testing.assert_frame_equal(
+            pd.DataFrame(
+                data={
+                    "sNCI": np.array([53434885, 53435140], dtype=np.int64),
+                    "RBSymFree": [14241436336.5, 18602450325.0],
+                    "secondary_gnb": np.array([208730, 208731], dtype=np.int64),
+                    "predictedCapacity": [0.696, 0.909],
+                }
+            ),
+            action_output,
+        )
 
     """
           GIVEN bb dict and the collection model document
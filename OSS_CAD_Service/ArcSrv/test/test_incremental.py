@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+
+# Test file for incremental
+
+# Copyright Ericsson (c) 2023
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+from entities.api_response import ResponseStatus
+from entities.database_collection_models import GnbduPairs, Optimization
+from optimization import bb_configuration, incremental
+from services import database_service
+
+
+class TestIncremental(unittest.TestCase):
+    @staticmethod
+    def random_bb_link_value_list(gnb_count, seed):
+        """Links between gNBs that are at most 3 gNB IDs apart, sorted by decreasing usability"""
+        rng = np.random.default_rng(seed)
+        gnb0 = 209000 + rng.integers(0, gnb_count, gnb_count * 10)
+        gnb1 = gnb0 + rng.integers(1, 4, gnb_count * 10)
+        bb_link_value_list = pd.DataFrame(
+            data={
+                "usability": rng.random(gnb_count * 10),
+                "gNb0": gnb0,
+                "gNb1": gnb1,
+                "linkUsed": False,
+            }
+        ).drop_duplicates(["gNb0", "gNb1"])
+        return bb_link_value_list.sort_values(
+            "usability", ascending=False, ignore_index=True
+        )
+
+    @staticmethod
+    def reference_of(bb_link_value_list):
+        """Reference optimization holding the full greedy assignment of the link list"""
+        bb_link_resulted_df = bb_configuration.assign_bb_links(
+            bb_link_value_list.copy(), 6
+        )
+        return bb_link_resulted_df, [], []
+
+    def assign_incremental(self, bb_link_value_list, reference, **kwargs):
+        return incremental.assign_bb_links_incremental(
+            bb_link_value_list,
+            reference,
+            kwargs.get("unwanted_bb_links", []),
+            kwargs.get("mandatory_bb_links", []),
+            6,
+            bb_configuration.get_gnb_universe(bb_link_value_list),
+            1,
+            kwargs.get("max_affected_share", 0.3),
+        )
+
+    """
+    GIVEN a link list without changes since the reference optimization
+    THEN all used links of the reference are kept
+    """
+
+    def test_unchanged_links_keep_reference(self):
+        bb_link_value_list = self.random_bb_link_value_list(300, 3)
+        reference = self.reference_of(bb_link_value_list)
+        action_output = self.assign_incremental(bb_link_value_list.copy(), reference)
+        np.testing.assert_array_equal(
+            reference[0]["linkUsed"].values, action_output["linkUsed"].values
+        )
+
+    """
+    GIVEN a link list where the usability of the links of one gNB changed
+    AND a new mandatory link
+    THEN the links away from the changed gNBs keep the reference result
+    AND the mandatory link is used
+    AND no gNB has more links than the limit in either direction
+    """
+
+    def test_changed_links_are_assigned_again(self):
+        bb_link_value_list = self.random_bb_link_value_list(300, 5)
+        reference = self.reference_of(bb_link_value_list)
+        changed = bb_link_value_list["gNb0"].values == 209100
+        bb_link_value_list.loc[changed, "usability"] = 1.5
+        bb_link_value_list.loc[0, "linkUsed"] = True
+        mandatory_bb_links = [
+            (bb_link_value_list["gNb0"][0], bb_link_value_list["gNb1"][0])
+        ]
+        action_output = self.assign_incremental(
+            bb_link_value_list.copy(),
+            reference,
+            mandatory_bb_links=mandatory_bb_links,
+        )
+        link_used = action_output["linkUsed"].values.astype(bool)
+        self.assertTrue(link_used[0])
+        gnb0 = action_output["gNb0"].values
+        far_away = (np.abs(gnb0 - 209100) > 10) & (
+            np.abs(gnb0 - mandatory_bb_links[0][0]) > 10
+        )
+        np.testing.assert_array_equal(
+            reference[0]["linkUsed"].values[far_away],
+            link_used[far_away],
+        )
+        self.assertTrue(link_used[changed].any())
+        self.assertLessEqual(action_output[link_used].groupby("gNb0").size().max(), 6)
+        self.assertLessEqual(action_output[link_used].groupby("gNb1").size().max(), 6)
+
+    """
+    GIVEN a link list where most links changed since the reference optimization
+    THEN all links are assigned again as in a full optimization
+    """
+
+    def test_many_changes_assign_all_links(self):
+        bb_link_value_list = self.random_bb_link_value_list(300, 7)
+        reference = self.reference_of(self.random_bb_link_value_list(300, 8))
+        action_output = self.assign_incremental(bb_link_value_list.copy(), reference)
+        np.testing.assert_array_equal(
+            bb_configuration.assign_bb_links(bb_link_value_list.copy(), 6)[
+                "linkUsed"
+            ].values,
+            action_output["linkUsed"].values,
+        )
+
+    """
+    GIVEN a reference optimization ID
+    WHEN the reference has saved link values
+    THEN the link values and constraints are loaded
+    WHEN the reference has no saved link values
+    THEN None is returned
+    WHEN the reference is not finished
+    THEN None is returned
+    """
+
+    @patch.object(database_service, "get_link_values")
+    @patch.object(database_service, "get_optimization_by_id")
+    def test_load_reference(self, mocked_get_optimization, mocked_get_link_values):
+        mocked_get_optimization.return_value = Optimization(
+            status=ResponseStatus.OPTIMIZATION_FINISHED,
+            restricted_links=[GnbduPairs(p_gnbdu_id=208733, s_gnbdu_id=208731)],
+            mandatory_links=[],
+        )
+        mocked_get_link_values.return_value = (
+            [208727, 208733],
+            [208731, 208731],
+            [0.5, 0.25],
+            [True, False],
+        )
+        (
+            link_values,
+            unwanted_links,
+            mandatory_links,
+        ) = incremental.load_reference("6385d9f53ced2cd471234123")
+        np.testing.assert_array_equal([208727, 208733], link_values["gNb0"].values)
+        np.testing.assert_array_equal([0.5, 0.25], link_values["usability"].values)
+        np.testing.assert_array_equal([True, False], link_values["linkUsed"].values)
+        self.assertEqual([(208733, 208731)], unwanted_links)
+        self.assertEqual([], mandatory_links)
+        mocked_get_link_values.return_value = ([], [], [], [])
+        self.assertIsNone(incremental.load_reference("6385d9f53ced2cd471234123"))
+        mocked_get_link_values.return_value = ([208727], [208731], [0.5], [True])
+        mocked_get_optimization.return_value.status = (
+            ResponseStatus.OPTIMIZATION_UNEXPECTED_ERROR
+        )
+        self.assertIsNone(incremental.load_reference("6385d9f53ced2cd471234123"))
+
+
+if __name__ == "__main__":
+    unittest.main()
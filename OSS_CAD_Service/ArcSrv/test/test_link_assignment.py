@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+
+# Test file for link_assignment
+
+# Copyright Ericsson (c) 2023
+import unittest
+
+import numpy as np
+from helper import optimization_threading_helper
+from optimization import link_assignment
+
+
+def assign_links_by_gnb_lookup(gnb0, gnb1, max_bb_partners):
+    """Reference greedy pass looking up every gNB in the sorted gNB list"""
+    gnbs = np.array(sorted(set(gnb0) | set(gnb1)))
+    links_per_gnb_to_sec = np.zeros(len(gnbs))
+    links_per_gnb_to_prim = np.zeros(len(gnbs))
+    link_used = np.full(len(gnb0), False)
+    for link in range(len(link_used)):
+        index_0 = np.where(gnbs == gnb0[link])[0]
+        index_1 = np.where(gnbs == gnb1[link])[0]
+        if (links_per_gnb_to_sec[index_0][0] < max_bb_partners) and (
+            links_per_gnb_to_prim[index_1][0] < max_bb_partners
+        ):
+            link_used[link] = True
+            links_per_gnb_to_sec[index_0] += 1
+            links_per_gnb_to_prim[index_1] += 1
+    return link_used
+
+
+class TestLinkAssignment(unittest.TestCase):
+
+    """
+    GIVEN primary and secondary gNB columns
+    THEN the gNB universe is the sorted union of both columns
+    AND every gNB is encoded with its position in the universe
+    """
+
+    def test_gnb_universe_and_codes(self):
+        gnb0 = np.array([209331, 209335, 209331])
+        gnb1 = np.array([209024, 209331, 208727])
+        gnbs = link_assignment.gnb_universe(gnb0, gnb1)
+        np.testing.assert_array_equal([208727, 209024, 209331, 209335], gnbs)
+        np.testing.assert_array_equal([2, 3, 2], link_assignment.gnb_codes(gnbs, gnb0))
+        np.testing.assert_array_equal([1, 2, 0], link_assignment.gnb_codes(gnbs, gnb1))
+
+    """
+    GIVEN gNB codes of links in decreasing usability order and a BB partner limit
+    WHEN there are more links per gNB than the limit allows
+    THEN links are marked as used in list order while they fit in the limit
+    """
+
+    def test_assign_links_greedy(self):
+        gnb0_codes = np.array([0, 2, 0, 3, 0])
+        gnb1_codes = np.array([1, 1, 4, 1, 3])
+        action_output = link_assignment.assign_links_greedy(
+            gnb0_codes, gnb1_codes, 5, 2
+        )
+        np.testing.assert_array_equal([True, True, True, False, False], action_output)
+
+    """
+    GIVEN a random link list with repeated gNBs
+    THEN the code based greedy pass marks the same links as the gNB lookup pass
+    """
+
+    def test_assign_links_greedy_matches_gnb_lookup(self):
+        rng = np.random.default_rng(7)
+        gnb0 = rng.integers(208000, 208300, 3000)
+        gnb1 = rng.integers(208000, 208300, 3000)
+        gnbs = link_assignment.gnb_universe(gnb0, gnb1)
+        action_output = link_assignment.assign_links_greedy(
+            link_assignment.gnb_codes(gnbs, gnb0),
+            link_assignment.gnb_codes(gnbs, gnb1),
+            len(gnbs),
+            6,
+        )
+        np.testing.assert_array_equal(
+            assign_links_by_gnb_lookup(gnb0, gnb1, 6), action_output
+        )
+
+    """
+    GIVEN an empty link list
+    THEN an empty link usage array is returned
+    """
+
+    def test_assign_links_greedy_empty(self):
+        gnbs = link_assignment.gnb_universe([], [])
+        action_output = link_assignment.assign_links_greedy(
+            link_assignment.gnb_codes(gnbs, []),
+            link_assignment.gnb_codes(gnbs, []),
+            len(gnbs),
+            6,
+        )
+        self.assertEqual(0, len(action_output))
+
+    """
+    GIVEN links where the best link blocks two links that are worth more together
+    WHEN the greedy result is improved as a b-matching
+    THEN the best link is swapped for the two links
+    AND a fixed link is never dropped
+    """
+
+    def test_improve_links_b_matching(self):
+        gnb0_codes = np.array([0, 0, 3])
+        gnb1_codes = np.array([1, 2, 1])
+        usability = np.array([1.0, 0.9, 0.9])
+        link_used = link_assignment.assign_links_greedy(gnb0_codes, gnb1_codes, 4, 1)
+        np.testing.assert_array_equal([True, False, False], link_used)
+        action_output = link_assignment.improve_links_b_matching(
+            gnb0_codes, gnb1_codes, usability, 4, 1, link_used
+        )
+        np.testing.assert_array_equal([False, True, True], action_output)
+        action_output = link_assignment.improve_links_b_matching(
+            gnb0_codes,
+            gnb1_codes,
+            usability,
+            4,
+            1,
+            link_used,
+            fixed=np.array([True, False, False]),
+        )
+        np.testing.assert_array_equal([True, False, False], action_output)
+
+    """
+    GIVEN a random link list with repeated gNBs and some fixed links
+    WHEN the greedy result is improved as a b-matching
+    THEN no gNB has more links than the limit in either direction
+    AND the fixed links are kept
+    AND the total usability is at least the greedy one
+    """
+
+    def test_improve_links_b_matching_is_feasible(self):
+        rng = np.random.default_rng(11)
+        gnb0_codes = rng.integers(0, 300, 3000)
+        gnb1_codes = rng.integers(0, 300, 3000)
+        usability = np.sort(rng.random(3000))[::-1]
+        link_used = link_assignment.assign_links_greedy(gnb0_codes, gnb1_codes, 300, 6)
+        fixed = link_used & (rng.random(3000) < 0.1)
+        action_output = link_assignment.improve_links_b_matching(
+            gnb0_codes, gnb1_codes, usability, 300, 6, link_used, fixed=fixed
+        )
+        self.assertLessEqual(np.bincount(gnb0_codes[action_output]).max(), 6)
+        self.assertLessEqual(np.bincount(gnb1_codes[action_output]).max(), 6)
+        self.assertTrue(action_output[fixed].all())
+        self.assertGreater(usability[action_output].sum(), usability[link_used].sum())
+
+    """
+    GIVEN a stop requested for the optimization running the assignment
+    THEN the greedy pass raises OptimizationStopped
+    AND the b-matching improvement returns the start assignment
+    """
+
+    def test_stop_requested(self):
+        gnb0_codes = np.array([0, 0, 3])
+        gnb1_codes = np.array([1, 2, 1])
+        usability = np.array([1.0, 0.9, 0.9])
+        link_used = np.array([True, False, False])
+        job = optimization_threading_helper.OptimizationJob("a", None, {}, [], [])
+        job.stop_event.set()
+
+        def run_job(job):
+            with self.assertRaises(optimization_threading_helper.OptimizationStopped):
+                link_assignment.assign_links_greedy(gnb0_codes, gnb1_codes, 4, 1)
+            action_output = link_assignment.improve_links_b_matching(
+                gnb0_codes, gnb1_codes, usability, 4, 1, link_used
+            )
+            np.testing.assert_array_equal(link_used, action_output)
+
+        optimization_threading_helper.run_as_current_job(job, run_job)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+# Test file for local_search
+
+# Copyright Ericsson (c) 2023
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+from helper import optimization_threading_helper
+from optimization import (
+    bb_configuration,
+    evaluate,
+    link_assignment,
+    local_search,
+    stage_metrics,
+)
+
+
+class TestLocalSearch(unittest.TestCase):
+    @staticmethod
+    def random_bb_link_value_list(link_count, gnb_count, seed):
+        rng = np.random.default_rng(seed)
+        bb_link_value_list = pd.DataFrame(
+            data={
+                "usability": np.sort(rng.random(link_count))[::-1],
+                "gNb0": rng.integers(0, gnb_count, link_count),
+                "gNb1": rng.integers(0, gnb_count, link_count),
+                "linkUsed": False,
+            }
+        )
+        gnb_universe = bb_configuration.get_gnb_universe(bb_link_value_list)
+        return (
+            bb_configuration.assign_bb_links(bb_link_value_list, 6, gnb_universe),
+            gnb_universe,
+        )
+
+    """
+    GIVEN a greedy BB link assignment and a mandatory link
+    WHEN the local search runs on two worker processes
+    THEN no gNB has more links than the limit in either direction
+    AND the mandatory link is kept
+    AND the total ARC value is higher than the greedy one
+    AND the gain is set on the stage measurement
+    """
+
+    @patch.object(local_search.logger, "info")
+    def test_improve_bb_links(self, mocked_logger):
+        bb_link_value_list, gnb_universe = self.random_bb_link_value_list(3000, 300, 3)
+        mandatory_link = bb_link_value_list.query("linkUsed == True").iloc[-1]
+        mandatory_bb_links = [(mandatory_link["gNb0"], mandatory_link["gNb1"])]
+        greedy_value = evaluate.calculate_arc_value(bb_link_value_list)
+        stage = stage_metrics.StageMeasurement(stage_metrics.ASSIGNMENT)
+        action_output = local_search.improve_bb_links(
+            bb_link_value_list.copy(),
+            mandatory_bb_links,
+            6,
+            gnb_universe,
+            2,
+            30,
+            stage=stage,
+        )
+        used_links = action_output.query("linkUsed == True")
+        self.assertLessEqual(used_links["gNb0"].value_counts().max(), 6)
+        self.assertLessEqual(used_links["gNb1"].value_counts().max(), 6)
+        self.assertTrue(action_output.loc[mandatory_link.name, "linkUsed"])
+        self.assertGreater(evaluate.calculate_arc_value(action_output), greedy_value)
+        self.assertAlmostEqual(
+            evaluate.calculate_arc_value(action_output) - greedy_value,
+            stage.arc_value_gain,
+        )
+        mocked_logger.assert_called_once()
+
+    """
+    GIVEN a greedy BB link assignment
+    WHEN the stop event is set while the workers are running
+    THEN the greedy assignment is returned
+    """
+
+    @patch.object(local_search.logger, "info")
+    def test_improve_bb_links_stopped(self, mocked_logger):
+        bb_link_value_list, gnb_universe = self.random_bb_link_value_list(3000, 300, 3)
+        expected_link_used = bb_link_value_list["linkUsed"].copy()
+        with patch.object(
+            optimization_threading_helper, "stop_requested", return_value=True
+        ):
+            action_output = local_search.improve_bb_links(
+                bb_link_value_list, [], 6, gnb_universe, 2, 30
+            )
+        pd.testing.assert_series_equal(expected_link_used, action_output["linkUsed"])
+        mocked_logger.assert_called_once()
+
+    """
+    GIVEN a worker holding a greedy BB link assignment
+    WHEN the shared stop event is set
+    THEN the worker returns the perturbed assignment without searching
+    """
+
+    def test_perturb_and_search_stopped(self):
+        bb_link_value_list, gnb_universe = self.random_bb_link_value_list(3000, 300, 3)
+        stop_event = local_search.worker_process_context.Event()
+        stop_event.set()
+        local_search._init_worker(
+            stop_event,
+            link_assignment.gnb_codes(gnb_universe, bb_link_value_list["gNb0"].values),
+            link_assignment.gnb_codes(gnb_universe, bb_link_value_list["gNb1"].values),
+            bb_link_value_list["usability"].values,
+            len(gnb_universe),
+            6,
+            np.zeros(len(bb_link_value_list), dtype=bool),
+        )
+        link_used = bb_link_value_list["linkUsed"].values.astype(bool)
+        action_output = local_search._perturb_and_search(link_used, 0, float("inf"))
+        self.assertLess(action_output.sum(), link_used.sum())
+        self.assertFalse((action_output & ~link_used).any())
+        self.assertIsNone(optimization_threading_helper.current_job())
+
+    """
+    GIVEN a greedy BB link assignment
+    WHEN no worker processes are configured
+    THEN the stage is skipped
+    """
+
+    @patch.object(local_search.concurrent.futures, "ProcessPoolExecutor")
+    def test_improve_bb_links_disabled(self, mocked_executor):
+        bb_link_value_list, gnb_universe = self.random_bb_link_value_list(100, 30, 3)
+        action_output = local_search.improve_bb_links(
+            bb_link_value_list, [], 6, gnb_universe, 0, 30
+        )
+        self.assertIs(bb_link_value_list, action_output)
+        mocked_executor.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,14 +5,14 @@ import datetime
 import json
 import threading
 import unittest
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
 from entities import database_collection_models
 from entities.api_response import ResponseStatus
 from entities.database_collection_models import Optimization
 from fastapi import status
 from helper import optimization_threading_helper
-from optimization import build_solution
+from optimization import build_solution, stage_metrics
 from services import database_service, optimization_service
 
 
@@ -73,8 +73,7 @@ class TestOptimizationService(unittest.TestCase):
     mock_attrs = {"start.side_effect": RuntimeError}
 
     def tearDown(self):
-        optimization_threading_helper.task_thread = threading.Thread()
-        optimization_threading_helper.task_opt_id = self.OPTIMIZATION_ID_NONE
+        optimization_service.optimization_scheduler = None
         optimization_service.configuration_instance_id_counter = 0
         optimization_service.configuration_instances_with_ids_and_data = {}
 
@@ -220,98 +219,246 @@ class TestOptimizationService(unittest.TestCase):
         self.assertEqual((test_response, test_response_code), action_output)
 
     """
-    GIVEN gNb dictionary
-    WHEN optimization thread is already running
-    THEN raise an exception
-    AND keep optimization status, message and result intact
+    GIVEN an Optimization ID and a reference Optimization ID (that does not exist)
+    THEN optimization is not started
+    AND return a message stating that the reference optimization id has not been found
+    AND return code 404 (Not Found)
     """
 
-    @patch("threading.Thread", spec=True, **mock_attrs)
-    @patch.object(optimization_service.logger, "exception")
-    @patch.object(optimization_service.logger, "debug")  # suppress logging messages
-    def test_start_optimization_thread_while_already_started(
-        self, mocked_debug_logger, mocked_exception_logger, mocked_thread
+    @patch.object(optimization_service, "submit_optimization_job")
+    @patch.object(
+        database_service,
+        "get_optimization_by_id",
+        side_effect=lambda _id, collection_name: (
+            None if _id == "6385d9f53ced2cd471234124" else Optimization()
+        ),
+    )
+    def test_start_optimization_in_case_reference_id_not_found(
+        self, mocked_get_optimization, mocked_start_thread
     ):
-        self.assertIsNone(
-            optimization_service.start_optimization_thread(
-                self.test_gnb_dict,
-                self.test_unwanted_bb_links,
-                self.test_mandatory_bb_links,
-                self.OPTIMIZATION_ID,
-            )
+        test_response = {
+            "status": self.STATUS_ERROR,
+            "result": "Reference Optimization instance ID does not exist.",
+        }
+        action_output = optimization_service.start_optimization(
+            self.OPTIMIZATION_ID, "6385d9f53ced2cd471234124"
         )
-        mocked_thread.assert_called_once_with(
-            target=build_solution.run_optimization_service,
-            args=(
-                self.test_gnb_dict,
-                self.test_unwanted_bb_links,
-                self.test_mandatory_bb_links,
-                self.OPTIMIZATION_ID,
+        self.assertEqual((test_response, status.HTTP_404_NOT_FOUND), action_output)
+        mocked_start_thread.assert_not_called()
+
+    """
+    GIVEN an Optimization ID and a reference Optimization ID (that did not finish)
+    THEN optimization is not started
+    AND return a message stating that the reference optimization is not finished
+    AND return code 409 (Conflict)
+    """
+
+    @patch.object(optimization_service, "submit_optimization_job")
+    @patch.object(
+        database_service,
+        "get_optimization_by_id",
+        return_value=Optimization(status=ResponseStatus.OPTIMIZATION_UNEXPECTED_ERROR),
+    )
+    def test_start_optimization_in_case_reference_not_finished(
+        self, mocked_get_optimization, mocked_start_thread
+    ):
+        test_response = {
+            "status": self.STATUS_ERROR,
+            "result": "Reference Optimization instance is not finished.",
+        }
+        action_output = optimization_service.start_optimization(
+            self.OPTIMIZATION_ID, "6385d9f53ced2cd471234124"
+        )
+        self.assertEqual((test_response, status.HTTP_409_CONFLICT), action_output)
+        mocked_start_thread.assert_not_called()
+
+    """
+    GIVEN an Optimization ID
+    WHEN the optimization is already queued or running
+    THEN optimization is not queued again
+    AND return code 409 (Conflict)
+    """
+
+    @patch.object(optimization_service, "submit_optimization_job")
+    @patch.object(optimization_service, "get_scheduler")
+    @patch.object(database_service, "get_optimization_by_id")
+    def test_start_optimization_while_already_active(
+        self, mocked_id, mocked_get_scheduler, mocked_submit
+    ):
+        mocked_get_scheduler.return_value.is_active.return_value = True
+        action_output = optimization_service.start_optimization(self.OPTIMIZATION_ID)
+        self.assertEqual(
+            (
+                {
+                    "status": self.STATUS_ERROR,
+                    "result": "Optimization process already started with the given optimizationID.",
+                },
+                status.HTTP_409_CONFLICT,
             ),
+            action_output,
         )
-        optimization_threading_helper.task_thread.start.assert_called_once_with()
-        mocked_exception_logger.assert_called_with(
-            "RuntimeError: Failed to start optimization thread - already running."
+        mocked_get_scheduler.return_value.is_active.assert_called_once_with(
+            self.OPTIMIZATION_ID
         )
+        mocked_submit.assert_not_called()
 
     """
     GIVEN gNb dictionary
-    THEN create and start optimization thread
+    THEN an optimization job is submitted to the scheduler
     """
 
-    @patch("threading.Thread")
+    @patch.object(optimization_service, "get_scheduler")
     @patch.object(optimization_service.logger, "debug")  # suppress logging messages
+    def test_submit_optimization_job(self, mocked_debug_logger, mocked_get_scheduler):
+        optimization_service.submit_optimization_job(
+            self.OPTIMIZATION_ID,
+            self.test_gnb_dict,
+            self.test_unwanted_bb_links,
+            self.test_mandatory_bb_links,
+            "document",
+            priority=2,
+        )
+        job = mocked_get_scheduler.return_value.submit.call_args.args[0]
+        self.assertEqual(self.OPTIMIZATION_ID, job.optimization_id)
+        self.assertEqual("document", job.document)
+        self.assertEqual(self.test_gnb_dict, job.bb_dict)
+        self.assertEqual(self.test_unwanted_bb_links, job.unwanted_bb_links)
+        self.assertEqual(self.test_mandatory_bb_links, job.mandatory_bb_links)
+        self.assertIsNone(job.reference_id)
+        self.assertEqual(2, job.priority)
+
+    """
+    GIVEN an optimization job picked by a scheduler worker
+    THEN the optimization is set in progress and run
+    """
+
+    @patch.object(build_solution, "run_optimization_service")
     @patch.object(database_collection_models.Optimization, "update")
-    def test_start_optimization_thread(
-        self, mocked_update, mocked_debug_logger, mocked_thread
-    ):
+    def test_run_optimization_job(self, mocked_update, mocked_run):
         optimization_document = Optimization(
-            status=ResponseStatus.CREATED,
+            status=ResponseStatus.OPTIMIZATION_IN_QUEUE,
             creation_date=datetime.datetime.now(),
             target_gnbdus=[{"gnbdu_id": 20866259}, {"gnbdu_id": 20866260}],
         )
-        self.assertIsNone(
-            optimization_service.start_optimization_thread(
-                self.test_gnb_dict,
-                self.test_unwanted_bb_links,
-                self.test_mandatory_bb_links,
-                optimization_document,
-            )
+        job = optimization_threading_helper.OptimizationJob(
+            self.OPTIMIZATION_ID,
+            optimization_document,
+            self.test_gnb_dict,
+            self.test_unwanted_bb_links,
+            self.test_mandatory_bb_links,
+        )
+        optimization_service.run_optimization_job(job)
+        self.assertEqual(
+            ResponseStatus.OPTIMIZATION_IN_PROGRESS,
+            mocked_update.call_args.kwargs["status"],
+        )
+        mocked_run.assert_called_once_with(
+            self.test_gnb_dict,
+            self.test_unwanted_bb_links,
+            self.test_mandatory_bb_links,
+            optimization_document,
+            None,
+        )
+
+    """
+    GIVEN an optimization job on the process backend
+    WHEN the worker process fails
+    THEN the optimization ends with an unexpected error
+    AND the stage metrics of the worker process are added to the totals of the service
+    """
+
+    @patch.object(stage_metrics, "add_to_totals")
+    @patch.object(database_service, "get_optimization_by_id")
+    @patch.object(optimization_service, "optimization_process_context")
+    @patch.object(database_collection_models.Optimization, "update")
+    def test_run_optimization_job_in_process(
+        self, mocked_update, mocked_context, mocked_id, mocked_add_to_totals
+    ):
+        mocked_context.Process.return_value.exitcode = 1
+        mocked_id.return_value = Optimization(stage_metrics=[{"name": "saving"}])
+        job = optimization_threading_helper.OptimizationJob(
+            self.OPTIMIZATION_ID,
+            Optimization(),
+            self.test_gnb_dict,
+            self.test_unwanted_bb_links,
+            self.test_mandatory_bb_links,
+            stop_event="stop_event",
         )
-        mocked_thread.assert_called_once_with(
-            target=build_solution.run_optimization_service,
-            args=(
+        optimization_service.run_optimization_job_in_process(job)
+        self.assertEqual(
+            (
+                self.OPTIMIZATION_ID,
                 self.test_gnb_dict,
                 self.test_unwanted_bb_links,
                 self.test_mandatory_bb_links,
-                optimization_document,
+                None,
+                "stop_event",
             ),
+            mocked_context.Process.call_args.kwargs["args"],
         )
-        optimization_threading_helper.task_thread.start.assert_called_once_with()
-        optimization_document.status = ResponseStatus.OPTIMIZATION_IN_PROGRESS
-        self.assertEqual(
-            optimization_document.status,
-            ResponseStatus.OPTIMIZATION_IN_PROGRESS,
+        mocked_context.Process.return_value.start.assert_called_once_with()
+        mocked_context.Process.return_value.join.assert_called_once_with()
+        mocked_update.assert_called_once_with(
+            status=ResponseStatus.OPTIMIZATION_UNEXPECTED_ERROR
+        )
+        self.assertEqual("saving", mocked_add_to_totals.call_args.args[0].name)
+
+    """
+    GIVEN the inputs of an optimization in its worker process
+    THEN the optimization document is read again
+    AND the optimization runs with the stop event of the job
+    """
+
+    @patch.object(build_solution, "run_optimization_service")
+    @patch.object(database_service, "get_optimization_by_id")
+    @patch.object(database_collection_models.Optimization, "update")
+    def test_run_optimization_process(self, mocked_update, mocked_id, mocked_run):
+        mocked_id.return_value = Optimization()
+        stop_event = threading.Event()
+        stop_event.set()
+        mocked_run.side_effect = lambda *args: self.assertTrue(
+            optimization_threading_helper.stop_requested()
         )
+        optimization_service.run_optimization_process(
+            self.OPTIMIZATION_ID,
+            self.test_gnb_dict,
+            self.test_unwanted_bb_links,
+            self.test_mandatory_bb_links,
+            None,
+            stop_event,
+        )
+        mocked_id.assert_called_once_with(self.OPTIMIZATION_ID, "Optimization")
+        mocked_run.assert_called_once_with(
+            self.test_gnb_dict,
+            self.test_unwanted_bb_links,
+            self.test_mandatory_bb_links,
+            mocked_id.return_value,
+            None,
+        )
+        self.assertFalse(optimization_threading_helper.stop_requested())
 
     """
-    GIVEN stop optimization request with a Correct Optimization ID
-    THEN stop optimization thread
+    GIVEN stop optimization request with the Optimization ID of a waiting optimization
+    THEN remove the optimization from the queue
     AND return message stating optimization has been stopped
     """
 
-    @patch("helper.optimization_threading_helper.task_thread")
-    @patch("helper.optimization_threading_helper.task_stop_event")
+    @patch.object(optimization_service, "get_scheduler")
     @patch.object(database_service, "get_optimization_by_id")
     def test_stop_optimization_with_correct_optimization_id(
-        self, mocked_id, mocked_task_stop_event, mocked_task_thread
+        self, mocked_id, mocked_get_scheduler
     ):
-        mocked_task_thread.is_alive.side_effect = 2 * [True] + [False]
-        optimization_threading_helper.task_opt_id = self.OPTIMIZATION_ID
+        mocked_get_scheduler.return_value.stop.return_value = (
+            optimization_threading_helper.QUEUED
+        )
         action_output = optimization_service.stop_optimization(self.OPTIMIZATION_ID)
-        mocked_task_stop_event.set.assert_called_once_with()
-        self.assertEqual(3, mocked_task_thread.is_alive.call_count)
-        mocked_task_stop_event.clear.assert_called_once_with()
+        mocked_get_scheduler.return_value.stop.assert_called_once_with(
+            self.OPTIMIZATION_ID, optimization_service.mark_optimization_stopping
+        )
+        self.assertEqual(
+            ResponseStatus.OPTIMIZATION_FINISHED,
+            mocked_id.return_value.update.call_args.kwargs["status"],
+        )
         self.assertEqual(
             (
                 {
@@ -323,17 +470,82 @@ class TestOptimizationService(unittest.TestCase):
             action_output,
         )
 
+    """
+    GIVEN stop optimization request with the Optimization ID of a running optimization
+    THEN signal the optimization without waiting for it
+    AND return the stopping status
+    """
+
+    @patch.object(optimization_service, "get_scheduler")
+    @patch.object(database_service, "get_optimization_by_id")
+    def test_stop_running_optimization(self, mocked_id, mocked_get_scheduler):
+        mocked_get_scheduler.return_value.stop.return_value = (
+            optimization_threading_helper.RUNNING
+        )
+        action_output = optimization_service.stop_optimization(self.OPTIMIZATION_ID)
+        mocked_id.return_value.update.assert_not_called()
+        self.assertEqual(
+            (
+                {
+                    "status": ResponseStatus.OPTIMIZATION_STOPPING,
+                    "result": "Optimization stopping, the status is finished when the optimization has stopped.",
+                },
+                status.HTTP_202_ACCEPTED,
+            ),
+            action_output,
+        )
+
+    """
+    GIVEN a running optimization that is stopped
+    THEN the stopping status is set before the stop event
+    AND the status is finished when the optimization has ended
+    """
+
+    def test_stop_running_optimization_confirmed_by_worker(self):
+        document = Mock()
+        started = threading.Event()
+        release = threading.Event()
+
+        def run_job(job):
+            started.set()
+            release.wait(10)
+
+        scheduler = optimization_threading_helper.OptimizationScheduler(
+            run_job, 1, optimization_service.confirm_optimization_stopped
+        )
+        job = optimization_threading_helper.OptimizationJob(
+            self.OPTIMIZATION_ID, document, {}, [], []
+        )
+        scheduler.submit(job)
+        self.assertTrue(started.wait(10))
+        self.assertEqual(
+            optimization_threading_helper.RUNNING,
+            scheduler.stop(
+                self.OPTIMIZATION_ID, optimization_service.mark_optimization_stopping
+            ),
+        )
+        self.assertFalse(job.done_event.is_set())
+        document.update.assert_called_once_with(
+            status=ResponseStatus.OPTIMIZATION_STOPPING
+        )
+        release.set()
+        self.assertTrue(job.done_event.wait(10))
+        self.assertEqual(
+            ResponseStatus.OPTIMIZATION_FINISHED,
+            document.update.call_args.kwargs["status"],
+        )
+
     """
     GIVEN stop optimization request with a Wrong Optimization ID
     THEN return a JSON having keys 'status' and 'result' with 'error' and 'Optimization ID not found', respectively
     """
 
-    @patch("helper.optimization_threading_helper.task_thread")
+    @patch.object(optimization_service, "get_scheduler")
     @patch.object(database_service, "get_optimization_by_id")
     def test_stop_optimization_with_wrong_optimization_id(
-        self, mocked_id, mocked_task_thread
+        self, mocked_id, mocked_get_scheduler
     ):
-        mocked_task_thread.is_alive.side_effect = 2 * [True] + [False]
+        mocked_get_scheduler.return_value.stop.return_value = None
         action_output = optimization_service.stop_optimization(self.OPTIMIZATION_ID)
         self.assertEqual(
             (
@@ -357,7 +569,12 @@ class TestOptimizationService(unittest.TestCase):
         test_result = []
         self.assertEqual(
             (
-                {"status": test_status, "result": test_result},
+                {
+                    "status": test_status,
+                    "result": test_result,
+                    "stage_metrics": [],
+                    "queue_position": None,
+                },
                 self.HTTP_STATUS_404,
             ),
             optimization_service.get_optimization_status(self.OPTIMIZATION_ID),
@@ -391,6 +608,47 @@ class TestOptimizationService(unittest.TestCase):
         )
         self.assertEqual(({"status": test_status, "result": test_result}), response)
 
+    """
+    GIVEN an optimization with measured stages
+    THEN return its status, result and stage metrics
+    """
+
+    @patch.object(database_service, "get_optimization_by_id")
+    def test_get_optimization_status_with_stage_metrics(self, mocked_id):
+        mocked_id.return_value = Optimization(
+            id=self.OPTIMIZATION_ID,
+            status=ResponseStatus.OPTIMIZATION_IN_PROGRESS,
+            creation_date=datetime.datetime.now(),
+            target_gnbdus=[{"gnbdu_id": 20866259}, {"gnbdu_id": 20866260}],
+            result_links=[],
+            stage_metrics=[
+                {
+                    "name": "cm_collection",
+                    "wall_time": 1.5,
+                    "cpu_time": 0.5,
+                    "peak_rss_delta": 1024,
+                    "rows": 8,
+                }
+            ],
+        )
+        response, response_code = optimization_service.get_optimization_status(
+            self.OPTIMIZATION_ID
+        )
+        self.assertEqual(self.HTTP_STATUS_200, response_code)
+        self.assertEqual(
+            [
+                {
+                    "name": "cm_collection",
+                    "wallTime": 1.5,
+                    "cpuTime": 0.5,
+                    "peakRssDelta": 1024,
+                    "rows": 8,
+                    "arcValueGain": None,
+                }
+            ],
+            response.dict(by_alias=True)["stageMetrics"],
+        )
+
     """
         GIVEN JSON request body
         RETURNS an ID assigned after creating an configuration instance
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+
+# Test file for optimization_threading_helper
+
+# Copyright Ericsson (c) 2023
+import threading
+import unittest
+
+from helper import optimization_threading_helper
+
+TIMEOUT_SECONDS = 10
+
+
+class TestOptimizationScheduler(unittest.TestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.started = []
+        self.started_condition = threading.Condition()
+        self.stop_seen = {}
+        self.scheduler = optimization_threading_helper.OptimizationScheduler(
+            self.run_job, 2
+        )
+
+    def tearDown(self):
+        self.release.set()
+
+    def run_job(self, job):
+        with self.started_condition:
+            self.started.append(optimization_threading_helper.current_optimization_id())
+            self.started_condition.notify_all()
+        while not self.release.wait(0.01):
+            if optimization_threading_helper.stop_requested():
+                self.stop_seen[job.optimization_id] = True
+                return
+
+    def submit(self, optimization_id, priority=0):
+        job = optimization_threading_helper.OptimizationJob(
+            optimization_id, None, {}, [], [], priority=priority
+        )
+        self.assertTrue(self.scheduler.submit(job))
+        return job
+
+    def wait_started(self, count):
+        with self.started_condition:
+            self.assertTrue(
+                self.started_condition.wait_for(
+                    lambda: len(self.started) >= count, TIMEOUT_SECONDS
+                )
+            )
+
+    """
+    GIVEN more jobs than workers
+    THEN only as many jobs as workers run
+    AND the other jobs wait in queue
+    """
+
+    def test_concurrent_jobs(self):
+        jobs = [self.submit("a"), self.submit("b"), self.submit("c")]
+        self.wait_started(2)
+        self.assertEqual(["a", "b"], sorted(self.started))
+        self.assertEqual(1, self.scheduler.queue_position("c"))
+        self.assertFalse(self.scheduler.submit(jobs[2]))
+        self.release.set()
+        for job in jobs:
+            self.assertTrue(job.done_event.wait(TIMEOUT_SECONDS))
+        self.assertEqual("c", self.started[2])
+        self.assertFalse(self.scheduler.is_active("a"))
+
+    """
+    GIVEN a running job and waiting jobs of different priorities
+    THEN the waiting jobs are queued by priority, then in submission order
+    AND run in queue order
+    """
+
+    def test_queue_order(self):
+        self.scheduler = optimization_threading_helper.OptimizationScheduler(
+            self.run_job, 1
+        )
+        self.submit("a")
+        self.wait_started(1)
+        jobs = [self.submit("b"), self.submit("c"), self.submit("d", priority=1)]
+        self.assertEqual(
+            [2, 3, 1],
+            [self.scheduler.queue_position(job.optimization_id) for job in jobs],
+        )
+        self.assertIsNone(self.scheduler.queue_position("a"))
+        self.release.set()
+        for job in jobs:
+            self.assertTrue(job.done_event.wait(TIMEOUT_SECONDS))
+        self.assertEqual(["a", "d", "b", "c"], self.started)
+
+    """
+    GIVEN a running job and a waiting job
+    WHEN both are stopped
+    THEN the waiting job never runs
+    AND the running job is signalled without waiting for it
+    AND the running job sees its own stop event and ends
+    """
+
+    def test_stop_jobs(self):
+        self.scheduler = optimization_threading_helper.OptimizationScheduler(
+            self.run_job, 1
+        )
+        running_job = self.submit("a")
+        self.wait_started(1)
+        waiting_job = self.submit("b")
+        self.assertEqual(optimization_threading_helper.QUEUED, self.scheduler.stop("b"))
+        self.assertTrue(waiting_job.done_event.is_set())
+        self.assertEqual(
+            optimization_threading_helper.RUNNING, self.scheduler.stop("a")
+        )
+        self.assertTrue(running_job.done_event.wait(TIMEOUT_SECONDS))
+        self.assertEqual({"a": True}, self.stop_seen)
+        self.assertIsNone(self.scheduler.stop("a"))
+        self.submit("c")
+        self.wait_started(2)
+        self.assertEqual(["a", "c"], self.started)
+
+    """
+    GIVEN a running job stopped twice
+    THEN the stopping callback runs once, before the stop event is set
+    AND the stopped callback runs after the job ended
+    """
+
+    def test_stop_callbacks(self):
+        events = []
+        self.scheduler = optimization_threading_helper.OptimizationScheduler(
+            self.run_job,
+            1,
+            lambda job: events.append(("stopped", job.done_event.is_set())),
+        )
+        job = self.submit("a")
+        self.wait_started(1)
+        for _ in range(2):
+            self.scheduler.stop(
+                "a", lambda job: events.append(("stopping", job.stop_event.is_set()))
+            )
+        self.assertTrue(job.done_event.wait(TIMEOUT_SECONDS))
+        self.assertEqual([("stopping", False), ("stopped", False)], events)
+
+    """
+    GIVEN a running job stopped
+    THEN the stopping callback runs without holding the scheduler lock
+    """
+
+    def test_stopping_callback_unlocked(self):
+        blocked = []
+
+        def on_stopping(job):
+            checker = threading.Thread(target=self.scheduler.is_active, args=("a",))
+            checker.start()
+            checker.join(TIMEOUT_SECONDS / 10)
+            blocked.append(checker.is_alive())
+
+        job = self.submit("a")
+        self.wait_started(1)
+        self.scheduler.stop("a", on_stopping)
+        self.assertTrue(job.done_event.wait(TIMEOUT_SECONDS))
+        self.assertEqual([False], blocked)
+
+    """
+    GIVEN a job with its stop event set
+    THEN a stop checkpoint on the thread of the job raises OptimizationStopped
+    """
+
+    def test_check_stop(self):
+        job = optimization_threading_helper.OptimizationJob("a", None, {}, [], [])
+        job.stop_event.set()
+
+        def run_job(job):
+            with self.assertRaises(optimization_threading_helper.OptimizationStopped):
+                optimization_threading_helper.check_stop()
+
+        optimization_threading_helper.run_as_current_job(job, run_job)
+        optimization_threading_helper.check_stop()
+
+    """
+    GIVEN no job running on the calling thread
+    THEN no stop is requested
+    """
+
+    def test_no_current_job(self):
+        self.assertIsNone(optimization_threading_helper.current_job())
+        self.assertEqual(
+            "None", optimization_threading_helper.current_optimization_id()
+        )
+        self.assertFalse(optimization_threading_helper.stop_requested())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+
+# Test file for partitioning
+
+# Copyright Ericsson (c) 2023
+import datetime
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+from entities import database_collection_models
+from entities.api_response import ResponseStatus
+from entities.database_collection_models import Optimization
+from helper import optimization_threading_helper
+from optimization import bb_configuration, definitions, partitioning
+
+
+class TestPartitioning(unittest.TestCase):
+    optimization_document = Optimization(
+        status=ResponseStatus.OPTIMIZATION_IN_PROGRESS,
+        creation_date=datetime.datetime.now(),
+        target_gnbdus=[{"gnbdu_id": 20866259}, {"gnbdu_id": 20866260}],
+    )
+
+    @staticmethod
+    def random_network(gnb_count, seed):
+        """Coverage between cells of gNBs that are at most 3 gNB IDs apart"""
+        rng = np.random.default_rng(seed)
+        row_count = gnb_count * 20
+        primary_gnb = 209000 + rng.integers(0, gnb_count, row_count)
+        secondary_gnb = primary_gnb + rng.integers(-3, 4, row_count)
+        p_nci = primary_gnb * 100 + rng.integers(0, 3, row_count)
+        s_nci = secondary_gnb * 100 + rng.integers(0, 3, row_count)
+        coverage_data = pd.DataFrame(
+            data={
+                "pNCI": p_nci,
+                "sNCI": s_nci,
+                "coded_usefulness": 1,
+                "hitrate": rng.random(row_count),
+                "primary_gnb": primary_gnb,
+                "secondary_gnb": secondary_gnb,
+            }
+        ).drop_duplicates(["pNCI", "sNCI"])
+        s_nci = np.unique(s_nci)
+        capacity_data = pd.DataFrame(
+            data={
+                "pmMacRBSymAvailDl": 204,
+                "pmMacRBSymUsedPdschTypeA": 191,
+                "sNCI": s_nci,
+                "RBSymFree": 13,
+                "secondary_gnb": s_nci // 100,
+                "RBSymFreeNorm": 0.06,
+                "predictedCapacity": rng.random(len(s_nci)),
+            }
+        )
+        return coverage_data, capacity_data
+
+    """
+    GIVEN links between gNB codes
+    THEN gNBs connected through any chain of links get the same component
+    AND unconnected gNBs get their own component
+    """
+
+    def test_gnb_components(self):
+        gnb0_codes = np.array([5, 1, 3, 7])
+        gnb1_codes = np.array([3, 0, 6, 1])
+        action_output = partitioning.gnb_components(gnb0_codes, gnb1_codes, 8)
+        np.testing.assert_array_equal([0, 0, 1, 2, 3, 2, 2, 0], action_output)
+
+    """
+    GIVEN a chain of 10 gNBs and three separate gNB pairs
+    WHEN partitions hold 4 gNBs
+    THEN the chain is cut in breadth-first chunks of at most 4 gNBs
+    AND the pairs are packed together into partitions
+    """
+
+    def test_partition_gnbs(self):
+        gnb0_codes = np.concatenate([np.arange(9), [10, 12, 14]])
+        gnb1_codes = np.concatenate([np.arange(1, 10), [11, 13, 15]])
+        action_output = partitioning.partition_gnbs(gnb0_codes, gnb1_codes, 16, 4)
+        np.testing.assert_array_equal(
+            [0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 3, 3, 3, 3, 4, 4], action_output
+        )
+
+    """
+    GIVEN coverage and capacity data of a network and a mandatory link
+    WHEN the network is optimized as one partition
+    THEN the same links are used as without partitioning
+    """
+
+    @patch.object(database_collection_models.Optimization, "update")
+    def test_build_partitioned_bb_links_one_partition(self, mocked_update):
+        coverage_data, capacity_data = self.random_network(60, 5)
+        mandatory_bb_links = [(209010, 209030)]
+        unwanted_bb_links = [(209020, 209021)]
+        expected_output = bb_configuration.assign_bb_links(
+            partitioning._build_bb_link_value_list(
+                coverage_data, capacity_data, unwanted_bb_links, mandatory_bb_links
+            ),
+            definitions.MAX_BB_PARTNERS,
+        )
+        action_output = partitioning.build_partitioned_bb_links(
+            coverage_data,
+            capacity_data,
+            unwanted_bb_links,
+            mandatory_bb_links,
+            2,
+            1000,
+            self.optimization_document,
+        )
+        pd.testing.assert_frame_equal(
+            expected_output.sort_values(["gNb0", "gNb1"]).reset_index(drop=True),
+            action_output.sort_values(["gNb0", "gNb1"]).reset_index(drop=True),
+        )
+        mocked_update.assert_called_once_with(
+            status=ResponseStatus.OPTIMIZATION_BUILDING_CAPABILITY
+        )
+
+    """
+    GIVEN coverage and capacity data of a network and mandatory links
+    WHEN the network is optimized in partitions of 10 gNBs
+    THEN the merged link list has the gNB pairs of the link list without partitioning, once each
+    AND no gNB has more links than the limit in either direction
+    AND the mandatory and unwanted links are respected
+    """
+
+    @patch.object(database_collection_models.Optimization, "update")
+    def test_build_partitioned_bb_links(self, mocked_update):
+        coverage_data, capacity_data = self.random_network(60, 5)
+        mandatory_bb_links = [(209010, 209030), (209011, 209012)]
+        unwanted_bb_links = [(209020, 209021)]
+        action_output = partitioning.build_partitioned_bb_links(
+            coverage_data,
+            capacity_data,
+            unwanted_bb_links,
+            mandatory_bb_links,
+            2,
+            10,
+            self.optimization_document,
+        )
+        expected_output = partitioning._build_bb_link_value_list(
+            coverage_data, capacity_data, unwanted_bb_links, mandatory_bb_links
+        )
+        expected_pairs = set(zip(expected_output["gNb0"], expected_output["gNb1"]))
+        action_pairs = list(zip(action_output["gNb0"], action_output["gNb1"]))
+        self.assertEqual(len(action_pairs), len(set(action_pairs)))
+        self.assertEqual(expected_pairs, set(action_pairs))
+        used_links = action_output.query("linkUsed == True")
+        self.assertLessEqual(
+            used_links["gNb0"].value_counts().max(), definitions.MAX_BB_PARTNERS
+        )
+        self.assertLessEqual(
+            used_links["gNb1"].value_counts().max(), definitions.MAX_BB_PARTNERS
+        )
+        self.assertTrue(
+            bb_configuration.is_link_in(used_links, mandatory_bb_links).sum() == 2
+        )
+
+    """
+    GIVEN coverage and capacity data of a network
+    WHEN the stop event is set while the partitions are optimized
+    THEN None is returned
+    """
+
+    @patch.object(optimization_threading_helper, "stop_requested")
+    @patch.object(database_collection_models.Optimization, "update")
+    def test_build_partitioned_bb_links_stopped(
+        self, mocked_update, mocked_stop_requested
+    ):
+        mocked_stop_requested.return_value = True
+        coverage_data, capacity_data = self.random_network(60, 5)
+        self.assertIsNone(
+            partitioning.build_partitioned_bb_links(
+                coverage_data, capacity_data, [], [], 2, 10, self.optimization_document
+            )
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,9 +2,12 @@
 #
 # Copyright Ericsson (c) 2022
 
+import os
+import tempfile
 import unittest
 from unittest.mock import patch
 
+import numpy as np
 import pandas as pd
 from optimization import predict_cell_capability
 from . import DIR
@@ -59,7 +62,9 @@ class TestPredictCellCapability(unittest.TestCase):
 
     def test_add_predicted_cell_capacity(self):
         action_output = predict_cell_capability.add_predicted_cell_capacity(
-            f"{DIR}/resources/modelParametersLinRegr_60.csv", ",", self.test_capacity_data
+            f"{DIR}/resources/modelParametersLinRegr_60.csv",
+            ",",
+            self.test_capacity_data,
         )
         self.assertAlmostEqual(
             5.53182107087134196697018433254e-5,
@@ -77,6 +82,45 @@ class TestPredictCellCapability(unittest.TestCase):
             delta=4.8e-11,
         )
 
+        self.assertNotIn("RBSymFreeNorm", action_output.columns)
+        self.assertNotIn("predictedCapacity", self.test_capacity_data.columns)
+
+    """
+    GIVEN a model file with coefficients for two feature columns
+    THEN both feature columns are normalized and weighted in the prediction
+    AND the model is read again only after the file changed
+    """
+
+    def test_predictor_with_several_features(self):
+        with tempfile.TemporaryDirectory() as directory:
+            model_file_name = os.path.join(directory, "model.csv")
+            with open(model_file_name, "w") as model_file:
+                model_file.write(
+                    "indices,intercept,RBSymFree,col1,col3\n"
+                    "coefficients,0.5,2.0,,1.0\n"
+                    "normalizeConstants,,100.0,10.0,200.0\n"
+                )
+            predictor = predict_cell_capability.get_predictor(model_file_name, ",")
+            self.assertListEqual(["RBSymFree", "col3"], predictor.feature_columns)
+            np.testing.assert_allclose(
+                [
+                    0.5 + 2.0 * 0.43 + 0.21,
+                    0.5 + 2.0 * 0.23 + 0.17,
+                    0.5 + 2.0 * 0.56 + 0.28,
+                ],
+                predictor.predict_frame(self.test_capacity_data),
+            )
+            self.assertIs(
+                predictor,
+                predict_cell_capability.get_predictor(model_file_name, ","),
+            )
+            with open(model_file_name, "a") as model_file:
+                model_file.write("\n")
+            self.assertIsNot(
+                predictor,
+                predict_cell_capability.get_predictor(model_file_name, ","),
+            )
+
 
 if __name__ == "__main__":
     unittest.main()
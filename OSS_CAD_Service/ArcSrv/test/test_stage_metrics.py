@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+# Test file for stage_metrics
+
+# Copyright Ericsson (c) 2023
+import unittest
+from unittest.mock import MagicMock, patch
+
+from entities.database_collection_models import StageMetrics
+from optimization import stage_metrics
+
+
+class TestStageMetrics(unittest.TestCase):
+    def setUp(self):
+        self.document = MagicMock()
+        patcher = patch.object(stage_metrics, "_totals", {})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    """
+    GIVEN a measured stage with its row count
+    THEN its measurement is appended to the stage metrics of the document
+    """
+
+    def test_measure_stage(self):
+        with stage_metrics.measure_stage(
+            self.document, stage_metrics.CM_COLLECTION
+        ) as stage:
+            stage.rows = 12
+        self.document.update.assert_called_once()
+        metrics = self.document.update.call_args.kwargs["push__stage_metrics"]
+        self.assertIsInstance(metrics, StageMetrics)
+        self.assertEqual(stage_metrics.CM_COLLECTION, metrics.name)
+        self.assertEqual(12, metrics.rows)
+        self.assertGreaterEqual(metrics.wall_time, 0)
+        self.assertGreaterEqual(metrics.cpu_time, 0)
+        self.assertGreaterEqual(metrics.peak_rss_delta, 0)
+
+    """
+    GIVEN a stage raising an exception
+    THEN the exception is raised again
+    AND the stage is measured without row count
+    """
+
+    def test_measure_failed_stage(self):
+        with self.assertRaises(ZeroDivisionError):
+            with stage_metrics.measure_stage(self.document, stage_metrics.SAVING):
+                1 / 0
+        metrics = self.document.update.call_args.kwargs["push__stage_metrics"]
+        self.assertEqual(stage_metrics.SAVING, metrics.name)
+        self.assertIsNone(metrics.rows)
+
+    """
+    GIVEN two runs of a stage
+    THEN the Prometheus text has the summed runs and rows of the stage
+    """
+
+    def test_render_prometheus(self):
+        for rows in [3, 4]:
+            with stage_metrics.measure_stage(
+                self.document, stage_metrics.ASSIGNMENT
+            ) as stage:
+                stage.rows = rows
+        action_output = stage_metrics.render_prometheus().splitlines()
+        self.assertIn("# TYPE arc_optimization_stage_runs_total counter", action_output)
+        self.assertIn(
+            'arc_optimization_stage_runs_total{stage="assignment"} 2', action_output
+        )
+        self.assertIn(
+            'arc_optimization_stage_rows_total{stage="assignment"} 7', action_output
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,13 +6,22 @@
 # conditions stipulated in the agreement/contract under which the
 # program(s) have been supplied.
 
+import datetime
 import json
+import re
+import threading
 import requests_mock
 
+from types import SimpleNamespace
 from unittest import TestCase
+from unittest.mock import patch
+from clients.connections import RestConnection
 from clients.constants import ContentType, HttpHeader
+from clients.topology import TopologyClient, TopologyType
 
-from services import topology_service
+from entities.references import Fdn
+from mongoengine import OperationError
+from services import database_service, topology_service
 from . import TEST_DIR
 
 
@@ -23,9 +32,14 @@ class TestTopologyService(TestCase):
     HOSTNAME = "localhost"
     COUNT_URL = f'https://{HOSTNAME}/oss-core-ws/rest/ctw/gnbduTask/count'
     NODE_URL = f'https://{HOSTNAME}/oss-core-ws/rest/ctw/gnbdu'
+    CONNECTION_URL = f'https://{HOSTNAME}/oss-core-ws/rest/ctw/netfunctioncon'
+    GLOBAL_ID = (128, 49, 208727, 32)
+    FDN = "SubNetwork=Europe,SubNetwork=Ireland,MeContext=NR124gNodeBRadio00040," \
+          "ManagedElement=NR124gNodeBRadio00040,GNBDUFunction=1"
 
     def setUp(self):
         self.service = topology_service
+        self.client = TopologyClient(RestConnection(self.HOSTNAME, "username", "password"))
 
     def test_count_nodes(self, m):
         m.get(self.COUNT_URL, json=self.COUNT, headers=self.JSON_HEADER)
@@ -46,3 +60,112 @@ class TestTopologyService(TestCase):
         self.assertEqual(self.COUNT, len(self.service.list_nodes()))
         self.assertEqual(1, count_adapter.call_count)
         self.assertEqual(2, list_adapter.call_count)
+
+    def test_list_nodes_keyset_pages(self, m):
+        with open(f'{TEST_DIR}/resources/sample_gnbdu.json', 'r') as f:
+            response_json = json.load(f)
+        nodes = [dict(response_json, id=identity) for identity in (3, 5, 8)]
+
+        def page(request, context):
+            last_id = int(request.qs['criteria'][0].strip('(objectinstid > )l'))
+            return [node for node in nodes if node['id'] > last_id][:int(request.qs['limit'][0])]
+
+        m.get(self.COUNT_URL, json=len(nodes), headers=self.JSON_HEADER)
+        list_adapter = m.get(self.NODE_URL, json=page, headers=self.JSON_HEADER)
+        pages = list(self.client.iter_pages(TopologyType.GNBDU, page_size=2))
+        self.assertEqual([[3, 5], [8]], [[node['id'] for node in page] for page in pages])
+        self.assertEqual(['(objectinstid > 0l)', '(objectinstid > 5l)'],
+                         [request.qs['criteria'][0] for request in list_adapter.request_history])
+
+    def test_iter_pages_closed_early(self, m):
+        with open(f'{TEST_DIR}/resources/sample_gnbdu.json', 'r') as f:
+            response_json = json.load(f)
+        m.get(self.COUNT_URL, json=100, headers=self.JSON_HEADER)
+        list_adapter = m.get(self.NODE_URL, json=[response_json], headers=self.JSON_HEADER)
+        pages = self.client.iter_pages(TopologyType.GNBDU, prefetch=1)
+        self.assertEqual([response_json], next(pages))
+        pages.close()
+        self.assertLess(list_adapter.call_count, 100)
+
+    def mock_connections(self, m):
+        with open(f'{TEST_DIR}/resources/sample_gnbdu.json', 'r') as f:
+            gnbdu = json.load(f)
+        connections = [{"id": 1, "name": "-".join(map(str, self.GLOBAL_ID)),
+                        "wirelessNetFunctions": [{"value": gnbdu}]}]
+        m.get(re.compile(f'{self.CONNECTION_URL}Task/'), json=len(connections), headers=self.JSON_HEADER)
+
+        def page(request, context):
+            last_id = int(request.qs['criteria'][0].strip('(objectinstid > )l'))
+            return [connection for connection in connections if connection['id'] > last_id]
+
+        return m.get(self.CONNECTION_URL, json=page, headers=self.JSON_HEADER)
+
+    def empty_catalog(self):
+        return patch.dict(vars(topology_service), {
+            '__node_catalog': dict(), '__node_local_catalog': dict(),
+            '__catalog_state': dict(version=None, checked_at=None, refreshing=False)})
+
+    def catalog_document(self):
+        return {"mcc": 128, "mnc": 49, "gnb_id": 208727, "gnb_id_length": 32, "name": "NR124gNodeBRadio00040",
+                "cm_handle": "16E3AB5A157DEB90C415D4638D5B4156", "function_refs": {"gNBDUFunctionRef": self.FDN}}
+
+    def test_catalog_warm_start(self, m):
+        catalog = SimpleNamespace(version=3, refreshed_at=datetime.datetime.now(datetime.timezone.utc))
+        with self.empty_catalog(), \
+                patch.object(database_service, "get_topology_catalog", return_value=catalog), \
+                patch.object(database_service, "get_topology_nodes", return_value=[self.catalog_document()]):
+            node = self.service.get_node_by_local_id(208727)
+            self.assertIs(node, self.service.get_node_by_global_id(self.GLOBAL_ID))
+        self.assertEqual(Fdn.from_str(self.FDN), node["gNBDUFunctionRef"])
+        self.assertEqual(208727, node["gNBId"])
+        self.assertEqual(0, m.call_count)
+
+    def test_catalog_refresh_saves_changes(self, m):
+        self.mock_connections(m)
+        with self.empty_catalog(), \
+                patch.object(database_service, "get_topology_catalog", return_value=None), \
+                patch.object(database_service, "get_topology_node_digests", return_value={(1, 1, 1, 32): "removed"}), \
+                patch.object(database_service, "save_topology_catalog", return_value=1) as save:
+            self.assertEqual("NR124gNodeBRadio00040", self.service.get_node_by_global_id(self.GLOBAL_ID)["name"])
+        changed_nodes, removed_keys, node_count = save.call_args.args[1:]
+        self.assertEqual([self.catalog_document()], [
+            {key: value for key, value in document.items() if key != "digest"} for document in changed_nodes])
+        self.assertEqual([(1, 1, 1, 32)], removed_keys)
+        self.assertEqual(1, node_count)
+
+    def test_stale_catalog_refreshed_in_background(self, m):
+        connection_adapter = self.mock_connections(m)
+        catalog = SimpleNamespace(version=3, refreshed_at=datetime.datetime.now(datetime.timezone.utc)
+                                  - datetime.timedelta(days=2))
+        with self.empty_catalog(), \
+                patch.object(database_service, "get_topology_catalog", return_value=catalog), \
+                patch.object(database_service, "get_topology_nodes", return_value=[self.catalog_document()]), \
+                patch.object(database_service, "claim_topology_catalog_refresh", return_value=True), \
+                patch.object(database_service, "get_topology_node_digests", return_value={}), \
+                patch.object(database_service, "save_topology_catalog", return_value=4) as save:
+            self.assertIsNotNone(self.service.get_node_by_local_id(208727))
+            for thread in threading.enumerate():
+                if thread.name == "topology-catalog-refresh":
+                    thread.join()
+            self.assertEqual(4, vars(topology_service)['__catalog_state']['version'])
+        self.assertEqual(1, connection_adapter.call_count)
+        self.assertEqual(1, len(save.call_args.args[1]))
+
+    def test_failed_background_refresh_releases_lease(self, m):
+        self.mock_connections(m)
+        catalog = SimpleNamespace(version=3, refreshed_at=datetime.datetime.now(datetime.timezone.utc)
+                                  - datetime.timedelta(days=2))
+        with self.empty_catalog(), \
+                patch.object(database_service, "get_topology_catalog", return_value=catalog), \
+                patch.object(database_service, "get_topology_nodes", return_value=[self.catalog_document()]), \
+                patch.object(database_service, "claim_topology_catalog_refresh", return_value=True), \
+                patch.object(database_service, "get_topology_node_digests", return_value={}), \
+                patch.object(database_service, "save_topology_catalog", side_effect=OperationError("down")), \
+                patch.object(database_service, "release_topology_catalog_refresh") as release:
+            self.assertIsNotNone(self.service.get_node_by_local_id(208727))
+            for thread in threading.enumerate():
+                if thread.name == "topology-catalog-refresh":
+                    thread.join()
+            self.assertEqual(3, vars(topology_service)['__catalog_state']['version'])
+            self.assertFalse(vars(topology_service)['__catalog_state']['refreshing'])
+        release.assert_called_once_with(topology_service.CATALOG)